@@ -0,0 +1,177 @@
+import threading
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4-1106-preview": (10.0, 30.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo-1106": (1.0, 2.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+# Batched runs are billed at half price
+BATCH_DISCOUNT = 0.5
+
+# Usage totals of one group of runs
+class Usage:
+    def __init__(self):
+        self.runs = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens, completion_tokens, cost):
+        self.runs += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += cost
+
+    def to_dict(self):
+        return {
+            "runs": self.runs,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cost": round(self.cost, 6),
+        }
+
+# Token and cost accounting for one objective, with an optional budget.
+#
+# The usage of every run is recorded against the task it worked for (a
+# planning or summary run counts towards the task it planned or
+# summarized), the agent that ran it and the objective, and rolled up per
+# subtree on demand from the hierarchical task keys. Agents check the
+# budget before planning and before starting runs: once less than reserve
+# of it is left they stop decomposing and do tasks directly, and once it
+# is spent they start no new runs.
+class TokenLedger:
+    def __init__(self, max_tokens=None, max_cost=None, reserve=0.1, prices=None):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.reserve = reserve
+        self.prices = prices if prices is not None else MODEL_PRICES
+        self.lock = threading.Lock()
+        self.total = Usage()
+        self.by_task = {}
+        self.by_agent = {}
+        self.agent_names = {}
+        self.by_role = {}
+        self.unpriced_models = set()
+        self.skipped_plans = 0
+        self.skipped_runs = 0
+
+    # Record the usage of a finished run. Returns the run's usage as a dict,
+    # or None if the run reported none (e.g. it was served from the cache).
+    def record(self, task, agent, run):
+        usage = getattr(run, "usage", None)
+        if usage is None:
+            return None
+
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cost = self.get_cost(agent.model, prompt_tokens, completion_tokens)
+        if getattr(task, "backend", None) == "batch":
+            cost *= BATCH_DISCOUNT
+
+        with self.lock:
+            self.total.add(prompt_tokens, completion_tokens, cost)
+            # Names come from the model and may repeat, so agents are told
+            # apart by key and only named in the report
+            self.agent_names[agent.key] = agent.name
+            for groups, key in ((self.by_task, task.owner_key), (self.by_agent, agent.key), (self.by_role, task.role)):
+                groups.setdefault(key, Usage()).add(prompt_tokens, completion_tokens, cost)
+
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost": cost}
+
+    def get_cost(self, model, prompt_tokens, completion_tokens):
+        prices = self.prices.get(model)
+        if prices is None:
+            if model not in self.unpriced_models:
+                self.unpriced_models.add(model)
+                logger.warning("No price known for model %s; its cost is not counted", model)
+            return 0.0
+
+        prompt_price, completion_price = prices
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    # Fraction of the budget used so far (0 without a budget)
+    def get_used_fraction(self):
+        with self.lock:
+            fractions = [0.0]
+            if self.max_tokens:
+                fractions.append(self.total.total_tokens / self.max_tokens)
+            if self.max_cost:
+                fractions.append(self.total.cost / self.max_cost)
+            return max(fractions)
+
+    # Less than reserve of the budget is left: stop decomposing tasks
+    def is_nearly_exhausted(self):
+        return self.get_used_fraction() >= 1 - self.reserve
+
+    # The budget is spent: start no new runs
+    def is_exhausted(self):
+        return self.get_used_fraction() >= 1
+
+    def record_skipped_plan(self):
+        with self.lock:
+            self.skipped_plans += 1
+
+    def record_skipped_run(self):
+        with self.lock:
+            self.skipped_runs += 1
+
+    # Get the usage of a task and all its subtasks
+    def get_subtree(self, key):
+        subtree = Usage()
+        prefix = f"{key}/"
+        with self.lock:
+            for task_key, usage in self.by_task.items():
+                if task_key == key or task_key.startswith(prefix):
+                    subtree.runs += usage.runs
+                    subtree.prompt_tokens += usage.prompt_tokens
+                    subtree.completion_tokens += usage.completion_tokens
+                    subtree.cost += usage.cost
+        return subtree
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.total.to_dict(), skipped_plans=self.skipped_plans, skipped_runs=self.skipped_runs)
+
+    # Build the end-of-run cost report: the objective's total, then the
+    # usage per agent, per kind of run and per subtree of the objective
+    def report(self, root_key="0"):
+        stats = self.get_stats()
+        lines = [f"Objective: {format_usage(self.total)}"]
+        if self.max_tokens or self.max_cost:
+            limits = [f"{self.max_tokens} tokens" if self.max_tokens else None, f"${self.max_cost:.2f}" if self.max_cost else None]
+            lines.append(f"Budget: {' / '.join(limit for limit in limits if limit)}, {self.get_used_fraction():.0%} used, "
+                         f"{stats['skipped_plans']} plans and {stats['skipped_runs']} runs skipped")
+
+        with self.lock:
+            agents = [(f"{self.agent_names[key]} ({key})", usage) for key, usage in sorted(self.by_agent.items(), key=lambda item: -item[1].total_tokens)]
+            roles = sorted(self.by_role.items())
+            children = sorted({key[:key.index("/", len(root_key) + 1)] if "/" in key[len(root_key) + 1:] else key
+                               for key in self.by_task if key.startswith(f"{root_key}/")})
+
+        lines.append("By agent:")
+        lines.extend(f"  {name}: {format_usage(usage)}" for name, usage in agents)
+        lines.append("By kind of run:")
+        lines.extend(f"  {role}: {format_usage(usage)}" for role, usage in roles)
+        if children:
+            lines.append("By subtree:")
+            lines.extend(f"  {key}: {format_usage(self.get_subtree(key))}" for key in children)
+
+        return "\n".join(lines)
+
+def format_usage(usage):
+    return (f"{usage.total_tokens} tokens ({usage.prompt_tokens} prompt, {usage.completion_tokens} completion) "
+            f"in {usage.runs} runs, ${usage.cost:.4f}")
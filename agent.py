@@ -1,21 +1,35 @@
-import utils
 import functions
 import json
 import enums
+import asyncio
 import threading
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from task import Task
+from scheduler import TaskGraph, DependencyError
+from budget import ExecutionBudget
+from assistant_pool import AssistantPool
+from registry import Registry, make_key
+from knowledge import KnowledgeBase
+from tracing import NO_TRACER
+from summarizer import Section, Summarizer, gather_outcomes, build_sections_prompt
+from log import get_logger, log_context
+
+logger = get_logger(__name__)
 
 class Agent:
-    def __init__(self, log_file_path, data_file_path, model, research_url, agent_list, client, id, name, description, research, tools_list=[], function_list=[], file_ids=[]):
+    def __init__(self, log_file_path, data_file_path, model, research_url, agent_list, client, id, name, description, research, tools_list=[], function_list=[], file_ids=[], async_client=None, assistant=None, budget=None, assistant_pool=None, response_cache=None, planner=None, namespace="", knowledge_base=None, retrieval_index=None, journal=None, checkpoint=None, tracer=None, ledger=None, summarizer=None, backend="assistants", batch_runner=None, speculator=None, task_timeout=None):
         self.log_file_path = log_file_path
         self.data_file_path = data_file_path
         self.model = model
         self.research_url = research_url
-        self.agent_list = agent_list
+        # Registry shared by every agent in the swarm (a plain list of
+        # agents is indexed into a new registry)
+        self.registry = agent_list if isinstance(agent_list, Registry) else Registry(agent_list)
         self.client = client
+        self.async_client = async_client
         self.id = id
+        self.namespace = namespace
+        self.key = make_key(namespace, id)
         self.name = name
         self.description = description
         self.research = research
@@ -24,59 +38,130 @@ class Agent:
         self.file_ids = file_ids
         self.task_list = []
 
+        # Execution budget shared by every agent in the swarm
+        self.budget = budget if budget is not None else ExecutionBudget()
+
+        # Planning policy (None uses a separate decomposability run)
+        self.planner = planner
+
+        # Knowledge base files shared by every agent (created on first refresh)
+        self.knowledge_base = knowledge_base
+
+        # Local retrieval index over the research corpus (None disables it)
+        self.retrieval_index = retrieval_index
+
+        # Journal the outcomes of task runs are written to (None writes
+        # one file per task)
+        self.journal = journal
+
+        # Checkpoint of the swarm run's progress (None disables resuming)
+        self.checkpoint = checkpoint
+
+        # Tracer recording where the swarm's time goes
+        self.tracer = tracer if tracer is not None else NO_TRACER
+
+        # Token usage and budget of the objective (None disables accounting)
+        self.ledger = ledger
+
+        # How subtask outcomes are merged into a parent's summary
+        self.summarizer = summarizer if summarizer is not None else Summarizer()
+
+        # Where tasks run: "assistants", "chat" (one chat completion per
+        # run) or "auto" (chat unless the task may use a hosted tool)
+        self.backend = backend
+
+        # Batch runner leaf tasks are batched on (None runs them interactively)
+        self.batch_runner = batch_runner
+
+        # Speculative execution policy (None waits for the decomposability
+        # run before doing a task)
+        self.speculator = speculator
+
+        # Seconds each task (with its subtasks) may take, or None
+        self.task_timeout = task_timeout
+
+        # Cache of task run results (None disables caching)
+        self.response_cache = response_cache
+
+        # Pool of assistants shared by every agent in the swarm
+        self.assistant_pool = assistant_pool if assistant_pool is not None else AssistantPool(client, async_client=async_client)
+
         # Create list of tools/functions for the assistant
         assistant_tools = self.build_tools()
 
-        # Create the agent's assistant
-        self.assistant = self.create_assistant(
-            name=self.name,
-            instructions=self.description,
-            tools=assistant_tools,
-            file_ids=self.file_ids,
-        )
+        # Create the agent's assistant (unless one was created for us, e.g.
+        # by the async engine which cannot block on a sync API call)
+        if assistant is None:
+            assistant = self.create_assistant(
+                name=self.name,
+                instructions=self.description,
+                tools=assistant_tools,
+                file_ids=self.file_ids,
+            )
+        self.assistant = assistant
         
-        # Add self to agent_list
-        self.agent_list.append(self)
+        # Add self to the registry
+        self.registry.add_agent(self)
 
         # Show agent creation success
-        print(f'Created agent "{self.name}"')
+        logger.info('Created agent "%s"', self.name)
 
         self.lock = threading.Lock()
 
-    def build_tools(self):
+    def build_tools(self, tools=None, function_list=None):
+        tools = self.tools if tools is None else tools
+        function_list = self.functions if function_list is None else function_list
+
         # Create list of tools for the assistant
         assistant_tools = []
-        for tool in self.tools:
+        for tool in tools:
+            if isinstance(tool, enums.Tool):
+                tool = tool.value
             assistant_tools.append({"type": tool})
 
         # Add functions to list of assistant tools 
-        if self.functions:
-            for function in self.functions:
+        if function_list:
+            for function in function_list:
                 assistant_tools.append({"type": "function", "function": function})
 
         return assistant_tools
 
-    # Creates an assistant based on provided info
+    # Gets an assistant based on provided info, reusing a pooled assistant
+    # with the same configuration when there is one
     def create_assistant(self, name, instructions, tools, file_ids):
-        assistant = self.client.beta.assistants.create(
-            name=name,
-            instructions=instructions,
-            tools=tools,
-            model=self.model,
-            file_ids=file_ids
-        )
+        with self.tracer.span("assistant.create", agent=name):
+            assistant = self.assistant_pool.get_or_create(
+                name=name,
+                instructions=instructions,
+                tools=tools,
+                model=self.model,
+                file_ids=file_ids
+            )
 
         return assistant
 
-    # Refreshes the assistant's files
+    # Async version of create_assistant
+    async def async_create_assistant(self, name, instructions, tools, file_ids):
+        with self.tracer.span("assistant.create", agent=name):
+            return await self.assistant_pool.async_get_or_create(
+                name=name,
+                instructions=instructions,
+                tools=tools,
+                model=self.model,
+                file_ids=file_ids
+            )
+
+    # Refreshes the assistant's files, uploading only new or changed files
     def refresh_knowledge(self):
+        if self.knowledge_base is None:
+            self.knowledge_base = KnowledgeBase(self.client, self.research.knowledge_path)
 
         # Get updated file list
-        # Need to identify current list of file_ids, then only add to existing list of files.
-        utils.get_knowledge_base(self.client, self.research.knowledge_path, None) # this currently gets all files
+        self.file_ids = self.knowledge_base.sync()
 
-        # Update assistant
-        self.client.beta.assistants[0].update(
+        # Update assistant in place
+        self.assistant = self.assistant_pool.update(
+            self.assistant,
             name=self.name,
             instructions=self.description,
             tools=self.build_tools(),
@@ -88,8 +173,9 @@ class Agent:
     def receive_task_desc(self, task_title, task_description):
         
         # Create a new task and assign to agent
-        new_task = Task(self.client, self.log_file_path, 0, task_title, task_description, self.id, self.research.search_url)
+        new_task = Task(self.client, self.log_file_path, 0, task_title, task_description, self.id, self.research.search_url, async_client=self.async_client, namespace=self.namespace)
         self.task_list.append(new_task)
+        self.registry.add_task(new_task)
 
         return new_task.id
     
@@ -111,75 +197,457 @@ class Agent:
                     description, 
                     assigned_agent_id, 
                     self.research_url, 
-                    dependent_upon)
+                    dependent_upon=dependent_upon,
+                    async_client=self.async_client,
+                    namespace=self.namespace)
 
         self.task_list.append(new_task)
+        self.registry.add_task(new_task)
 
         return new_task.id
+
+    # Receive a task already created by the delegating agent
+    def receive_task(self, task):
+        with self.lock:
+            self.task_list.append(task)
+        self.registry.add_task(task)
+
+        return task.id
    
     # Have the agent start working on it's tasks
     def work(self, task_id):
-        work_task = None
-        with self.lock:
-            for task in self.task_list:
-                if task.id == task_id:
-                    work_task = task
-                    break
+        work_task = self.find_task(task_id)
+
+        if work_task is None:
+            logger.error("No task found with id %s", task_id)
+            return None
+
+        if self.task_timeout is not None:
+            work_task.set_timeout(self.task_timeout)
+        with log_context(task=work_task.key, agent=self.key), self.tracer.task_span(work_task):
+            self.decompose_or_do(work_task)
+        return work_task.outcome if work_task.is_complete else None
+
+    # Async version of work, driving the whole subtree on one event loop
+    async def async_work(self, task_id):
+        work_task = self.find_task(task_id)
 
         if work_task is None:
-            print(f"Error: No task found with id {task_id}")
+            logger.error("No task found with id %s", task_id)
             return None
 
-        self.decompose_or_do(work_task)
-        return work_task.outcome
+        if self.task_timeout is not None:
+            work_task.set_timeout(self.task_timeout)
+        with log_context(task=work_task.key, agent=self.key), self.tracer.task_span(work_task):
+            await self.async_decompose_or_do(work_task)
+        return work_task.outcome if work_task.is_complete else None
+
+    # Sync facade over async_work for callers without an event loop
+    def work_async(self, task_id):
+        return asyncio.run(self.async_work(task_id))
+
+    # Find one of the agent's tasks by ID
+    def find_task(self, task_id):
+        return self.registry.get_task(make_key(self.namespace, task_id))
 
     def decompose_or_do(self, task):
-        self.set_decomposability(task)
+        # Tasks finished before the swarm was interrupted are not redone
+        if self.checkpoint is not None and self.checkpoint.restore_outcome(task):
+            return
+        if self.should_skip(task):
+            return
+
+        speculation = self.start_speculation(task)
+        with self.tracer.span("plan", task.key):
+            self.decide(task)
+        if speculation is not None:
+            self.settle_speculation(task, *speculation)
 
         if task.is_decomposable:
             task_specs, agent_specs = self.get_subtask_agent_specs(task)
-            print("Debug - task_specs:", task_specs)
-            print("Debug - agent_specs:", agent_specs)
-
-            if task_specs and agent_specs:
-                with ThreadPoolExecutor(max_workers=len(task_specs)) as executor:
-                    future_to_task = {executor.submit(self.execute_subtask, task_spec, agent_specs): task_spec for task_spec in task_specs}
-                    for future in as_completed(future_to_task):
-                        task_spec = future_to_task[future]
-                        try:
-                            future.result()
-                        except Exception as exc:
-                            print(f'{task_spec["subtask_id"]} generated an exception: {exc}')
+            logger.debug("Subtask specs: %s", task_specs)
+            logger.debug("Agent specs: %s", agent_specs)
+
+            graph = self.build_task_graph(task_specs, agent_specs)
+            if graph:
+                # Run each subtask on the shared budget as soon as the
+                # subtasks it depends on are done
+                with self.tracer.span("subtasks", task.key, count=len(task_specs)):
+                    graph.run(lambda task_spec, upstream: self.execute_subtask(task_spec, agent_specs, task, upstream), self.budget)
             else:
-                print("Warning: No subtasks or agents specified. Treating task as non-decomposable.")
+                logger.warning("No subtasks or agents specified. Treating task as non-decomposable.")
                 self.do(task)
-        else:
+        elif not task.is_complete:
             self.do(task)
+            self.save_outcome(task)
+
+        with self.tracer.span("summarize", task.key):
+            self.summarize_results(task)
+        self.save_outcome(task)
+
+    # Async version of decompose_or_do; subtasks are gathered as coroutines
+    # instead of being handed to a per-level thread pool
+    async def async_decompose_or_do(self, task):
+        # Tasks finished before the swarm was interrupted are not redone
+        if self.checkpoint is not None and self.checkpoint.restore_outcome(task):
+            return
+        if self.should_skip(task):
+            return
+
+        speculation = self.start_speculation(task, self.async_do)
+        with self.tracer.span("plan", task.key):
+            await self.async_decide(task)
+        if speculation is not None:
+            await self.async_settle_speculation(task, *speculation)
+
+        if task.is_decomposable:
+            task_specs, agent_specs = self.get_subtask_agent_specs(task)
+            logger.debug("Subtask specs: %s", task_specs)
+            logger.debug("Agent specs: %s", agent_specs)
+
+            graph = self.build_task_graph(task_specs, agent_specs)
+            if graph:
+                with self.tracer.span("subtasks", task.key, count=len(task_specs)):
+                    await graph.async_run(lambda task_spec, upstream: self.async_execute_subtask(task_spec, agent_specs, task, upstream))
+            else:
+                logger.warning("No subtasks or agents specified. Treating task as non-decomposable.")
+                await self.async_do(task)
+        elif not task.is_complete:
+            await self.async_do(task)
+            self.save_outcome(task)
+
+        with self.tracer.span("summarize", task.key):
+            await self.async_summarize_results(task)
+        self.save_outcome(task)
+
+    # Check if a task was cancelled, or its deadline passed, before it was
+    # started, in which case it is left incomplete
+    def should_skip(self, task):
+        if not task.should_stop():
+            return False
+
+        logger.warning('Skipping task "%s": %s', task.title, task.get_stop_reason())
+        return True
+
+    # Cancel a task and every task below it. Runs in flight are cancelled
+    # and subtasks not started yet are skipped.
+    def cancel_tree(self, task):
+        task.cancel()
+        if task.decomposability_task is not None:
+            task.decomposability_task.cancel()
+        for subtask in self.registry.get_children(task.key):
+            self.cancel_tree(subtask)
+
+    def save_outcome(self, task):
+        if self.checkpoint is not None:
+            self.checkpoint.save_outcome(task)
+
+    # Decide whether a task is decomposed: obviously atomic tasks skip
+    # planning, otherwise the task is planned in a single round trip (which
+    # may complete it directly) or checked with a separate decomposability
+    # run. A plan saved in the checkpoint is reused.
+    def decide(self, task):
+        if self.checkpoint is not None and self.checkpoint.restore_plan(task):
+            return
+        if self.is_budget_low(task):
+            return
+
+        if self.planner and self.planner.is_atomic(task):
+            logger.info('Task "%s" looks atomic; skipping planning', task.title)
+            task.is_decomposable = False
+        elif self.planner and self.planner.single_round_trip:
+            self.plan(task)
+        else:
+            self.set_decomposability(task)
+
+        if self.checkpoint is not None:
+            self.checkpoint.save_plan(task)
+
+    # Async version of decide
+    async def async_decide(self, task):
+        if self.checkpoint is not None and self.checkpoint.restore_plan(task):
+            return
+        if self.is_budget_low(task):
+            return
+
+        if self.planner and self.planner.is_atomic(task):
+            logger.info('Task "%s" looks atomic; skipping planning', task.title)
+            task.is_decomposable = False
+        elif self.planner and self.planner.single_round_trip:
+            await self.async_plan(task)
+        else:
+            await self.async_set_decomposability(task)
+
+        if self.checkpoint is not None:
+            self.checkpoint.save_plan(task)
+
+    # Check if a task is worth doing speculatively while its decomposability
+    # run decides whether to split it. Tasks planned in a single round trip
+    # (which may answer them directly), looking atomic, already planned or
+    # batched are not.
+    def should_speculate(self, task):
+        if self.speculator is None or self.batch_runner is not None or task.is_complete:
+            return False
+        if self.planner and (self.planner.single_round_trip or self.planner.is_atomic(task)):
+            return False
+        if self.checkpoint is not None and self.checkpoint.get("plan", task.key) is not None:
+            return False
+        if self.ledger is not None and self.ledger.is_nearly_exhausted():
+            return False
+        return self.speculator.should_speculate(task)
+
+    # Start doing a task speculatively. Returns (speculative task, future
+    # or asyncio task of its run), or None if the task is not speculated on.
+    def start_speculation(self, task, async_do=None):
+        if not self.should_speculate(task):
+            return None
 
-        self.summarize_results(task)
+        speculative_task = self.create_speculative_task(task)
+        self.speculator.record_launch()
+        if async_do is not None:
+            return speculative_task, asyncio.ensure_future(async_do(speculative_task))
+        return speculative_task, self.budget.submit(self.do, speculative_task)
+
+    # Keep the speculative outcome of an atomic task, or cancel the
+    # speculative run of a decomposed one
+    def settle_speculation(self, task, speculative_task, future):
+        if task.is_decomposable:
+            speculative_task.cancel()
+        self.wait_all([future])
+        if future.exception() is not None:
+            logger.warning("Speculative run failed: %s", future.exception())
+        self.adopt_speculation(task, speculative_task)
+
+    # Async version of settle_speculation
+    async def async_settle_speculation(self, task, speculative_task, speculative_run):
+        if task.is_decomposable:
+            await speculative_task.async_cancel()
+        try:
+            await speculative_run
+        except Exception as exc:
+            logger.warning("Speculative run failed: %s", exc)
+        self.adopt_speculation(task, speculative_task)
+
+    def adopt_speculation(self, task, speculative_task):
+        hit = not task.is_decomposable and speculative_task.is_complete
+        self.speculator.record(speculative_task, hit)
+        if hit:
+            with task.lock:
+                task.outcome = speculative_task.outcome
+                task.thread_id = speculative_task.thread_id
+                task.is_complete = True
+            speculative_task.publish(self.registry)
+
+    # Create the copy of a task its speculative run completes, so the task
+    # itself is only completed if the speculation is kept. The copy has a
+    # role of its own, so its run is checkpointed apart from the task's and
+    # its journal and cache writes wait until it is kept.
+    def create_speculative_task(self, task):
+        speculative_task = Task(self.client, self.log_file_path, task.id, task.title, task.description, task.assigned_agent, self.research_url, parent_task=task.parent_task, dependent_upon=task.dependent_upon, async_client=self.async_client, namespace=task.namespace)
+        speculative_task.depth = task.depth
+        speculative_task.owner_key = task.key
+        speculative_task.role = "speculate"
+        speculative_task.owner = task
+        speculative_task.deadline = task.deadline
+        speculative_task.upstream_outcomes = task.upstream_outcomes
+        return speculative_task
+
+    # Check if the objective's token budget is nearly spent, in which case
+    # the task is done directly rather than planned and decomposed
+    def is_budget_low(self, task):
+        if self.ledger is None or not self.ledger.is_nearly_exhausted():
+            return False
+
+        logger.warning('Token budget nearly spent; doing task "%s" without planning', task.title)
+        self.ledger.record_skipped_plan()
+        task.is_decomposable = False
+        return True
+
+    # Check if the objective's token budget is spent, in which case no new
+    # subtasks or runs are started
+    def is_budget_spent(self, title):
+        if self.ledger is None or not self.ledger.is_exhausted():
+            return False
+
+        logger.warning('Token budget spent; skipping "%s"', title)
+        self.ledger.record_skipped_run()
+        return True
+
+    # Build the dependency graph of the subtasks, or None if the
+    # decomposition cannot be scheduled
+    def build_task_graph(self, task_specs, agent_specs):
+        if not task_specs or not agent_specs:
+            return None
+
+        try:
+            graph = TaskGraph(task_specs)
+        except DependencyError as exc:
+            logger.warning("%s", exc)
+            return None
+
+        for task_id, dependency in graph.dangling:
+            logger.warning("Subtask %s depends on unknown subtask %s; ignoring the dependency", task_id, dependency)
+
+        return graph
+
+    def execute_subtask(self, task_spec, agent_specs, parent_task, upstream=None):
+        if self.is_budget_spent(task_spec.get('subtask_title', 'subtask')):
+            return None
+        if parent_task.should_stop():
+            return None
+
+        agent_spec = self.get_agent_spec(agent_specs, task_spec)
+        if agent_spec:
+            subtask = self.create_subtask(task_spec, parent_task)
+            subtask.upstream_outcomes = upstream or {}
+            return self.delegate(agent_spec, subtask)
+        else:
+            logger.warning("No agent found for task %s", task_spec.get('subtask_id', 'Unknown'))
+
+    # Async version of execute_subtask
+    async def async_execute_subtask(self, task_spec, agent_specs, parent_task, upstream=None):
+        if self.is_budget_spent(task_spec.get('subtask_title', 'subtask')):
+            return None
+        if parent_task.should_stop():
+            return None
 
-    def execute_subtask(self, task_spec, agent_specs):
         agent_spec = self.get_agent_spec(agent_specs, task_spec)
         if agent_spec:
-            subtask = self.create_subtask(task_spec)
-            self.delegate(agent_spec, subtask)
+            subtask = self.create_subtask(task_spec, parent_task)
+            subtask.upstream_outcomes = upstream or {}
+            return await self.async_delegate(agent_spec, subtask)
         else:
-            print(f"Warning: No agent found for task {task_spec.get('subtask_id', 'Unknown')}")
+            logger.warning("No agent found for task %s", task_spec.get('subtask_id', 'Unknown'))
 
+    # Summarize a decomposed task from its subtasks' outcomes. While they
+    # do not fit in one prompt, they are merged in rounds of partial
+    # summaries run concurrently (see summarizer.Summarizer).
     def summarize_results(self, task):
+        sections = self.get_summary_sections(task)
+        if sections is None:
+            return
+
+        for level in range(1, self.summarizer.max_rounds + 1):
+            if self.summarizer.fits(sections):
+                break
+            groups = self.summarizer.group(sections)
+            summary_tasks = self.create_partial_summary_tasks(task, groups, level)
+            self.do_all(summary_tasks.values())
+            sections = self.merge_partial_summaries(groups, summary_tasks, level)
+
+        summary_task = self.create_summary_task(task, sections)
+        self.do(summary_task)
+        self.complete_with_summary(task, summary_task)
+
+    # Async version of summarize_results
+    async def async_summarize_results(self, task):
+        sections = self.get_summary_sections(task)
+        if sections is None:
+            return
+
+        for level in range(1, self.summarizer.max_rounds + 1):
+            if self.summarizer.fits(sections):
+                break
+            groups = self.summarizer.group(sections)
+            summary_tasks = self.create_partial_summary_tasks(task, groups, level)
+            results = await asyncio.gather(*(self.async_do(summary_task) for summary_task in summary_tasks.values()), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning("Partial summary failed: %s", result)
+            sections = self.merge_partial_summaries(groups, summary_tasks, level)
+
+        summary_task = self.create_summary_task(task, sections)
+        await self.async_do(summary_task)
+        self.complete_with_summary(task, summary_task)
+
+    # Get the subtask outcomes to summarize a task from, or None if it has
+    # nothing to summarize (leaf tasks already have their outcome)
+    def get_summary_sections(self, task):
+        if task.outcome is not None:
+            return None
+
+        sections = gather_outcomes(self.registry, task)
+        if not sections:
+            logger.warning("No subtask outcomes to summarize for task '%s'", task.title)
+            return None
+
+        return sections
+
+    # Create a task for each group of a round that must be summarized,
+    # keyed by the group's index
+    def create_partial_summary_tasks(self, task, groups, level):
+        return {index: self.create_summary_task(task, group, f"{level}.{index + 1}")
+                for index, group in enumerate(groups) if self.summarizer.needs_summary(group)}
+
+    # Run tasks concurrently on the shared budget
+    def do_all(self, tasks):
+        futures = [self.budget.submit(self.do, task) for task in tasks]
+        self.wait_all(futures)
+
+        for future in futures:
+            if future.exception() is not None:
+                logger.warning("Partial summary failed: %s", future.exception())
+
+    # Wait for futures of the shared budget, running queued jobs meanwhile
+    def wait_all(self, futures):
+        pending = set(futures)
+        while pending:
+            pending -= self.budget.wait_any(pending)
+
+    # Replace each summarized group by its partial summary. Groups that
+    # were passed on, or whose summary failed, keep their sections.
+    def merge_partial_summaries(self, groups, summary_tasks, level):
+        sections = []
+        for index, group in enumerate(groups):
+            summary_task = summary_tasks.get(index)
+            if summary_task is not None and summary_task.outcome:
+                sections.append(Section(f"partial summary {summary_task.part}", summary_task.outcome))
+            else:
+                sections.extend(group)
+        return sections
+
+    # A decomposed task's outcome is the summary of its subtasks. If the
+    # summary was never run (the token budget was spent), the outcomes of
+    # the subtasks are joined instead.
+    def complete_with_summary(self, task, summary_task):
+        with task.lock:
+            if task.outcome is None and summary_task.is_complete:
+                task.outcome = summary_task.outcome
+                task.is_complete = True
+            elif task.outcome is None:
+                outcomes = [subtask.outcome for subtask in self.registry.get_children(task.key) if subtask.outcome]
+                task.outcome = "\n\n".join(outcomes) or None
+                task.is_complete = bool(outcomes)
+
+    # Create the task that summarizes the results of a task from sections
+    # of its subtasks' outcomes. A part ("level.index") marks a partial
+    # summary of some of them.
+    def create_summary_task(self, task, sections, part=None):
+        scope = "some of the subtasks of the following task" if part else "the following task and its subtasks"
         summary_prompt = f"""
-        Summarize the results of the following task and its subtasks:
+        Summarize the results of {scope}:
         Task: {task.title}
         Description: {task.description}
-        
+
+        {build_sections_prompt(sections)}
+
         If any subtasks produced code, compile the code into a complete, runnable program.
         If no code was produced, provide a detailed summary of the task outcomes.
         
         Begin your summary:
         """
         
-        summary_task = Task(self.client, self.log_file_path, task.id + 1000, f"Summarize {task.title}", summary_prompt, self.id, self.research_url)
-        self.do(summary_task)
+        title = f"Summarize {task.title}" + (f" (part {part})" if part else "")
+        summary_task = Task(self.client, self.log_file_path, task.id + 1000, title, summary_prompt, self.id, self.research_url, async_client=self.async_client, namespace=self.namespace, use_retrieval=False)
+        summary_task.depth = task.depth
+        summary_task.owner_key = task.key
+        summary_task.owner = task
+        summary_task.deadline = task.deadline
+        summary_task.role = "summary"
+        summary_task.part = part
+        summary_task.uses_hosted_tools = False
+
+        return summary_task
 
     def create_subtask(self, task_spec, parent_task):
         return Task(self.client,
@@ -190,13 +658,13 @@ class Agent:
                     task_spec['assigned_agent_id'],
                     self.research_url,
                     parent_task=parent_task,
-                    dependent_upon=task_spec.get('dependent_upon'))
+                    dependent_upon=task_spec.get('dependent_upon'),
+                    async_client=self.async_client)
 
     # Get the agent specification assigned to a task specification
     def get_agent_spec(self, agent_specs, task_spec):
-        print("Debug - agent_specs:", agent_specs)
-        print("Debug - task_spec:", task_spec)
-        
+        logger.debug("Finding the agent for %s among %s", task_spec, agent_specs)
+
         assigned_agent_spec = None
         for agent_spec in agent_specs:
             if agent_spec.get("agent_id") == task_spec.get("assigned_agent_id"):
@@ -204,62 +672,198 @@ class Agent:
                 break
         
         if assigned_agent_spec is None:
-            print("Warning: No matching agent found for task.")
+            logger.warning("No matching agent found for task.")
         
         return assigned_agent_spec
 
     # Check if a task is decomposable
     def set_decomposability(self, task):
+        decomposability_task = self.create_decomposability_task(task)
+
+        thread, run = decomposability_task.run(self.registry, self.log_file_path, self.data_file_path)
+
+        decomposability_tool_call = self.get_decomposability_tool_call(task, run)
+        if decomposability_tool_call is None:
+            return
+
+        decomposability_task.finish(run, thread, decomposability_tool_call, "Completed." )  
+
+        self.parse_decomposability(task, decomposability_tool_call)
+
+    # Plan a task in one round trip: the assistant either completes it
+    # directly or calls decompose_and_assign
+    def plan(self, task):
+        planning_task = self.create_planning_task(task)
+
+        thread, run = planning_task.run(self.registry, self.log_file_path, self.data_file_path)
+
+        decompose_tool_call = self.apply_plan(task, run)
+        if decompose_tool_call is not None:
+            planning_task.finish(run, thread, decompose_tool_call, "Completed.")
+
+    # Async version of plan
+    async def async_plan(self, task):
+        planning_task = self.create_planning_task(task)
+
+        thread, run = await planning_task.async_run(self.registry, self.log_file_path, self.data_file_path)
+
+        decompose_tool_call = self.apply_plan(task, run)
+        if decompose_tool_call is not None:
+            await planning_task.async_finish(run, thread, decompose_tool_call, "Completed.")
+
+    # Create the task that plans a task in a single round trip
+    def create_planning_task(self, task):
+        title = f"Plan {task.title}"
+        description = f"""Task: {task.title}
+            {task.description}
+
+            If this task can be completed well in a single response, complete it now and reply with the full result.
+            Otherwise, do not answer it directly: call the decompose_and_assign function to split it into subtasks and assign them to agents."""
+        planning_task = Task(self.client, self.log_file_path, 0, title, description, self.id, self.research.search_url, async_client=self.async_client, namespace=self.namespace)
+        planning_task.depth = task.depth
+        planning_task.upstream_outcomes = task.upstream_outcomes
+        planning_task.owner_key = task.key
+        planning_task.owner = task
+        planning_task.deadline = task.deadline
+        planning_task.role = "plan"
+        task.decomposability_task = planning_task
+
+        return planning_task
+
+    # Apply the result of a planning run to the task. Returns the
+    # decompose_and_assign tool call if the task was decomposed.
+    def apply_plan(self, task, run):
+        planning_task = task.decomposability_task
+
+        # The assistant answered directly, so the task is done
+        if run.status == "completed":
+            with task.lock:
+                task.outcome = planning_task.outcome
+                task.is_complete = True
+            task.is_decomposable = False
+            planning_task.write_output(self.registry)
+            return None
+
+        tool_calls = functions.get_tool_calls(run)
+        if tool_calls is None:
+            logger.warning("Run failed or no tool calls returned for task '%s'", task.title)
+            task.is_decomposable = False
+            return None
+
+        planning_task.tool_calls = tool_calls
+        decompose_tool_call = self.find_tool_call(tool_calls, functions.decompose_and_assign["name"])
+        if decompose_tool_call is None:
+            logger.warning("No decompose_and_assign function call found for task '%s'", task.title)
+            task.is_decomposable = False
+            return None
+
+        task.is_decomposable = self.parse_decomposition(task, decompose_tool_call)
+        return decompose_tool_call
+
+    # Async version of set_decomposability
+    async def async_set_decomposability(self, task):
+        decomposability_task = self.create_decomposability_task(task)
+
+        thread, run = await decomposability_task.async_run(self.registry, self.log_file_path, self.data_file_path)
+
+        decomposability_tool_call = self.get_decomposability_tool_call(task, run)
+        if decomposability_tool_call is None:
+            return
+
+        await decomposability_task.async_finish(run, thread, decomposability_tool_call, "Completed." )
+
+        self.parse_decomposability(task, decomposability_tool_call)
+
+    # Create the task that asks the assistant whether a task is decomposable
+    def create_decomposability_task(self, task):
         title = "Get Decomposability"
         description = f"Determine if the task '{task.description}' is decomposable into subtasks. If the task is decomposable, then also call the decompose_and_assign function. If the task is not decomposable, just call the decomposable function. In either case, make sure you call the decomposable function."
-        decomposability_task = Task(self.client, self.log_file_path, 0, title, description, self.id, self.research.search_url)
+        decomposability_task = Task(self.client, self.log_file_path, 0, title, description, self.id, self.research.search_url, async_client=self.async_client, namespace=self.namespace, use_retrieval=False)
+        decomposability_task.depth = task.depth
+        decomposability_task.owner_key = task.key
+        decomposability_task.owner = task
+        decomposability_task.deadline = task.deadline
+        decomposability_task.role = "plan"
+        decomposability_task.uses_hosted_tools = False
         task.decomposability_task = decomposability_task
 
-        thread, run = decomposability_task.run(self.agent_list, self.log_file_path, self.data_file_path)
+        return decomposability_task
 
+    # Get the decomposability tool call from a finished decomposability run
+    def get_decomposability_tool_call(self, task, run):
+        decomposability_task = task.decomposability_task
         tool_calls = functions.get_tool_calls(run)
 
         if tool_calls is None:
-            print(f"Warning: Run failed or no tool calls returned for task '{task.title}'")
+            logger.warning("Run failed or no tool calls returned for task '%s'", task.title)
             task.is_decomposable = False
-            return
+            return None
 
         decomposability_task.tool_calls = tool_calls
         
-        decomposability_tool_call = None
-        for tool_call in tool_calls:
-            if tool_call.function.name == functions.decomposability["name"]:
-                decomposability_tool_call = tool_call
-                break
+        decomposability_tool_call = self.find_tool_call(tool_calls, functions.decomposability["name"])
 
         if decomposability_tool_call is None:
-            print(f"Warning: No decomposability function call found for task '{task.title}'")
+            logger.warning("No decomposability function call found for task '%s'", task.title)
             task.is_decomposable = False
-            return
 
-        decomposability_task.finish(run, thread, decomposability_tool_call, "Completed." )  
+        return decomposability_tool_call
 
+    # Set the task's decomposability from the decomposability tool call
+    def parse_decomposability(self, task, decomposability_tool_call):
         try:
             decomposable_result = json.loads(decomposability_tool_call.function.arguments)
             task.is_decomposable = decomposable_result.get("is_decomposable", False)
+
+            # Parse the decomposition from the same run right away
+            if task.is_decomposable:
+                decompose_tool_call = self.find_tool_call(task.decomposability_task.tool_calls, functions.decompose_and_assign["name"])
+                self.parse_decomposition(task, decompose_tool_call)
         except json.JSONDecodeError:
-            print(f"Error: Failed to parse decomposability result for task '{task.title}'")
+            logger.error("Failed to parse decomposability result for task '%s'", task.title)
             task.is_decomposable = False
 
     # Identify delegate and assign task 
-    def delegate(self, agent_spec, task_spec):
-        agent_id = agent_spec.get("agent_id")
-        agent_name = agent_spec.get("agent_name")
-        agent_instructions = agent_spec.get("agent_instructions", f"Perform the task: {task_spec.get('subtask_description', 'No description provided')}")
+    def delegate(self, agent_spec, task):
+        agent_id, agent_name, agent_instructions, agent_tools, function_list = self.get_delegate_spec(agent_spec, task)
+
+        # Subtasks assigned to the same agent share it, even when they are
+        # delegated concurrently
+        agent = self.registry.get_or_add_agent(
+            make_key(task.namespace, agent_id),
+            lambda: self.create_delegate(task, agent_id, agent_name, agent_instructions, agent_tools, function_list),
+        )
 
-        agent_tools = [enums.Tool.RETRIEVAL, enums.Tool.CODE_INTERPRETER]
-        function_list = [functions.research, functions.decomposability, functions.decompose_and_assign]
-        
-        agent = Agent(self.log_file_path, 
+        task_id = agent.receive_task(task)
+        return agent.work(task_id)
+
+    # Async version of delegate. The assistant is created with the async
+    # client before the agent is constructed so the loop is never blocked.
+    async def async_delegate(self, agent_spec, task):
+        agent_id, agent_name, agent_instructions, agent_tools, function_list = self.get_delegate_spec(agent_spec, task)
+
+        async def create():
+            assistant = await self.async_create_assistant(
+                name=agent_name,
+                instructions=agent_instructions,
+                tools=self.build_tools(agent_tools, function_list),
+                file_ids=self.file_ids,
+            )
+            return self.create_delegate(task, agent_id, agent_name, agent_instructions, agent_tools, function_list, assistant)
+
+        agent = await self.registry.async_get_or_add_agent(make_key(task.namespace, agent_id), create)
+
+        task_id = agent.receive_task(task)
+        return await agent.async_work(task_id)
+
+    # Create the agent a task is delegated to, sharing the swarm's budget,
+    # caches and policies
+    def create_delegate(self, task, agent_id, agent_name, agent_instructions, agent_tools, function_list, assistant=None):
+        return Agent(self.log_file_path, 
                     self.data_file_path, 
                     self.model, 
                     self.research_url, 
-                    self.agent_list, 
+                    self.registry, 
                     self.client, 
                     agent_id, 
                     agent_name, 
@@ -267,14 +871,56 @@ class Agent:
                     self.research, 
                     agent_tools, 
                     function_list, 
-                    self.file_ids)
+                    self.file_ids,
+                    async_client=self.async_client,
+                    assistant=assistant,
+                    budget=self.budget,
+                    assistant_pool=self.assistant_pool,
+                    response_cache=self.response_cache,
+                    planner=self.planner,
+                    namespace=task.namespace,
+                    knowledge_base=self.knowledge_base,
+                    retrieval_index=self.retrieval_index,
+                    journal=self.journal,
+                    checkpoint=self.checkpoint,
+                    tracer=self.tracer,
+                    ledger=self.ledger,
+                    summarizer=self.summarizer,
+                    backend=self.backend,
+                    batch_runner=self.batch_runner,
+                    speculator=self.speculator,
+                    task_timeout=self.task_timeout)
+
+    # Get the details of the agent a task is delegated to
+    def get_delegate_spec(self, agent_spec, task):
+        agent_id = agent_spec.get("agent_id")
+        agent_name = agent_spec.get("agent_name")
+        agent_instructions = agent_spec.get("agent_instructions", f"Perform the task: {task.description or 'No description provided'}")
+
+        agent_tools = [enums.Tool.RETRIEVAL, enums.Tool.CODE_INTERPRETER]
+        function_list = [functions.research, functions.decomposability, functions.decompose_and_assign]
 
-        task_id = agent.receive_task_spec(task_spec)
-        agent.work(task_id)
+        return agent_id, agent_name, agent_instructions, agent_tools, function_list
 
     # Do the assigned task
     def do(self, task):
-        prompt = f"""
+        if self.is_budget_spent(task.title):
+            return
+        task.description = self.build_do_prompt(task)
+        thread, run = task.run(self.registry, self.log_file_path, self.data_file_path)
+        task.release(run, thread)
+
+    # Async version of do
+    async def async_do(self, task):
+        if self.is_budget_spent(task.title):
+            return
+        task.description = self.build_do_prompt(task)
+        thread, run = await task.async_run(self.registry, self.log_file_path, self.data_file_path)
+        await task.async_release(run, thread)
+
+    # Build the prompt used to directly complete a task
+    def build_do_prompt(self, task):
+        return f"""
         Complete the following task:
         Task Title: {task.title}
         Task Description: {task.description}
@@ -291,21 +937,22 @@ class Agent:
         Begin your response now:
         """
 
-        task.description = prompt
-        thread, run = task.run(self.agent_list, self.log_file_path, self.data_file_path)
-
     # Get the subtask and agent specifications
     def get_subtask_agent_specs(self, task):
-        decompose_tool_call = None
-        decomposability_task = task.decomposability_task
-        for tool_call in decomposability_task.tool_calls:
-            if tool_call.function.name == functions.decompose_and_assign["name"]:
-                decompose_tool_call = tool_call
-                break 
+        if task.subtask_specs is None:
+            decompose_tool_call = self.find_tool_call(task.decomposability_task.tool_calls, functions.decompose_and_assign["name"])
+            self.parse_decomposition(task, decompose_tool_call)
+
+        return task.subtask_specs, task.agent_specs
+
+    # Parse the subtask and agent specifications from a decompose_and_assign
+    # tool call into the task. Returns True if there is anything to schedule.
+    def parse_decomposition(self, task, decompose_tool_call):
+        task.subtask_specs, task.agent_specs = [], []
 
         if decompose_tool_call is None:
-            print("Warning: No decompose_and_assign function call found.")
-            return [], []
+            logger.warning("No decompose_and_assign function call found.")
+            return False
 
         try:
             function_response = json.loads(decompose_tool_call.function.arguments)
@@ -317,10 +964,18 @@ class Agent:
                 if "agent_instructions" not in agent:
                     agent["agent_instructions"] = f"Perform tasks as assigned for {agent.get('agent_name', 'Unknown Agent')}"
             
-            return subtasks, agents
+            task.subtask_specs, task.agent_specs = subtasks, agents
         except json.JSONDecodeError:
-            print("Error: Failed to parse function arguments as JSON.")
-            return [], []
+            logger.error("Failed to parse function arguments as JSON.")
+
+        return bool(task.subtask_specs and task.agent_specs)
+
+    # Find the call to a function among a run's tool calls
+    def find_tool_call(self, tool_calls, function_name):
+        for tool_call in tool_calls or []:
+            if tool_call.function.name == function_name:
+                return tool_call
+        return None
 
     def __str__(self):
         return f"Agent ID: {self.id}, Name: {self.name}, Description: {self.description}"
\ No newline at end of file
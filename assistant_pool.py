@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import threading
+import openai
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Registry of assistants keyed by a hash of everything that defines their
+# behaviour, so agents with the same configuration share one remote
+# assistant instead of each creating their own. The key -> assistant ID
+# index is persisted so assistants are also reused across runs.
+class AssistantPool:
+    def __init__(self, client, index_path=None, async_client=None):
+        self.client = client
+        self.async_client = async_client
+        self.index_path = index_path
+        self.assistants = {}
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.index = self.load_index()
+
+    # Hash the configuration that defines an assistant
+    def get_key(self, model, instructions, tools, file_ids):
+        config = {
+            "model": model,
+            "instructions": instructions,
+            "tools": tools,
+            "file_ids": sorted(file_ids or []),
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def load_index(self):
+        if not self.index_path or not os.path.isfile(self.index_path):
+            return {}
+
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.warning("Could not read assistant index '%s': %s", self.index_path, exc)
+            return {}
+
+    # Write the index atomically (call with the lock held)
+    def save_index(self):
+        if not self.index_path:
+            return
+
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.index_path)
+
+    def get_key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def store(self, key, assistant, created):
+        with self.lock:
+            self.assistants[key] = assistant
+            if created:
+                self.created += 1
+            else:
+                self.reused += 1
+            if self.index.get(key) != assistant.id:
+                self.index[key] = assistant.id
+                self.save_index()
+
+    # Get an assistant with the given configuration, creating it only if no
+    # matching assistant exists in memory or in the persisted index
+    def get_or_create(self, name, instructions, tools, model, file_ids):
+        key = self.get_key(model, instructions, tools, file_ids)
+
+        # Common case: already pooled in this process
+        assistant = self.assistants.get(key)
+        if assistant is not None:
+            with self.lock:
+                self.reused += 1
+            return assistant
+
+        with self.get_key_lock(key):
+            assistant = self.assistants.get(key)
+            if assistant is not None:
+                with self.lock:
+                    self.reused += 1
+                return assistant
+
+            assistant_id = self.index.get(key)
+            if assistant_id:
+                try:
+                    assistant = self.client.beta.assistants.retrieve(assistant_id)
+                    self.store(key, assistant, created=False)
+                    return assistant
+                except openai.NotFoundError:
+                    logger.warning("Pooled assistant %s no longer exists; creating a new one", assistant_id)
+
+            assistant = self.client.beta.assistants.create(
+                name=name,
+                instructions=instructions,
+                tools=tools,
+                model=model,
+                file_ids=file_ids
+            )
+            self.store(key, assistant, created=True)
+            return assistant
+
+    # Async version of get_or_create. Concurrent coroutines that miss the
+    # pool for the same key may each create an assistant; the last one wins.
+    async def async_get_or_create(self, name, instructions, tools, model, file_ids):
+        key = self.get_key(model, instructions, tools, file_ids)
+
+        assistant = self.assistants.get(key)
+        if assistant is not None:
+            with self.lock:
+                self.reused += 1
+            return assistant
+
+        assistant_id = self.index.get(key)
+        if assistant_id:
+            try:
+                assistant = await self.async_client.beta.assistants.retrieve(assistant_id)
+                self.store(key, assistant, created=False)
+                return assistant
+            except openai.NotFoundError:
+                logger.warning("Pooled assistant %s no longer exists; creating a new one", assistant_id)
+
+        assistant = await self.async_client.beta.assistants.create(
+            name=name,
+            instructions=instructions,
+            tools=tools,
+            model=model,
+            file_ids=file_ids
+        )
+        self.store(key, assistant, created=True)
+        return assistant
+
+    # Update an assistant in place and re-key it under its new configuration
+    def update(self, assistant, name, instructions, tools, model, file_ids):
+        assistant = self.client.beta.assistants.update(
+            assistant.id,
+            name=name,
+            instructions=instructions,
+            tools=tools,
+            model=model,
+            file_ids=file_ids,
+        )
+
+        key = self.get_key(model, instructions, tools, file_ids)
+        with self.lock:
+            for old_key, assistant_id in list(self.index.items()):
+                if assistant_id == assistant.id:
+                    del self.index[old_key]
+                    self.assistants.pop(old_key, None)
+            self.assistants[key] = assistant
+            self.index[key] = assistant.id
+            self.save_index()
+
+        return assistant
+
+    def get_stats(self):
+        with self.lock:
+            return {"created": self.created, "reused": self.reused, "pooled": len(self.assistants)}
@@ -0,0 +1,211 @@
+import asyncio
+import concurrent.futures
+
+from contextlib import nullcontext
+from types import SimpleNamespace
+from batch import BatchError
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Tools only an assistant can run for us. Retrieval and file search are
+# only useful when the agent has knowledge files attached.
+HOSTED_TOOLS = ("code_interpreter",)
+FILE_TOOLS = ("retrieval", "file_search")
+
+# A chat completion dressed up as a finished run, so planning, caching and
+# accounting handle it like the run of an assistant. Tool calls of the
+# completion become the run's required action.
+class ChatRun:
+    def __init__(self, completion):
+        choice = completion.choices[0]
+        message = choice.message
+        self.id = completion.id
+        self.usage = getattr(completion, "usage", None)
+        self.created_at = getattr(completion, "created", None)
+        self.completed_at = self.created_at
+        self.last_error = None
+        self.required_action = None
+        self.outcome = getattr(message, "content", None) or ""
+
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            self.status = "requires_action"
+            self.required_action = SimpleNamespace(
+                type="submit_tool_outputs",
+                submit_tool_outputs=SimpleNamespace(tool_calls=tool_calls),
+            )
+        elif choice.finish_reason == "content_filter":
+            self.status = "failed"
+            self.last_error = SimpleNamespace(code="content_filter", message="The completion was filtered")
+        elif choice.finish_reason == "length":
+            self.status = "incomplete"
+        else:
+            self.status = "completed"
+
+# A stand-in for a run that was stopped before it finished, or never started
+def make_stopped_run(status):
+    return SimpleNamespace(id=None, status=status, required_action=None, last_error=None, usage=None)
+
+# A backend runs a task's prompt remotely, holding one of the execution
+# budget's run slots while it does
+class Backend:
+    name = None
+
+    def run_slot(self, task, agent):
+        return agent.budget.run_slot(task.depth)
+
+    def async_run_slot(self, task, agent):
+        return agent.budget.async_run_slot(task.depth)
+
+# Runs a task on its agent's assistant: a thread, a message and a run that
+# is streamed or polled until it finishes. A run checkpointed by an
+# interrupted swarm is re-attached to instead.
+class AssistantsBackend(Backend):
+    name = "assistants"
+
+    def execute(self, task, agent, prompt):
+        attached = task.reattach_run()
+        return attached if attached else task.create_thread_and_wait(prompt, agent.assistant.id)
+
+    async def async_execute(self, task, agent, prompt):
+        attached = await task.async_reattach_run()
+        if attached:
+            return attached[0], await attached[1]
+        return await task.async_create_thread_and_wait(prompt, agent.assistant.id)
+
+    def get_outcome(self, task, thread, run):
+        return task.get_outcome(thread)
+
+    async def async_get_outcome(self, task, thread, run):
+        return await task.async_get_outcome(thread)
+
+# Runs a task in a single chat completion with the agent's instructions and
+# functions. There is no thread to poll or read back, so a task finishes in
+# one request, but hosted tools are not available.
+class ChatBackend(Backend):
+    name = "chat"
+
+    # A completion cannot be cancelled, so the request is given the time
+    # left until the task's deadline instead
+    def execute(self, task, agent, prompt):
+        try:
+            with task.tracer.span("chat.create", task.owner_key):
+                completion = task.client.chat.completions.create(**build_request(agent, prompt), **get_timeout(task))
+        except Exception:
+            if not task.is_expired():
+                raise
+            return SimpleNamespace(id=None), make_stopped_run("expired")
+        return SimpleNamespace(id=completion.id), ChatRun(completion)
+
+    async def async_execute(self, task, agent, prompt):
+        try:
+            with task.tracer.span("chat.create", task.owner_key):
+                completion = await task.async_client.chat.completions.create(**build_request(agent, prompt), **get_timeout(task))
+        except Exception:
+            if not task.is_expired():
+                raise
+            return SimpleNamespace(id=None), make_stopped_run("expired")
+        return SimpleNamespace(id=completion.id), ChatRun(completion)
+
+    def get_outcome(self, task, thread, run):
+        return run.outcome
+
+    async def async_get_outcome(self, task, thread, run):
+        return run.outcome
+
+# Runs a task as one request of a batch job (see batch.BatchRunner). The
+# task waits for its batch without holding a run slot, so ready tasks from
+# the whole tree share batches. A request the batch could not complete is
+# retried as an interactive chat completion. A task past its deadline stops
+# waiting, though its request stays in the batch. With the threads engine
+# each waiting task blocks a thread of the budget's pool, so a batch holds
+# at most about MAX_THREADS requests; the async engine has no such limit.
+class BatchBackend(Backend):
+    name = "batch"
+
+    def run_slot(self, task, agent):
+        return nullcontext()
+
+    def async_run_slot(self, task, agent):
+        return nullcontext()
+
+    def execute(self, task, agent, prompt):
+        future = agent.batch_runner.submit(build_request(agent, prompt), task.checkpoint_key)
+        try:
+            with task.tracer.span("batch.wait", task.owner_key):
+                completion = future.result(timeout=task.get_time_left())
+        except concurrent.futures.TimeoutError:
+            return SimpleNamespace(id=None), make_stopped_run("expired")
+        except BatchError as exc:
+            logger.warning("%s; running task %s interactively", exc, task.key)
+            task.backend = CHAT.name
+            with CHAT.run_slot(task, agent):
+                return CHAT.execute(task, agent, prompt)
+
+        return SimpleNamespace(id=completion.id), ChatRun(completion)
+
+    async def async_execute(self, task, agent, prompt):
+        future = agent.batch_runner.submit(build_request(agent, prompt), task.checkpoint_key)
+        try:
+            with task.tracer.span("batch.wait", task.owner_key):
+                completion = await asyncio.wait_for(asyncio.wrap_future(future), task.get_time_left())
+        except asyncio.TimeoutError:
+            return SimpleNamespace(id=None), make_stopped_run("expired")
+        except BatchError as exc:
+            logger.warning("%s; running task %s interactively", exc, task.key)
+            task.backend = CHAT.name
+            async with CHAT.async_run_slot(task, agent):
+                return await CHAT.async_execute(task, agent, prompt)
+
+        return SimpleNamespace(id=completion.id), ChatRun(completion)
+
+    def get_outcome(self, task, thread, run):
+        return run.outcome
+
+    async def async_get_outcome(self, task, thread, run):
+        return run.outcome
+
+ASSISTANTS = AssistantsBackend()
+CHAT = ChatBackend()
+BATCH = BatchBackend()
+
+# Build the chat completion request for running a prompt on an agent: its
+# instructions as the system message and its functions as tools
+def build_request(agent, prompt):
+    request = {
+        "model": agent.model,
+        "messages": [
+            {"role": "system", "content": agent.description},
+            {"role": "user", "content": prompt},
+        ],
+    }
+
+    tools = [tool for tool in agent.build_tools() if tool["type"] == "function"]
+    if tools:
+        request["tools"] = tools
+    return request
+
+# Get the request timeout for a task with a deadline
+def get_timeout(task):
+    time_left = task.get_time_left()
+    return {} if time_left is None else {"timeout": max(time_left, 1.0)}
+
+# Get the hosted tools an agent's assistant would actually use
+def get_hosted_tools(agent):
+    tools = [tool["type"] for tool in agent.build_tools()]
+    return [tool for tool in tools if tool in HOSTED_TOOLS or (tool in FILE_TOOLS and agent.file_ids)]
+
+# Pick the backend a task runs on from its agent's backend mode. In "auto"
+# mode a task only runs on the assistant if it may use one of the hosted
+# tools the agent has; everything else is a single chat completion. In
+# batch mode leaf tasks are batched whatever the mode; planning and
+# summaries stay interactive since the rest of the tree waits on them.
+def select_backend(agent, task):
+    if agent.batch_runner is not None and task.role == "do":
+        return BATCH
+    if agent.backend == "chat":
+        return CHAT
+    if agent.backend == "auto" and (not task.uses_hosted_tools or not get_hosted_tools(agent)):
+        return CHAT
+    return ASSISTANTS
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import itertools
+import threading
+
+from concurrent.futures import Future
+from types import SimpleNamespace
+from log import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+class BatchError(Exception):
+    pass
+
+# Runs chat completion requests through the batch API, for objectives where
+# throughput and cost matter more than latency.
+#
+# Tasks anywhere in the tree submit requests and wait on a future. A
+# background thread writes the pending requests to a JSONL submission file
+# once max_batch_size of them are waiting or the oldest has waited linger
+# seconds, uploads it and creates a batch, then polls the batches it
+# submitted every poll_interval seconds and resolves each request's future
+# with its completion (or a BatchError) from the batch's output files.
+class BatchRunner:
+    def __init__(self, client, directory, max_batch_size=100, linger=5.0, poll_interval=30.0, completion_window="24h"):
+        self.client = client
+        self.directory = directory
+        self.max_batch_size = max_batch_size
+        self.linger = linger
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.lock = threading.Condition()
+        self.pending = []
+        self.oldest = None
+        self.closed = False
+        self.ids = itertools.count(1)
+
+        # Batches being tracked; only touched by the background thread
+        self.batches = []
+        self.stats = {"batches": 0, "requests": 0, "failed_requests": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.process, name="batch-runner", daemon=True)
+        self.thread.start()
+
+    # Queue a chat completion request. Returns a future resolved with the
+    # completion once its batch has finished.
+    def submit(self, request, label="request"):
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise BatchError("The batch runner is closed")
+            self.pending.append((f"{label}#{next(self.ids)}", request, future))
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            self.lock.notify()
+        return future
+
+    def process(self):
+        next_poll = 0.0
+        while True:
+            with self.lock:
+                timeout = self.get_timeout(next_poll)
+                if timeout is None or timeout > 0:
+                    self.lock.wait(timeout)
+                ready = self.take_ready()
+
+            if ready:
+                self.submit_batch(ready)
+            if self.batches and time.monotonic() >= next_poll:
+                self.poll_batches()
+                next_poll = time.monotonic() + self.poll_interval
+
+            with self.lock:
+                if self.closed and not self.pending and not self.batches:
+                    return
+
+    # Seconds until there is something to submit or poll, or None to wait
+    # for a request (call with the lock held)
+    def get_timeout(self, next_poll):
+        deadlines = []
+        if self.pending:
+            if self.closed or len(self.pending) >= self.max_batch_size:
+                return 0
+            deadlines.append(self.oldest + self.linger)
+        if self.batches:
+            deadlines.append(next_poll)
+        if not deadlines:
+            return 0 if self.closed else None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    # Take the next batch of pending requests if it is due (call with the
+    # lock held)
+    def take_ready(self):
+        if not self.pending:
+            return []
+        if not self.closed and len(self.pending) < self.max_batch_size and time.monotonic() - self.oldest < self.linger:
+            return []
+
+        ready, self.pending = self.pending[:self.max_batch_size], self.pending[self.max_batch_size:]
+        self.oldest = time.monotonic() if self.pending else None
+        return ready
+
+    # Write the requests to a submission file and create a batch from it
+    def submit_batch(self, ready):
+        path = os.path.join(self.directory, f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{next(self.ids)}.jsonl")
+        futures = {custom_id: future for custom_id, _, future in ready}
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                for custom_id, request, _ in ready:
+                    f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": request}) + "\n")
+
+            with open(path, 'rb') as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+            batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=self.completion_window)
+        except Exception as exc:
+            logger.warning("Could not submit a batch of %d requests: %s", len(ready), exc)
+            self.fail(futures, BatchError(f"Batch submission failed: {exc}"))
+            return
+
+        logger.info("Submitted batch %s with %d requests", batch.id, len(ready))
+        self.batches.append(SimpleNamespace(id=batch.id, path=path, futures=futures))
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(ready)
+
+    # Check the submitted batches and collect the results of finished ones
+    def poll_batches(self):
+        for tracked in list(self.batches):
+            try:
+                batch = self.client.batches.retrieve(tracked.id)
+            except Exception as exc:
+                logger.warning("Could not check batch %s: %s", tracked.id, exc)
+                continue
+
+            if batch.status not in FINAL_BATCH_STATUSES:
+                logger.info("Batch %s status: %s", batch.id, batch.status, extra={"progress": True})
+                continue
+
+            self.batches.remove(tracked)
+            self.collect(tracked, batch)
+
+    # Resolve the futures of a finished batch from its output and error
+    # files. Requests without a successful response fail.
+    def collect(self, tracked, batch):
+        results = {}
+        for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+            if file_id:
+                results.update(self.read_results(tracked, file_id))
+
+        logger.info("Batch %s %s: %d of %d results", batch.id, batch.status, len(results), len(tracked.futures))
+        for custom_id, future in tracked.futures.items():
+            # Tasks past their deadline stop waiting for their request
+            if future.done():
+                continue
+            try:
+                future.set_result(self.parse_result(custom_id, batch, results.get(custom_id)))
+            except BatchError as exc:
+                self.stats["failed_requests"] += 1
+                future.set_exception(exc)
+
+    # Get the completion of one request from its result line. Raises a
+    # BatchError if the request failed or its result is malformed.
+    def parse_result(self, custom_id, batch, result):
+        try:
+            response = (result or {}).get("response") or {}
+            if response.get("status_code") == 200:
+                return to_namespace(response["body"])
+            error = result.get("error") if result else None
+            error = error or (response.get("body") or {}).get("error") or f"batch {batch.status}"
+        except (AttributeError, KeyError, TypeError) as exc:
+            raise BatchError(f"Request {custom_id} in batch {batch.id} has a malformed result: {exc!r}") from exc
+        raise BatchError(f"Request {custom_id} in batch {batch.id} failed: {error}")
+
+    # Download a batch's results, keeping a copy next to its submission
+    # file. Returns them keyed by custom ID.
+    def read_results(self, tracked, file_id):
+        try:
+            content = self.client.files.content(file_id)
+            text = content.text if hasattr(content, "text") else content.decode('utf-8')
+            with open(tracked.path.replace(".jsonl", f".{file_id}.jsonl"), 'w', encoding='utf-8') as f:
+                f.write(text)
+        except Exception as exc:
+            logger.warning("Could not read results file %s of batch %s: %s", file_id, tracked.id, exc)
+            return {}
+
+        # A line that cannot be parsed leaves its request without a result,
+        # which fails it
+        results = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+                results[result["custom_id"]] = result
+            except (json.JSONDecodeError, KeyError, TypeError) as exc:
+                logger.warning("Skipping malformed line in results file %s of batch %s: %r", file_id, tracked.id, exc)
+        return results
+
+    def fail(self, futures, exc):
+        self.stats["failed_requests"] += len(futures)
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    # Submit the remaining requests, wait for every batch to finish and
+    # stop the background thread
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.lock.notify()
+        self.thread.join()
+
+# Turn a decoded JSON body into attribute access, like the client's models
+def to_namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(item) for item in value]
+    return value
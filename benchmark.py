@@ -0,0 +1,181 @@
+import os
+import shutil
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+from contextlib import redirect_stdout
+
+import swarm
+from budget import ExecutionBudget
+from assistant_pool import AssistantPool
+from research import Research
+from planner import Planner
+from registry import Registry
+from journal import RunJournal
+from batch import BatchRunner
+from speculation import Speculator
+from tracing import Tracer
+from accounting import TokenLedger
+from log import ROOT_LOGGER, setup_logging
+from fake_api import FakeOpenAI, AsyncFakeOpenAI, FakeScript, FakeState, constant, lognormal
+
+# Samples the number of live threads in the background to find the peak
+class ThreadSampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+# Run one objective through swarm.py's agent setup against the fake API and
+# measure it
+def run_benchmark(script, engine="threads", max_runs=8, max_threads=16, title="Benchmark Objective", description="Benchmark the swarm.", quiet=True, planner=None, checkpoint=None, tracer=None, ledger=None, summarizer=None, backend="assistants", batch=False, speculator=None, task_timeout=None, timeout=None, state=None, work_path=None):
+    state = state or FakeState(script)
+    client = FakeOpenAI(state=state)
+    async_client = AsyncFakeOpenAI(state=state)
+
+    # Journals and batch files go to work_path if given (and are kept there),
+    # otherwise to a temporary directory removed afterwards
+    keep = work_path is not None
+    work_path = work_path or tempfile.mkdtemp(prefix="swarm_benchmark_")
+    log_file_path = os.path.join(work_path, "logs")
+
+    budget = ExecutionBudget(max_runs, max_threads)
+    assistant_pool = AssistantPool(client, None, async_client)
+    research = Research(os.path.join(work_path, "data"), "http://localhost/fake")
+    registry = Registry()
+    journal = RunJournal(log_file_path)
+    # The linger leaves room for a garbage collection pause between sibling
+    # requests, so leaves finishing together still share a batch
+    batch_runner = BatchRunner(client, os.path.join(work_path, "batches"), linger=0.25, poll_interval=0.05) if batch else None
+
+    # Quiet runs only show errors
+    swarm_logger = logging.getLogger(ROOT_LOGGER)
+    level = swarm_logger.level
+    if quiet:
+        swarm_logger.setLevel(logging.ERROR)
+
+    output = open(os.devnull, "w") if quiet else sys.stdout
+    try:
+        with redirect_stdout(output):
+            top_agent = swarm.create_top_agent(registry, client, async_client, "fake-model", [], research, budget, assistant_pool, None, planner, log_file_path=log_file_path, journal=journal, checkpoint=checkpoint, tracer=tracer, ledger=ledger, summarizer=summarizer, backend=backend, batch_runner=batch_runner, speculator=speculator, task_timeout=task_timeout)
+            task_id = top_agent.receive_task_desc(title, description)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            with ThreadSampler() as sampler:
+                swarm.run_objective(top_agent, task_id, engine, timeout)
+            wall_time = time.perf_counter() - started
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        budget.shutdown()
+        if batch_runner:
+            batch_runner.close()
+        journal.close()
+        swarm_logger.setLevel(level)
+        if quiet:
+            output.close()
+        if not keep:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    return {
+        "engine": engine,
+        "wall_time": wall_time,
+        "api_calls": sum(state.calls.values()),
+        "calls": dict(state.calls),
+        "runs": state.calls["runs.create"] + state.calls["chat.completions.create"] + state.batch_requests,
+        "peak_threads": sampler.peak,
+        "peak_memory_bytes": peak_memory,
+        "budget": budget.get_stats(),
+        "registry": registry.get_stats(),
+        "journal_records": journal.records,
+        "tokens": ledger.get_stats() if ledger else None,
+        "batch": batch_runner.get_stats() if batch_runner else None,
+        "speculation": speculator.get_stats() if speculator else None,
+        "outcome_length": len(top_agent.task_list[0].outcome or ""),
+        "incomplete_tasks": sum(1 for task in registry.tasks.values() if not task.is_complete),
+    }
+
+def format_result(result):
+    calls = ", ".join(f"{endpoint}={count}" for endpoint, count in sorted(result["calls"].items()))
+    return (f"[{result['engine']}] wall {result['wall_time']:.2f}s, {result['api_calls']} API calls ({result['runs']} runs), "
+            f"peak threads {result['peak_threads']}, peak memory {result['peak_memory_bytes'] / 1024:.0f} KiB\n"
+            f"    calls: {calls}")
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark the swarm against an in-process fake OpenAI API.")
+    parser.add_argument("--fanout", type=int, default=3, help="Subtasks per decomposition")
+    parser.add_argument("--depth", type=int, default=2, help="Decomposition depth")
+    parser.add_argument("--chain", action="store_true", help="Make each subtask depend on the previous one")
+    parser.add_argument("--run-latency", type=float, default=0.5, help="Median remote run latency in seconds (lognormal)")
+    parser.add_argument("--request-latency", type=float, default=0.02, help="Latency of every API call in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that a run fails")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability that an API call raises a server error")
+    parser.add_argument("--engine", choices=["threads", "async", "both"], default="both")
+    parser.add_argument("--max-runs", type=int, default=8)
+    parser.add_argument("--max-threads", type=int, default=16)
+    parser.add_argument("--planning", choices=["single", "separate"], default="single", help="Plan in one round trip or with a separate decomposability run")
+    parser.add_argument("--backend", choices=["assistants", "chat", "auto"], default="assistants", help="Run tasks on assistants, as chat completions, or pick per task")
+    parser.add_argument("--batch", action="store_true", help="Run leaf tasks through the batch API")
+    parser.add_argument("--speculate", action="store_true", help="Do tasks speculatively while their decomposability is checked (with --planning separate)")
+    parser.add_argument("--timeout", type=float, help="Seconds the objective may take")
+    parser.add_argument("--task-timeout", type=float, help="Seconds each task (with its subtasks) may take")
+    parser.add_argument("--preclassify", action="store_true", help="Skip planning for tasks that look atomic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-tokens", type=int, help="Token budget of the objective")
+    parser.add_argument("--trace", metavar="DIR", help="Write a Chrome trace and an OpenTelemetry trace of each run to DIR")
+    parser.add_argument("--verbose", action="store_true", help="Show the swarm's own output")
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    engines = ["threads", "async"] if args.engine == "both" else [args.engine]
+    logging_pipeline = setup_logging("INFO") if args.verbose else None
+
+    for engine in engines:
+        script = FakeScript(
+            fanout=args.fanout,
+            depth=args.depth,
+            chain_dependencies=args.chain,
+            failure_rate=args.failure_rate,
+            error_rate=args.error_rate,
+            request_latency=constant(args.request_latency),
+            run_latency=lognormal(args.run_latency),
+            seed=args.seed,
+        )
+        planner = Planner(args.planning == "single", args.preclassify)
+        tracer = Tracer() if args.trace else None
+        ledger = TokenLedger(args.max_tokens)
+        result = run_benchmark(script, engine, args.max_runs, args.max_threads, quiet=not args.verbose, planner=planner, tracer=tracer, ledger=ledger, backend=args.backend, batch=args.batch, speculator=Speculator() if args.speculate else None, task_timeout=args.task_timeout, timeout=args.timeout)
+        print(format_result(result))
+        print(f"    tokens: {result['tokens']}")
+        if result["speculation"]:
+            print(f"    speculation: {result['speculation']}")
+        if tracer:
+            chrome_path, _ = tracer.export(args.trace, f"benchmark-{engine}")
+            print(f"    trace: {chrome_path} ({tracer.get_stats()['spans']} spans)")
+
+    if logging_pipeline:
+        logging_pipeline.stop()
+
+if __name__ == "__main__":
+    main()
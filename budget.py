@@ -0,0 +1,240 @@
+import time
+import asyncio
+import threading
+
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Parse per-depth quotas from a string like "0:2,1:4,2:8"
+def parse_depth_quotas(value):
+    depth_quotas = {}
+    if not value:
+        return depth_quotas
+
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        depth, quota = item.split(":")
+        depth_quotas[int(depth)] = int(quota)
+
+    return depth_quotas
+
+# A unit of work submitted to the budget. It is run exactly once, either by
+# a pool thread or inline by a parent that is waiting on it.
+class Job:
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.claimed = False
+        self.lock = threading.Lock()
+
+    def claim(self):
+        with self.lock:
+            if self.claimed:
+                return False
+            self.claimed = True
+            return True
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args)
+        except BaseException as exc:
+            self.future.set_exception(exc)
+        else:
+            self.future.set_result(result)
+
+# Swarm-wide execution budget shared by every agent.
+#
+# Run slots bound how many remote runs are in flight at once (overall and
+# per task depth). They are only held while a run is executing, so a parent
+# never holds a slot while it waits for its children.
+#
+# Subtasks are executed on one bounded thread pool. A parent waiting on its
+# children runs any child that has not started yet on its own thread, so
+# the pool cannot deadlock however deep the delegation goes.
+class ExecutionBudget:
+    def __init__(self, max_runs=8, max_threads=16, depth_quotas=None):
+        self.max_runs = max_runs
+        self.max_threads = max_threads
+        self.depth_quotas = depth_quotas or {}
+
+        self.run_slots = threading.BoundedSemaphore(max_runs)
+        self.depth_slots = {depth: threading.BoundedSemaphore(quota) for depth, quota in self.depth_quotas.items()}
+        self.async_run_slots = None
+        self.async_depth_slots = None
+
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="swarm")
+        self.jobs = {}
+
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.active_runs = 0
+        self.peak_runs = 0
+        self.run_count = 0
+        self.waiting_runs = 0
+        self.peak_waiting_runs = 0
+        self.run_wait_seconds = 0.0
+        self.slot_seconds = 0.0
+        self.last_change = self.started_at
+        self.queued_jobs = 0
+        self.peak_queued_jobs = 0
+        self.inline_jobs = 0
+        self.active_threads = 0
+        self.peak_threads = 0
+
+    # Submit work to the shared pool
+    def submit(self, fn, *args):
+        job = Job(fn, args)
+        with self.lock:
+            self.jobs[job.future] = job
+            self.queued_jobs += 1
+            self.peak_queued_jobs = max(self.peak_queued_jobs, self.queued_jobs)
+        job.future.add_done_callback(self.forget_job)
+
+        self.executor.submit(self.run_job, job)
+        return job.future
+
+    def forget_job(self, future):
+        with self.lock:
+            self.jobs.pop(future, None)
+
+    # Run a job on a pool thread unless a waiting parent already ran it
+    def run_job(self, job):
+        if not job.claim():
+            return
+
+        with self.lock:
+            self.queued_jobs -= 1
+            self.active_threads += 1
+            self.peak_threads = max(self.peak_threads, self.active_threads)
+        try:
+            job.run()
+        finally:
+            with self.lock:
+                self.active_threads -= 1
+
+    # Wait until at least one of the futures is done, running queued jobs
+    # inline in the meantime. Returns the set of done futures.
+    def wait_any(self, futures):
+        while True:
+            done = {future for future in futures if future.done()}
+            if done:
+                return done
+
+            job = self.claim_queued_job(futures)
+            if job is None:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                return done
+
+            job.run()
+
+    def claim_queued_job(self, futures):
+        for future in futures:
+            with self.lock:
+                job = self.jobs.get(future)
+            if job is not None and job.claim():
+                with self.lock:
+                    self.queued_jobs -= 1
+                    self.inline_jobs += 1
+                return job
+        return None
+
+    # Hold a run slot (and the quota for the task's depth) while a remote run
+    # is executing
+    @contextmanager
+    def run_slot(self, depth=0):
+        depth_slot = self.depth_slots.get(depth)
+        self.start_waiting()
+        started = time.monotonic()
+        if depth_slot:
+            depth_slot.acquire()
+        self.run_slots.acquire()
+        self.start_run(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self.finish_run()
+            self.run_slots.release()
+            if depth_slot:
+                depth_slot.release()
+
+    # Async version of run_slot
+    @asynccontextmanager
+    async def async_run_slot(self, depth=0):
+        if self.async_run_slots is None:
+            self.async_run_slots = asyncio.Semaphore(self.max_runs)
+            self.async_depth_slots = {depth: asyncio.Semaphore(quota) for depth, quota in self.depth_quotas.items()}
+
+        depth_slot = self.async_depth_slots.get(depth)
+        self.start_waiting()
+        started = time.monotonic()
+        if depth_slot:
+            await depth_slot.acquire()
+        await self.async_run_slots.acquire()
+        self.start_run(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self.finish_run()
+            self.async_run_slots.release()
+            if depth_slot:
+                depth_slot.release()
+
+    def start_waiting(self):
+        with self.lock:
+            self.waiting_runs += 1
+            self.peak_waiting_runs = max(self.peak_waiting_runs, self.waiting_runs)
+
+    def start_run(self, waited):
+        with self.lock:
+            self.accumulate_slot_time()
+            self.waiting_runs -= 1
+            self.run_wait_seconds += waited
+            self.active_runs += 1
+            self.run_count += 1
+            self.peak_runs = max(self.peak_runs, self.active_runs)
+
+    def finish_run(self):
+        with self.lock:
+            self.accumulate_slot_time()
+            self.active_runs -= 1
+
+    # Integrate slot usage over time (call with the lock held)
+    def accumulate_slot_time(self):
+        now = time.monotonic()
+        self.slot_seconds += self.active_runs * (now - self.last_change)
+        self.last_change = now
+
+    def get_stats(self):
+        with self.lock:
+            self.accumulate_slot_time()
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            return {
+                "max_runs": self.max_runs,
+                "max_threads": self.max_threads,
+                "active_runs": self.active_runs,
+                "peak_runs": self.peak_runs,
+                "run_count": self.run_count,
+                "waiting_runs": self.waiting_runs,
+                "peak_waiting_runs": self.peak_waiting_runs,
+                "run_wait_seconds": self.run_wait_seconds,
+                "slot_utilisation": self.slot_seconds / (self.max_runs * elapsed),
+                "queued_jobs": self.queued_jobs,
+                "peak_queued_jobs": self.peak_queued_jobs,
+                "inline_jobs": self.inline_jobs,
+                "peak_threads": self.peak_threads,
+            }
+
+    def report(self):
+        stats = self.get_stats()
+        return (f"Runs: {stats['run_count']} (peak {stats['peak_runs']}/{stats['max_runs']} concurrent, "
+                f"slot utilisation {stats['slot_utilisation']:.0%}), "
+                f"run queue peak {stats['peak_waiting_runs']} waiting {stats['run_wait_seconds']:.1f}s total, "
+                f"job queue peak {stats['peak_queued_jobs']}, {stats['inline_jobs']} run inline, "
+                f"peak threads {stats['peak_threads']}/{stats['max_threads']}")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
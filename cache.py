@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from collections import OrderedDict
+from types import SimpleNamespace
+
+# Stand-in for a run whose result was served from the cache. It looks enough
+# like a real run for functions.get_tool_calls and Task.finish to handle it.
+class CachedRun:
+    def __init__(self, entry):
+        self.id = None
+        self.status = entry["status"]
+        self.last_error = None
+        self.usage = None
+        self.required_action = None
+
+        if entry.get("tool_calls"):
+            tool_calls = [
+                SimpleNamespace(
+                    id=tool_call["id"],
+                    type="function",
+                    function=SimpleNamespace(name=tool_call["name"], arguments=tool_call["arguments"]),
+                )
+                for tool_call in entry["tool_calls"]
+            ]
+            self.required_action = SimpleNamespace(
+                type="submit_tool_outputs",
+                submit_tool_outputs=SimpleNamespace(tool_calls=tool_calls),
+            )
+
+# Build a cache entry from a finished run and its outcome
+def build_entry(run, outcome):
+    entry = {"status": run.status, "outcome": outcome, "tool_calls": None}
+
+    required_action = getattr(run, "required_action", None)
+    if run.status == "requires_action" and required_action is not None:
+        entry["tool_calls"] = [
+            {"id": tool_call.id, "name": tool_call.function.name, "arguments": tool_call.function.arguments}
+            for tool_call in required_action.submit_tool_outputs.tool_calls
+        ]
+
+    return entry
+
+# Content-addressed cache of task run results. An in-memory LRU sits in
+# front of an optional SQLite store; entries expire after ttl seconds and
+# the oldest are evicted once either tier is full.
+class ResponseCache:
+    def __init__(self, path=None, max_entries=256, max_disk_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.connection = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.connection.commit()
+
+    # Hash everything that determines the response to a run
+    def get_key(self, model, instructions, tools, prompt):
+        request = {"model": model, "instructions": instructions, "tools": tools, "prompt": prompt}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None:
+                created, entry = item
+                if not self.is_expired(created):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                del self.entries[key]
+
+            if self.connection is not None:
+                row = self.connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self.is_expired(created):
+                        self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                        self.connection.commit()
+                        entry = json.loads(value)
+                        self.remember(key, created, entry)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return entry
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.connection.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key, entry):
+        now = time.time()
+        with self.lock:
+            self.remember(key, now, entry)
+
+            if self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(entry), now, now),
+                )
+                self.evict_disk()
+                self.connection.commit()
+
+    # Add an entry to the in-memory LRU (call with the lock held)
+    def remember(self, key, created, entry):
+        self.entries[key] = (created, entry)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Drop expired entries and the least recently used ones beyond the size
+    # limit from the SQLite store (call with the lock held)
+    def evict_disk(self):
+        if self.ttl is not None:
+            self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+
+        count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+            }
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Durable record of a swarm run's progress, so an interrupted run can be
+# resumed without redoing finished work.
+#
+# Everything is keyed by run ID and the task's hierarchical key:
+#   objective - the title and description the run was started with
+#   plan      - whether a task was decomposed, and its subtask and agent specs
+#   outcome   - the final outcome of a task (its whole subtree is skipped)
+#   run       - the thread, run and message IDs of a remote run in flight,
+#               so a resumed run can re-attach to it instead of starting over
+# Each change is committed to SQLite as soon as it is made.
+class Checkpoint:
+    def __init__(self, path, run_id):
+        self.path = path
+        self.run_id = run_id
+        self.lock = threading.Lock()
+        self.restored_plans = 0
+        self.restored_outcomes = 0
+        self.reattached_runs = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints (run_id TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (run_id, kind, key))"
+        )
+        self.connection.commit()
+        self.records = self.load()
+
+    # Load every record of the run into memory
+    def load(self):
+        records = {}
+        rows = self.connection.execute("SELECT kind, key, value FROM checkpoints WHERE run_id = ?", (self.run_id,))
+        for kind, key, value in rows:
+            records[(kind, key)] = json.loads(value)
+        return records
+
+    def get(self, kind, key):
+        return self.records.get((kind, key))
+
+    def save(self, kind, key, value):
+        with self.lock:
+            self.records[(kind, key)] = value
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, kind, key, value, updated) VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, kind, key, json.dumps(value), time.time()),
+            )
+            self.connection.commit()
+
+    def delete(self, kind, key):
+        with self.lock:
+            self.records.pop((kind, key), None)
+            self.connection.execute("DELETE FROM checkpoints WHERE run_id = ? AND kind = ? AND key = ?", (self.run_id, kind, key))
+            self.connection.commit()
+
+    def save_objective(self, title, description):
+        self.save("objective", "", {"title": title, "description": description})
+
+    # Get the (title, description) the run was started with, or None
+    def get_objective(self):
+        objective = self.get("objective", "")
+        return (objective["title"], objective["description"]) if objective else None
+
+    # Save how a task was planned
+    def save_plan(self, task):
+        self.save("plan", task.key, {
+            "is_decomposable": bool(task.is_decomposable),
+            "subtask_specs": task.subtask_specs,
+            "agent_specs": task.agent_specs,
+            "outcome": task.outcome if task.is_complete else None,
+        })
+
+    # Restore how a task was planned. Returns True if a plan was saved.
+    def restore_plan(self, task):
+        plan = self.get("plan", task.key)
+        if plan is None:
+            return False
+
+        task.is_decomposable = plan["is_decomposable"]
+        task.subtask_specs = plan["subtask_specs"]
+        task.agent_specs = plan["agent_specs"]
+        if plan["outcome"] is not None:
+            with task.lock:
+                task.outcome = plan["outcome"]
+                task.is_complete = True
+        with self.lock:
+            self.restored_plans += 1
+        logger.info("Restored the plan for task %s from the checkpoint", task.key)
+        return True
+
+    def save_outcome(self, task):
+        if task.is_complete and task.outcome is not None:
+            self.save("outcome", task.key, {"outcome": task.outcome})
+
+    # Restore a finished task's outcome. Returns True if it was saved.
+    def restore_outcome(self, task):
+        saved = self.get("outcome", task.key)
+        if saved is None:
+            return False
+
+        with task.lock:
+            task.outcome = saved["outcome"]
+            task.is_complete = True
+        with self.lock:
+            self.restored_outcomes += 1
+        logger.info("Restored the outcome of task %s from the checkpoint", task.key)
+        return True
+
+    # Remember a remote run that has started
+    def start_run(self, key, thread_id, run_id, message_id):
+        self.save("run", key, {"thread_id": thread_id, "run_id": run_id, "message_id": message_id})
+
+    def finish_run(self, key):
+        if ("run", key) in self.records:
+            self.delete("run", key)
+
+    def get_run(self, key):
+        return self.get("run", key)
+
+    def record_reattached(self):
+        with self.lock:
+            self.reattached_runs += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "restored_plans": self.restored_plans,
+                "restored_outcomes": self.restored_outcomes,
+                "reattached_runs": self.reattached_runs,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Name of the manifest recording the content hash of every downloaded file
+MANIFEST_NAME = ".downloads.json"
+
+# Downloads files into a directory in parallel over one pooled session.
+#
+# Bodies are streamed in chunks to a ".part" file that is renamed into
+# place once complete, so memory stays constant and a crash never leaves a
+# truncated file behind. An interrupted download resumes from its ".part"
+# file with a Range request. The manifest maps each URL to the path and
+# SHA-256 of what was saved, so files already present (and intact) are
+# skipped, and a URL whose content matches a file already on disk is not
+# stored twice.
+class Downloader:
+    def __init__(self, directory, max_workers=8, session=None, chunk_size=64 * 1024, timeout=60):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.session = session if session is not None else self.create_session(max_workers)
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.manifest = self.load_manifest()
+
+    # Session whose connection pool is large enough for every worker
+    def create_session(self, max_workers):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return {}
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.warning("Could not read download manifest '%s': %s", self.manifest_path, exc)
+            return {}
+
+    # Write the manifest atomically (call with the lock held)
+    def save_manifest(self):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    # Download (url, filename) pairs concurrently and return one result per
+    # download, in the same order
+    def download_all(self, downloads):
+        os.makedirs(self.directory, exist_ok=True)
+        if not downloads:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(downloads))) as executor:
+            return list(executor.map(lambda download: self.download(*download), downloads))
+
+    # Download one file. Returns a dict with the url, path, status
+    # ("downloaded", "resumed", "skipped", "duplicate" or "failed"), bytes
+    # transferred and seconds taken.
+    def download(self, url, filename):
+        started = time.perf_counter()
+        path = os.path.join(self.directory, filename)
+        result = {"url": url, "path": path, "status": "failed", "bytes": 0, "seconds": 0.0}
+
+        try:
+            if self.is_present(url):
+                result["path"] = self.manifest[url]["path"]
+                result["status"] = "skipped"
+            else:
+                self.fetch(url, path, result)
+        except (requests.RequestException, OSError) as exc:
+            logger.warning("Failed to download %s: %s", url, exc)
+
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    # Check if the file saved for a URL is still on disk and intact
+    def is_present(self, url):
+        entry = self.manifest.get(url)
+        if entry is None or not os.path.isfile(entry["path"]):
+            return False
+        if os.path.getsize(entry["path"]) != entry["size"]:
+            return False
+        return get_file_hash(entry["path"]) == entry["sha256"]
+
+    def fetch(self, url, path, result):
+        part_path = f"{path}.part"
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # The partial file is already complete (or stale); start over
+                os.remove(part_path)
+                return self.fetch(url, path, result)
+            response.raise_for_status()
+
+            # Servers that ignore the Range header send the whole body again
+            resumed = offset > 0 and response.status_code == 206
+            file_hash = hash_file(part_path, hashlib.sha256()) if resumed else hashlib.sha256()
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        file_hash.update(chunk)
+                        result["bytes"] += len(chunk)
+
+        sha256 = file_hash.hexdigest()
+        size = os.path.getsize(part_path)
+        with self.lock:
+            duplicate = self.find_by_hash(sha256)
+            if duplicate is not None and duplicate != path:
+                os.remove(part_path)
+                path = duplicate
+                result["status"] = "duplicate"
+            else:
+                os.replace(part_path, path)
+                result["status"] = "resumed" if resumed else "downloaded"
+            result["path"] = path
+            self.manifest[url] = {"path": path, "sha256": sha256, "size": size}
+            self.save_manifest()
+
+    # Get the path of an intact file already saved with the given hash
+    # (call with the lock held)
+    def find_by_hash(self, sha256):
+        for entry in self.manifest.values():
+            if entry["sha256"] == sha256 and os.path.isfile(entry["path"]):
+                return entry["path"]
+        return None
+
+# Feed a file into a hash object in chunks and return the hash object
+def hash_file(path, file_hash, chunk_size=1024 * 1024):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash
+
+# Get the SHA-256 of a file
+def get_file_hash(path):
+    return hash_file(path, hashlib.sha256()).hexdigest()
@@ -0,0 +1,561 @@
+import re
+import copy
+import json
+import time
+import random
+import asyncio
+import itertools
+import threading
+import openai
+
+from collections import Counter
+from types import SimpleNamespace
+
+import functions
+
+# Latency distributions (in seconds) for API calls and remote runs
+def constant(seconds):
+    return lambda rng: seconds
+
+def uniform(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal(median, sigma=0.5):
+    return lambda rng: rng.lognormvariate(0, sigma) * median
+
+# Marker the fake puts into subtask descriptions to track tree depth
+DEPTH_PATTERN = re.compile(r"\[depth (\d+)\]")
+
+# Scripted behaviour of the fake API
+class FakeScript:
+    def __init__(self, fanout=3, depth=2, chain_dependencies=False, failure_rate=0.0, error_rate=0.0, response_words=200,
+                 request_latency=None, run_latency=None, seed=None):
+        self.fanout = fanout
+        self.depth = depth
+        self.chain_dependencies = chain_dependencies
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.response_words = response_words
+        self.request_latency = request_latency or constant(0.0)
+        self.run_latency = run_latency or constant(0.0)
+        self.rng = random.Random(seed)
+
+# Get the depth of the task a prompt is about (the objective is depth 0)
+def get_depth(prompt):
+    match = DEPTH_PATTERN.search(prompt)
+    return int(match.group(1)) if match else 0
+
+def get_tool_names(assistant):
+    return {tool["function"]["name"] for tool in assistant.tools if tool.get("type") == "function"}
+
+def make_tool_call(name, arguments):
+    return SimpleNamespace(
+        id=f"call_{name}_{next(ID_COUNTER)}",
+        type="function",
+        function=SimpleNamespace(name=name, arguments=json.dumps(arguments)),
+    )
+
+def make_message(message_id, role, text):
+    return SimpleNamespace(
+        id=message_id,
+        role=role,
+        content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text, annotations=[]))],
+    )
+
+# Turn a fake response object into the JSON body the API would send
+def to_dict(value):
+    if isinstance(value, SimpleNamespace):
+        return {key: to_dict(item) for key, item in vars(value).items()}
+    if isinstance(value, list):
+        return [to_dict(item) for item in value]
+    return value
+
+ID_COUNTER = itertools.count(1)
+
+# In-process stand-in for the Assistants, chat completion and batch
+# endpoints used by task.py, agent.py and batch.py. Runs finish after a latency drawn from the
+# script, and their results are scripted from the prompt: decomposability
+# prompts get decomposability/decompose_and_assign tool calls until the
+# configured depth is reached, everything else gets a canned text answer.
+class FakeState:
+    def __init__(self, script):
+        self.script = script
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.assistants = {}
+        self.threads = {}
+        self.runs = {}
+        self.files = {}
+        self.batches = {}
+        self.batch_requests = 0
+        self.open_streams = 0
+
+    def new_id(self, prefix):
+        return f"{prefix}_{next(ID_COUNTER)}"
+
+    # Count a call, inject errors and return the simulated request latency.
+    # A chat completion also takes as long as a run.
+    def begin_call(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] += 1
+            latency = self.script.request_latency(self.script.rng)
+            if endpoint == "chat.completions.create":
+                latency += self.script.run_latency(self.script.rng)
+            fail = self.script.rng.random() < self.script.error_rate
+        if fail:
+            response = SimpleNamespace(status_code=500, headers={}, request=None)
+            raise openai.InternalServerError(f"Injected error in {endpoint}", response=response, body=None)
+        return latency
+
+    def create_assistant(self, name=None, instructions=None, tools=None, model=None, file_ids=None, **kwargs):
+        assistant = SimpleNamespace(id=self.new_id("asst"), name=name, instructions=instructions, tools=tools or [], model=model, file_ids=file_ids or [])
+        with self.lock:
+            self.assistants[assistant.id] = assistant
+        return assistant
+
+    def retrieve_assistant(self, assistant_id):
+        with self.lock:
+            assistant = self.assistants.get(assistant_id)
+        if assistant is None:
+            response = SimpleNamespace(status_code=404, headers={}, request=None)
+            raise openai.NotFoundError(f"No assistant found with id '{assistant_id}'", response=response, body=None)
+        return assistant
+
+    def update_assistant(self, assistant_id, **kwargs):
+        assistant = self.retrieve_assistant(assistant_id)
+        with self.lock:
+            for key, value in kwargs.items():
+                setattr(assistant, key, value)
+        return assistant
+
+    def create_thread(self, **kwargs):
+        thread = SimpleNamespace(id=self.new_id("thread"))
+        with self.lock:
+            self.threads[thread.id] = []
+        return thread
+
+    def create_message(self, thread_id, role, content, **kwargs):
+        message = make_message(self.new_id("msg"), role, content)
+        with self.lock:
+            self.threads[thread_id].append(message)
+        return message
+
+    def list_messages(self, thread_id, order="desc", limit=20, after=None, **kwargs):
+        with self.lock:
+            messages = list(self.threads[thread_id])
+        if order == "desc":
+            messages.reverse()
+        if after is not None:
+            ids = [message.id for message in messages]
+            messages = messages[ids.index(after) + 1:] if after in ids else []
+        data = messages[:limit]
+        return SimpleNamespace(data=data, has_more=len(messages) > len(data))
+
+    def create_run(self, thread_id, assistant_id, **kwargs):
+        with self.lock:
+            duration = self.script.run_latency(self.script.rng)
+        run = SimpleNamespace(
+            id=self.new_id("run"),
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            status="queued",
+            required_action=None,
+            last_error=None,
+            usage=None,
+            created_at=int(time.time()),
+            completed_at=None,
+            failed_at=None,
+            cancelled_at=None,
+            expired_at=None,
+            finish_at=time.monotonic() + duration,
+        )
+        with self.lock:
+            self.runs[run.id] = run
+        return run
+
+    # Advance a run to its final state once its latency has elapsed and
+    # return a snapshot of it
+    def get_run(self, run_id):
+        with self.lock:
+            run = self.runs[run_id]
+            if run.status in ("queued", "in_progress"):
+                if time.monotonic() >= run.finish_at:
+                    self.finish_run(run)
+                else:
+                    run.status = "in_progress"
+            return copy.copy(run)
+
+    # Script the result of a run (call with the lock held)
+    def finish_run(self, run):
+        assistant = self.assistants[run.assistant_id]
+        messages = self.threads[run.thread_id]
+        prompt = messages[-1].content[0].text.value if messages else ""
+        result = self.script_result(prompt, get_tool_names(assistant))
+        now = int(time.time())
+
+        if result.status == "failed":
+            run.status = "failed"
+            run.failed_at = now
+            run.last_error = SimpleNamespace(code="server_error", message="Injected run failure")
+            return
+
+        if result.tool_calls:
+            run.status = "requires_action"
+            run.required_action = SimpleNamespace(type="submit_tool_outputs", submit_tool_outputs=SimpleNamespace(tool_calls=result.tool_calls))
+        else:
+            messages.append(make_message(self.new_id("msg"), "assistant", result.output))
+            run.status = "completed"
+            run.completed_at = now
+        run.usage = result.usage
+
+    # Script the answer to a prompt given the functions the model may call
+    # (call with the lock held)
+    def script_result(self, prompt, tool_names):
+        if self.script.rng.random() < self.script.failure_rate:
+            return SimpleNamespace(status="failed", tool_calls=None, output="", usage=None)
+
+        # A single-round-trip planning prompt only gets a decompose_and_assign
+        # call when the task should be split; otherwise it is answered
+        is_planning = "decompose_and_assign" in prompt and "decomposable function" not in prompt
+        should_plan = "decompose_and_assign" in prompt and functions.decomposability["name"] in tool_names
+        if is_planning and get_depth(prompt) >= self.script.depth:
+            should_plan = False
+
+        tool_calls = None
+        if should_plan:
+            tool_calls = self.plan(prompt)
+            if is_planning:
+                tool_calls = [tool_call for tool_call in tool_calls if tool_call.function.name == functions.decompose_and_assign["name"]]
+            output = json.dumps([tool_call.function.arguments for tool_call in tool_calls])
+        else:
+            output = self.answer(prompt)
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(output) // 4
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+        return SimpleNamespace(status="requires_action" if tool_calls else "completed", tool_calls=tool_calls, output=output, usage=usage)
+
+    # Answer a chat completion request in one go. Injected run failures
+    # surface as server errors, since a completion has no failed state.
+    def create_chat_completion(self, model=None, messages=None, tools=None, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        tool_names = {tool["function"]["name"] for tool in tools or [] if tool.get("type") == "function"}
+        with self.lock:
+            result = self.script_result(prompt, tool_names)
+
+        if result.status == "failed":
+            response = SimpleNamespace(status_code=500, headers={}, request=None)
+            raise openai.InternalServerError("Injected completion failure", response=response, body=None)
+
+        message = SimpleNamespace(role="assistant", content=None if result.tool_calls else result.output, tool_calls=result.tool_calls)
+        choice = SimpleNamespace(index=0, message=message, finish_reason="tool_calls" if result.tool_calls else "stop")
+        return SimpleNamespace(id=self.new_id("chatcmpl"), model=model, created=int(time.time()), choices=[choice], usage=result.usage)
+
+    # Script a decomposition for a decomposability prompt
+    def plan(self, prompt):
+        depth = get_depth(prompt)
+        is_decomposable = depth < self.script.depth
+        tool_calls = [make_tool_call(functions.decomposability["name"], {"is_decomposable": is_decomposable})]
+        if is_decomposable:
+            subtasks = []
+            for subtask_id in range(1, self.script.fanout + 1):
+                subtask = {
+                    "subtask_id": subtask_id,
+                    "subtask_title": f"Part {subtask_id} at depth {depth + 1}",
+                    "subtask_description": f"Work on part {subtask_id} of the parent task [depth {depth + 1}]",
+                    "assigned_agent_id": subtask_id,
+                }
+                if self.script.chain_dependencies and subtask_id > 1:
+                    subtask["dependent_upon"] = subtask_id - 1
+                subtasks.append(subtask)
+            agents = [
+                {"agent_id": subtask["assigned_agent_id"], "agent_name": f"Worker {subtask['assigned_agent_id']}", "agent_instructions": f"You are worker {subtask['assigned_agent_id']}."}
+                for subtask in subtasks
+            ]
+            tool_calls.append(make_tool_call(functions.decompose_and_assign["name"], {
+                "objective": "Scripted decomposition",
+                "subtasks": subtasks,
+                "agents": agents,
+                "assignments": [{"subtask_id": subtask["subtask_id"], "agent_id": subtask["assigned_agent_id"]} for subtask in subtasks],
+            }))
+        return tool_calls
+
+    def answer(self, prompt):
+        words = ["result"] * self.script.response_words
+        return f"Scripted answer ({len(prompt)} prompt characters): " + " ".join(words)
+
+    def submit_tool_outputs(self, thread_id, run_id, tool_outputs, **kwargs):
+        with self.lock:
+            run = self.runs[run_id]
+            run.status = "completed"
+            run.required_action = None
+            run.completed_at = int(time.time())
+            return copy.copy(run)
+
+    def cancel_run(self, thread_id, run_id, **kwargs):
+        with self.lock:
+            run = self.runs[run_id]
+            if run.status in ("queued", "in_progress", "requires_action"):
+                run.status = "cancelled"
+                run.cancelled_at = int(time.time())
+
+                # The prompt was read before the run was stopped
+                messages = self.threads[thread_id]
+                prompt_tokens = len(messages[-1].content[0].text.value) // 4 if messages else 0
+                run.usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=0, total_tokens=prompt_tokens)
+            return copy.copy(run)
+
+    def create_file(self, file=None, purpose=None, **kwargs):
+        content = file.read() if hasattr(file, "read") else file
+        uploaded = SimpleNamespace(id=self.new_id("file"), purpose=purpose, bytes=len(content or b""))
+        with self.lock:
+            self.files[uploaded.id] = content
+        return uploaded
+
+    def delete_file(self, file_id, **kwargs):
+        with self.lock:
+            self.files.pop(file_id, None)
+        return SimpleNamespace(id=file_id, deleted=True)
+
+    def get_file_content(self, file_id, **kwargs):
+        with self.lock:
+            content = self.files[file_id]
+        return SimpleNamespace(content=content, text=content.decode('utf-8'))
+
+    # Store a list of JSON lines as a file (call with the lock held)
+    def store_lines(self, lines):
+        file_id = self.new_id("file")
+        self.files[file_id] = "".join(json.dumps(line) + "\n" for line in lines).encode('utf-8')
+        return file_id
+
+    def create_batch(self, input_file_id, endpoint, completion_window, **kwargs):
+        with self.lock:
+            duration = self.script.run_latency(self.script.rng)
+            batch = SimpleNamespace(
+                id=self.new_id("batch"),
+                status="validating",
+                endpoint=endpoint,
+                input_file_id=input_file_id,
+                completion_window=completion_window,
+                output_file_id=None,
+                error_file_id=None,
+                created_at=int(time.time()),
+                completed_at=None,
+                finish_at=time.monotonic() + duration,
+            )
+            self.batches[batch.id] = batch
+            return copy.copy(batch)
+
+    # Answer a batch's requests from its input file once its latency has
+    # elapsed and return a snapshot of it. Injected failures become lines
+    # of the error file.
+    def get_batch(self, batch_id, **kwargs):
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch.status not in ("validating", "in_progress"):
+                return copy.copy(batch)
+            if time.monotonic() < batch.finish_at:
+                batch.status = "in_progress"
+                return copy.copy(batch)
+            batch.status = "finalizing"
+            lines = self.files[batch.input_file_id].decode('utf-8').splitlines()
+
+        outputs, errors = [], []
+        for line in lines:
+            request = json.loads(line)
+            try:
+                completion = self.create_chat_completion(**request["body"])
+                outputs.append({"id": self.new_id("batch_req"), "custom_id": request["custom_id"], "response": {"status_code": 200, "body": to_dict(completion)}, "error": None})
+            except openai.InternalServerError as exc:
+                errors.append({"id": self.new_id("batch_req"), "custom_id": request["custom_id"], "response": None, "error": {"code": "server_error", "message": str(exc)}})
+
+        with self.lock:
+            self.batch_requests += len(lines)
+            batch.output_file_id = self.store_lines(outputs)
+            batch.error_file_id = self.store_lines(errors) if errors else None
+            batch.status = "completed"
+            batch.completed_at = int(time.time())
+            return copy.copy(batch)
+
+    # Stream the events of a run until it reaches a final state
+    def stream_events(self, run):
+        yield SimpleNamespace(event="thread.run.created", data=copy.copy(run))
+        while True:
+            snapshot = self.get_run(run.id)
+            if snapshot.status not in ("queued", "in_progress"):
+                yield SimpleNamespace(event=f"thread.run.{snapshot.status}", data=snapshot)
+                return
+            time.sleep(max(0.0, min(run.finish_at - time.monotonic(), 0.05)))
+
+# Stream of run events that must be closed like openai.Stream, counting
+# the streams left open in the state
+class FakeStream:
+    def __init__(self, state, events):
+        self.state = state
+        self.events = events
+        self.closed = False
+        with state.lock:
+            state.open_streams += 1
+
+    def __iter__(self):
+        return self.events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.events.close()
+        with self.state.lock:
+            self.state.open_streams -= 1
+
+# Async version of FakeStream, like openai.AsyncStream
+class AsyncFakeStream:
+    def __init__(self, state, events):
+        self.state = state
+        self.events = events
+        self.closed = False
+        with state.lock:
+            state.open_streams += 1
+
+    def __aiter__(self):
+        return self.events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        await self.events.aclose()
+        with self.state.lock:
+            self.state.open_streams -= 1
+
+# Build a sync resource whose methods call into the shared state
+def sync_resource(state, endpoints):
+    resource = SimpleNamespace()
+    for attribute, (endpoint, method) in endpoints.items():
+        setattr(resource, attribute, make_sync_method(state, endpoint, method))
+    return resource
+
+def make_sync_method(state, endpoint, method):
+    def call(*args, **kwargs):
+        latency = state.begin_call(endpoint)
+        if latency:
+            time.sleep(latency)
+        return method(*args, **kwargs)
+    return call
+
+def async_resource(state, endpoints):
+    resource = SimpleNamespace()
+    for attribute, (endpoint, method) in endpoints.items():
+        setattr(resource, attribute, make_async_method(state, endpoint, method))
+    return resource
+
+def make_async_method(state, endpoint, method):
+    async def call(*args, **kwargs):
+        latency = state.begin_call(endpoint)
+        if latency:
+            await asyncio.sleep(latency)
+        return method(*args, **kwargs)
+    return call
+
+def get_endpoints(state, create_run):
+    return {
+        "assistants": {
+            "create": ("assistants.create", state.create_assistant),
+            "retrieve": ("assistants.retrieve", state.retrieve_assistant),
+            "update": ("assistants.update", state.update_assistant),
+        },
+        "threads": {
+            "create": ("threads.create", state.create_thread),
+        },
+        "messages": {
+            "create": ("messages.create", state.create_message),
+            "list": ("messages.list", state.list_messages),
+        },
+        "runs": {
+            "create": ("runs.create", create_run),
+            "retrieve": ("runs.retrieve", lambda thread_id, run_id, **kwargs: state.get_run(run_id)),
+            "submit_tool_outputs": ("runs.submit_tool_outputs", state.submit_tool_outputs),
+            "cancel": ("runs.cancel", state.cancel_run),
+        },
+        "files": {
+            "create": ("files.create", state.create_file),
+            "delete": ("files.delete", state.delete_file),
+            "content": ("files.content", state.get_file_content),
+        },
+        "batches": {
+            "create": ("batches.create", state.create_batch),
+            "retrieve": ("batches.retrieve", state.get_batch),
+        },
+        "completions": {
+            "create": ("chat.completions.create", state.create_chat_completion),
+        },
+    }
+
+# Fake sync client exposing the same attribute paths as OpenAI()
+class FakeOpenAI:
+    def __init__(self, script=None, state=None):
+        self.state = state or FakeState(script or FakeScript())
+
+        def create_run(thread_id, assistant_id, stream=False, **kwargs):
+            run = self.state.create_run(thread_id, assistant_id, **kwargs)
+            if stream:
+                return FakeStream(self.state, self.state.stream_events(run))
+            return self.state.get_run(run.id)
+
+        endpoints = get_endpoints(self.state, create_run)
+        threads = sync_resource(self.state, endpoints["threads"])
+        threads.messages = sync_resource(self.state, endpoints["messages"])
+        threads.runs = sync_resource(self.state, endpoints["runs"])
+        self.beta = SimpleNamespace(assistants=sync_resource(self.state, endpoints["assistants"]), threads=threads)
+        self.files = sync_resource(self.state, endpoints["files"])
+        self.chat = SimpleNamespace(completions=sync_resource(self.state, endpoints["completions"]))
+        self.batches = sync_resource(self.state, endpoints["batches"])
+
+    @property
+    def calls(self):
+        return self.state.calls
+
+# Fake async client sharing the state of a FakeOpenAI
+class AsyncFakeOpenAI:
+    def __init__(self, script=None, state=None):
+        self.state = state or FakeState(script or FakeScript())
+
+        def create_run(thread_id, assistant_id, stream=False, **kwargs):
+            run = self.state.create_run(thread_id, assistant_id, **kwargs)
+            if stream:
+                return AsyncFakeStream(self.state, self.stream_events(run))
+            return self.state.get_run(run.id)
+
+        endpoints = get_endpoints(self.state, create_run)
+        threads = async_resource(self.state, endpoints["threads"])
+        threads.messages = async_resource(self.state, endpoints["messages"])
+        threads.runs = async_resource(self.state, endpoints["runs"])
+        self.beta = SimpleNamespace(assistants=async_resource(self.state, endpoints["assistants"]), threads=threads)
+        self.files = async_resource(self.state, endpoints["files"])
+        self.chat = SimpleNamespace(completions=async_resource(self.state, endpoints["completions"]))
+        self.batches = async_resource(self.state, endpoints["batches"])
+
+    async def stream_events(self, run):
+        yield SimpleNamespace(event="thread.run.created", data=copy.copy(run))
+        while True:
+            snapshot = self.state.get_run(run.id)
+            if snapshot.status not in ("queued", "in_progress"):
+                yield SimpleNamespace(event=f"thread.run.{snapshot.status}", data=snapshot)
+                return
+            await asyncio.sleep(max(0.0, min(run.finish_at - time.monotonic(), 0.05)))
+
+    @property
+    def calls(self):
+        return self.state.calls
@@ -1,3 +1,7 @@
+from log import get_logger
+
+logger = get_logger(__name__)
+
 # Specify the function for the assistant to run
 decompose_and_assign = {
     "name": "decompose_and_assign",
@@ -79,11 +83,25 @@ decomposability = {
 # Get the response from the function
 def get_tool_calls(run):
     if run.status == "failed":
-        print(f"Warning: Run failed with error: {run.last_error}")
+        logger.warning("Run failed with error: %s", run.last_error)
         return None
 
     if run.required_action is None:
-        print("Warning: No required action in the run")
+        logger.warning("No required action in the run")
         return None
 
-    return run.required_action.submit_tool_outputs.tool_calls
\ No newline at end of file
+    return run.required_action.submit_tool_outputs.tool_calls
+
+# Get the text of every content part of a message. Images and other
+# non-text parts are replaced by a short placeholder.
+def get_message_text(message):
+    parts = []
+    for part in message.content:
+        if part.type == "text":
+            parts.append(part.text.value)
+        elif part.type == "image_file":
+            parts.append(f"[image file {part.image_file.file_id}]")
+        else:
+            parts.append(f"[{part.type}]")
+
+    return "\n\n".join(parts)
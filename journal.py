@@ -0,0 +1,185 @@
+import os
+import sys
+import gzip
+import json
+import time
+import uuid
+import queue
+import argparse
+import threading
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Suffixes of a run's journal and index files
+JOURNAL_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+
+# Marks the end of the writer queue
+STOP = object()
+
+def create_run_id():
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+def get_journal_path(directory, run_id):
+    return os.path.join(directory, run_id + JOURNAL_SUFFIX)
+
+def get_index_path(directory, run_id):
+    return os.path.join(directory, run_id + INDEX_SUFFIX)
+
+# Append-only journal of every task run in one swarm run.
+#
+# Records are queued by the tasks and written by a background thread, so
+# output I/O never happens on a task's thread. Each record is one line of
+# JSON compressed as its own gzip member; concatenated members are still a
+# valid gzip file, so the journal can be streamed with zcat. The index file
+# holds one JSON line per record with the task key, the role and part of
+# the run (a summary part, for instance) and the byte offset and length of
+# its member, for random access to a single task's output.
+class RunJournal:
+    def __init__(self, directory, run_id=None):
+        self.directory = directory
+        self.run_id = run_id or create_run_id()
+        self.path = get_journal_path(directory, self.run_id)
+        self.index_path = get_index_path(directory, self.run_id)
+        self.queue = queue.Queue()
+        self.records = 0
+        self.closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.write_records, name="run-journal", daemon=True)
+        self.thread.start()
+
+    # Queue a record to be written
+    def record(self, record):
+        if self.closed:
+            logger.warning("Run journal is closed; dropping record for task %s", record.get('key'))
+            return
+
+        record = dict(record, run_id=self.run_id)
+        self.queue.put(record)
+
+    def write_records(self):
+        with open(self.path, 'ab') as journal_file, open(self.index_path, 'a', encoding='utf-8') as index_file:
+            while True:
+                record = self.queue.get()
+                try:
+                    if record is STOP:
+                        return
+
+                    data = gzip.compress(json.dumps(record).encode('utf-8') + b"\n")
+                    offset = journal_file.tell()
+                    journal_file.write(data)
+                    index_entry = {"key": record.get("key"), "role": record.get("role"), "part": record.get("part"), "offset": offset, "length": len(data)}
+                    index_file.write(json.dumps(index_entry) + "\n")
+                    self.records += 1
+
+                    # Flush once the queue drains so bursts are batched
+                    if self.queue.empty():
+                        journal_file.flush()
+                        index_file.flush()
+                except Exception as exc:
+                    logger.warning("Could not write run journal record: %s", exc)
+                finally:
+                    self.queue.task_done()
+
+    # Wait until every queued record has been written
+    def flush(self):
+        self.queue.join()
+
+    # Write the remaining records and stop the writer thread
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(STOP)
+        self.thread.join()
+
+# Stream the records of a run in the order they were written. A record
+# still being written by a live run is skipped.
+def read_journal(directory, run_id):
+    with gzip.open(get_journal_path(directory, run_id), 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+# Read the index of a run as a list of {"key", "role", "part", "offset",
+# "length"} entries
+def read_index(directory, run_id):
+    with open(get_index_path(directory, run_id), 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Read the output of one task without scanning the journal: the latest
+# record for its key that is not a partial summary
+def read_record(directory, run_id, key):
+    entry = None
+    for index_entry in read_index(directory, run_id):
+        if index_entry["key"] == key and index_entry.get("part") is None:
+            entry = index_entry
+    if entry is None:
+        return None
+
+    with open(get_journal_path(directory, run_id), 'rb') as f:
+        f.seek(entry["offset"])
+        return json.loads(gzip.decompress(f.read(entry["length"])))
+
+# List the run IDs with a journal in the directory, oldest first
+def list_runs(directory):
+    if not os.path.isdir(directory):
+        return []
+
+    paths = [os.path.join(directory, filename) for filename in os.listdir(directory) if filename.endswith(JOURNAL_SUFFIX)]
+    paths.sort(key=lambda path: (os.path.getmtime(path), path))
+    return [os.path.basename(path)[:-len(JOURNAL_SUFFIX)] for path in paths]
+
+def format_record(record):
+    role = record.get("role")
+    part = f" part {record['part']}" if record.get("part") else ""
+    label = f" ({role}{part})" if role and role != "do" else ""
+    cached = " (cached)" if record.get("cached") else ""
+    duration = record.get("duration")
+    timing = f" in {duration:.2f}s" if duration is not None else ""
+    return (f"\nTask {record.get('key')}{label}: {record.get('title')} [{record.get('agent')}]{cached}{timing}\n\n"
+            f"{record.get('outcome')}")
+
+# Print every output of a run
+def print_run(directory, run_id, file=None):
+    file = file or sys.stdout
+    for record in read_journal(directory, run_id):
+        print(format_record(record), file=file)
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Print the outputs recorded in a swarm run journal.")
+    parser.add_argument("run_id", nargs="?", help="Run to print (default: the latest run)")
+    parser.add_argument("--dir", default=os.getenv('LOG_FILE_PATH', './logs'), help="Directory holding the journals")
+    parser.add_argument("--task", help="Print only the output of the task with this key, e.g. 0/1/2")
+    parser.add_argument("--list", action="store_true", help="List the recorded runs")
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    runs = list_runs(args.dir)
+
+    if args.list:
+        for run_id in runs:
+            print(run_id)
+        return
+
+    run_id = args.run_id or (runs[-1] if runs else None)
+    if run_id is None:
+        print(f"No run journals found in {args.dir}")
+        sys.exit(1)
+
+    if args.task:
+        record = read_record(args.dir, run_id, args.task)
+        if record is None:
+            print(f"No output recorded for task {args.task} in run {run_id}")
+            sys.exit(1)
+        print(format_record(record))
+    else:
+        print_run(args.dir, run_id)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import json
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from downloader import get_file_hash
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Name of the manifest recording what has been uploaded
+MANIFEST_NAME = ".knowledge.json"
+
+# Keeps the files of a knowledge base directory in sync with the files
+# uploaded for assistants.
+#
+# The manifest maps each file's relative path to its size, mtime, SHA-256
+# and remote file ID. A sync only hashes files whose size or mtime changed,
+# only uploads files whose content is new, and deletes the remote copies of
+# files that were changed or removed, so its cost is proportional to what
+# changed rather than to the size of the corpus.
+class KnowledgeBase:
+    def __init__(self, client, path, manifest_path=None, max_workers=4, extension_filter=None):
+        self.client = client
+        self.path = path
+        self.manifest_path = manifest_path or os.path.join(path, MANIFEST_NAME)
+        self.max_workers = max_workers
+        self.extension_filter = extension_filter
+        self.lock = threading.Lock()
+        self.manifest = self.load_manifest()
+        self.uploaded = 0
+        self.deleted = 0
+        self.unchanged = 0
+
+    def load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return {}
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.warning("Could not read knowledge manifest '%s': %s", self.manifest_path, exc)
+            return {}
+
+    # Write the manifest atomically
+    def save_manifest(self):
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    # List the relative paths of the files in the knowledge base. Hidden
+    # files (such as manifests) and partial downloads are skipped.
+    def list_files(self):
+        if not os.path.isdir(self.path):
+            return []
+
+        relative_paths = []
+        for directory, directories, filenames in os.walk(self.path):
+            directories[:] = [name for name in directories if not name.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.') or filename.endswith('.part'):
+                    continue
+                if self.extension_filter and os.path.splitext(filename)[1] != self.extension_filter:
+                    continue
+                relative_paths.append(os.path.relpath(os.path.join(directory, filename), self.path))
+
+        return sorted(relative_paths)
+
+    # Check a file against its manifest entry. Returns the file's new
+    # manifest entry, with file_id None if the file must be uploaded.
+    def check_file(self, relative_path):
+        file_path = os.path.join(self.path, relative_path)
+        stat = os.stat(file_path)
+        entry = self.manifest.get(relative_path)
+
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry
+
+        sha256 = get_file_hash(file_path)
+        file_id = entry["file_id"] if entry and entry["sha256"] == sha256 else None
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256, "file_id": file_id}
+
+    # Upload a file and return its file ID, or None if the upload failed
+    def upload(self, relative_path):
+        try:
+            with open(os.path.join(self.path, relative_path), 'rb') as f:
+                uploaded = self.client.files.create(file=f, purpose="assistants")
+        except Exception as exc:
+            logger.warning("Could not upload %s: %s", relative_path, exc)
+            return None
+        logger.info("Uploaded: %s", relative_path)
+        return uploaded.id
+
+    def delete(self, file_id):
+        try:
+            self.client.files.delete(file_id)
+        except Exception as exc:
+            logger.warning("Could not delete remote file %s: %s", file_id, exc)
+
+    # Bring the remote files up to date with the directory and return the
+    # file IDs of every file in the knowledge base
+    def sync(self):
+        with self.lock:
+            relative_paths = self.list_files()
+            if not relative_paths and not self.manifest:
+                return []
+
+            entries = {relative_path: self.check_file(relative_path) for relative_path in relative_paths}
+
+            # Files with identical content share one upload
+            uploads = {}
+            for relative_path, entry in entries.items():
+                if entry["file_id"] is None:
+                    uploads.setdefault(entry["sha256"], relative_path)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                file_ids = dict(zip(uploads.keys(), executor.map(self.upload, uploads.values())))
+
+                for entry in entries.values():
+                    if entry["file_id"] is None:
+                        entry["file_id"] = file_ids[entry["sha256"]]
+
+                # Failed uploads are left out of the manifest and retried by
+                # the next sync
+                entries = {relative_path: entry for relative_path, entry in entries.items() if entry["file_id"] is not None}
+
+                # Delete remote copies of changed and removed files that no
+                # remaining file still uses
+                kept = {entry["file_id"] for entry in entries.values()}
+                stale = {entry["file_id"] for entry in self.manifest.values()} - kept
+                list(executor.map(self.delete, sorted(stale)))
+
+            self.uploaded += sum(1 for file_id in file_ids.values() if file_id is not None)
+            self.deleted += len(stale)
+            self.unchanged += sum(1 for relative_path, entry in entries.items() if self.manifest.get(relative_path, {}).get("file_id") == entry["file_id"])
+
+            self.manifest = entries
+            self.save_manifest()
+
+            return list(dict.fromkeys(entry["file_id"] for entry in entries.values()))
+
+    def get_stats(self):
+        return {"uploaded": self.uploaded, "deleted": self.deleted, "unchanged": self.unchanged}
@@ -0,0 +1,128 @@
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# Every module logs under this logger
+ROOT_LOGGER = "swarm"
+
+# Fields describing the work the current thread or coroutine is doing
+CURRENT_CONTEXT = contextvars.ContextVar("log_context", default={})
+
+CONSOLE_FORMAT = "%(asctime)s %(levelname)-7s [%(task)s] %(message)s"
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+# Add fields (such as the task key and agent key) to every record logged
+# in the with block, including from coroutines it starts
+@contextmanager
+def log_context(**fields):
+    token = CURRENT_CONTEXT.set({**CURRENT_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        CURRENT_CONTEXT.reset(token)
+
+# Stamps records with the context of the thread or coroutine that logged
+# them. It runs before the record is queued, while that context is current.
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        context = CURRENT_CONTEXT.get()
+        record.task = context.get("task", "-")
+        record.agent = context.get("agent", "-")
+        return True
+
+# Lets through at most one progress record (logged with
+# extra={"progress": True}) per logger and task every interval seconds
+class ProgressFilter(logging.Filter):
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_emitted = {}
+        self.suppressed = 0
+
+    def filter(self, record):
+        if not getattr(record, "progress", False):
+            return True
+
+        key = (record.name, getattr(record, "task", "-"))
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_emitted.get(key)
+            if last is not None and now - last < self.interval:
+                self.suppressed += 1
+                return False
+            self.last_emitted[key] = now
+        return True
+
+# One JSON object per line, for log shippers
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "task": getattr(record, "task", "-"),
+            "agent": getattr(record, "agent", "-"),
+            "thread": record.threadName,
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+# Routes the swarm's logs through a queue to a background listener thread,
+# so threads doing the work never block on console or file I/O. Records go
+# to the console and, optionally, to a JSON-lines file.
+class LogPipeline:
+    def __init__(self, level="INFO", json_path=None, progress_interval=5.0, stream=None):
+        self.queue = queue.SimpleQueue()
+        self.progress_filter = ProgressFilter(progress_interval)
+
+        console = logging.StreamHandler(stream or sys.stdout)
+        console.setFormatter(logging.Formatter(CONSOLE_FORMAT, "%H:%M:%S"))
+        handlers = [console]
+        self.json_file = None
+        if json_path:
+            self.json_file = logging.FileHandler(json_path, encoding='utf-8')
+            self.json_file.setFormatter(JsonFormatter())
+            handlers.append(self.json_file)
+
+        self.handler = QueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter())
+        self.handler.addFilter(self.progress_filter)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+        self.logger = logging.getLogger(ROOT_LOGGER)
+        self.previous_level = self.logger.level
+        self.logger.setLevel(level)
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.listener.start()
+        self.stopped = False
+
+    # Write the queued records and detach from the swarm's logger
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.logger.removeHandler(self.handler)
+        self.logger.propagate = True
+        self.logger.setLevel(self.previous_level)
+        self.listener.stop()
+        if self.json_file is not None:
+            self.json_file.close()
+
+    def get_stats(self):
+        return {"suppressed_progress": self.progress_filter.suppressed}
+
+def setup_logging(level="INFO", json_path=None, progress_interval=5.0, stream=None):
+    return LogPipeline(level, json_path, progress_interval, stream)
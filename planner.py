@@ -0,0 +1,50 @@
+import re
+
+# Words that suggest a task has several parts worth delegating
+COMPOUND_KEYWORDS = (
+    "and then", "steps", "stages", "phases", "plan", "design", "build", "implement", "research",
+    "application", "app", "system", "multiple", "several", "each", "compare", "analyze", "analyse",
+    "report", "strategy", "project", "pipeline", "end-to-end",
+)
+
+# Bulleted or numbered lists in a description usually mean several subtasks
+LIST_PATTERN = re.compile(r"^\s*(\d+[.)]|[-*•])\s+", re.MULTILINE)
+
+# Planning policy for agents.
+#
+# With single_round_trip, one run both decides and acts: the assistant
+# either answers the task directly or calls decompose_and_assign. Without
+# it the separate decomposability run is used.
+#
+# Tasks at max_depth are atomic and skip planning, going straight to the
+# do run. With preclassify, a cheap local heuristic also marks short tasks
+# without compound keywords as atomic.
+class Planner:
+    def __init__(self, single_round_trip=True, preclassify=False, max_words=20, max_depth=None, compound_keywords=COMPOUND_KEYWORDS):
+        self.single_round_trip = single_round_trip
+        self.preclassify = preclassify
+        self.max_words = max_words
+        self.max_depth = max_depth
+        self.compound_keywords = compound_keywords
+
+    # Check if a task is obviously atomic without asking the model
+    def is_atomic(self, task):
+        if self.max_depth is not None and task.depth >= self.max_depth:
+            return True
+
+        if not self.preclassify:
+            return False
+
+        description = task.description or ""
+        text = f"{task.title} {description}".lower()
+        if len(re.findall(r"\w+", text)) > self.max_words:
+            return False
+
+        if LIST_PATTERN.search(description):
+            return False
+
+        for keyword in self.compound_keywords:
+            if re.search(rf"\b{re.escape(keyword)}\b", text):
+                return False
+
+        return True
@@ -0,0 +1,114 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Run statuses that mean the run is still being worked on remotely
+PENDING_RUN_STATUSES = ("queued", "in_progress", "cancelling")
+
+# Run statuses a task's outcome can be read from. Runs that failed,
+# expired or were cancelled leave the task incomplete.
+USABLE_RUN_STATUSES = ("completed", "requires_action", "incomplete")
+
+# Seconds to keep waiting for a run cancelled at its task's deadline to
+# stop before giving up on it
+CANCEL_GRACE = 30.0
+
+# Stream events that carry a run which will not progress any further
+TERMINAL_RUN_EVENTS = (
+    "thread.run.completed",
+    "thread.run.requires_action",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+)
+
+# Adaptive polling schedule: starts with a short interval so fast runs are
+# noticed quickly, grows geometrically for long runs and is capped. Jitter
+# keeps many concurrent pollers from hitting the API in lockstep.
+class Backoff:
+    def __init__(self, initial=0.25, factor=1.6, maximum=5.0, jitter=0.2):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        self.interval = initial
+
+    # Get the next interval to wait and grow the schedule
+    def next(self):
+        interval = min(self.interval, self.maximum)
+        self.interval = min(self.interval * self.factor, self.maximum)
+        spread = interval * self.jitter
+        return max(0.0, interval + random.uniform(-spread, spread))
+
+    def reset(self):
+        self.interval = self.initial
+
+# Calls callbacks at deadlines (time.monotonic() values) from one shared
+# daemon thread, so waiting runs don't each need a timer thread. The
+# thread is started on first use.
+class Watchdog:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap = []
+        self.sequence = itertools.count()
+        self.thread = None
+
+    # Call callback at deadline. Returns an entry whose cancel() drops it.
+    def schedule(self, deadline, callback):
+        entry = WatchdogEntry(deadline, callback)
+        with self.condition:
+            heapq.heappush(self.heap, (deadline, next(self.sequence), entry))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.watch, name="watchdog", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return entry
+
+    def watch(self):
+        while True:
+            with self.condition:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.condition.wait(timeout)
+                entry = heapq.heappop(self.heap)[2]
+            if not entry.cancelled:
+                try:
+                    entry.callback()
+                except Exception:
+                    logger.exception("Watchdog callback failed")
+
+class WatchdogEntry:
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+WATCHDOG = Watchdog()
+
+# Get the time the remote run reached its final state (if the API reports it)
+def get_finished_at(run):
+    for attribute in ("completed_at", "failed_at", "cancelled_at", "expired_at"):
+        finished_at = getattr(run, attribute, None)
+        if isinstance(finished_at, (int, float)) and not isinstance(finished_at, bool):
+            return finished_at
+    return None
+
+# Seconds between the run finishing remotely and us noticing it
+def get_completion_lag(run, detected_at=None):
+    finished_at = get_finished_at(run)
+    if finished_at is None:
+        return None
+
+    if detected_at is None:
+        detected_at = time.time()
+    return max(0.0, detected_at - finished_at)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+# Separator between the parts of a hierarchical ID
+SEPARATOR = "/"
+
+# Build a globally unique ID from a namespace and a local ID. Subtask and
+# agent IDs chosen by the model restart at 1 in every decomposition, so
+# they are namespaced by the key of the task that was decomposed, e.g.
+# subtask 2 of subtask 1 of the objective is "0/1/2".
+def make_key(namespace, local_id):
+    if not namespace:
+        return str(local_id)
+    return f"{namespace}{SEPARATOR}{local_id}"
+
+# Get the key of the namespace a key belongs to ("" at the top)
+def get_namespace(key):
+    namespace, _, _ = key.rpartition(SEPARATOR)
+    return namespace
+
+# Swarm-wide index of agents and tasks by hierarchical ID.
+#
+# Writes copy the index and swap it in under a lock, so reads never lock
+# and never see a dict that is being resized. Registrations happen once per
+# agent or task, while lookups happen on every run.
+class Registry:
+    def __init__(self, agents=None):
+        self.lock = threading.Lock()
+        self.agents = {}
+        self.tasks = {}
+        self.children = {}
+
+        # Agents being created, so concurrent delegations to the same agent
+        # create it once: a lock per key for threads, a future for coroutines
+        self.agent_locks = {}
+        self.agent_creations = {}
+
+        for agent in agents or []:
+            self.add_agent(agent)
+
+    # Register an agent. If another agent already holds its key, that agent
+    # is kept and returned.
+    def add_agent(self, agent):
+        with self.lock:
+            existing = self.agents.get(agent.key)
+            if existing is not None:
+                return existing
+
+            agents = dict(self.agents)
+            agents[agent.key] = agent
+            self.agents = agents
+            return agent
+
+    # Register a task and index it under its parent
+    def add_task(self, task):
+        with self.lock:
+            existing = self.tasks.get(task.key)
+            if existing is not None:
+                return existing
+
+            tasks = dict(self.tasks)
+            tasks[task.key] = task
+            self.tasks = tasks
+
+            if task.parent_task is not None:
+                children = dict(self.children)
+                children[task.parent_task.key] = children.get(task.parent_task.key, ()) + (task.key,)
+                self.children = children
+            return task
+
+    # Get the agent with a key, creating it with factory() if there is none.
+    # The factory runs outside the registry lock, since creating an agent
+    # registers it.
+    def get_or_add_agent(self, key, factory):
+        agent = self.agents.get(key)
+        if agent is not None:
+            return agent
+
+        with self.lock:
+            agent_lock = self.agent_locks.setdefault(key, threading.Lock())
+        with agent_lock:
+            agent = self.agents.get(key)
+            if agent is None:
+                agent = self.add_agent(factory())
+        return agent
+
+    # Async version of get_or_add_agent, where factory is a coroutine
+    # function. Coroutines waiting on the same agent share one creation.
+    async def async_get_or_add_agent(self, key, factory):
+        agent = self.agents.get(key)
+        if agent is not None:
+            return agent
+
+        with self.lock:
+            creation = self.agent_creations.get(key)
+            if creation is None:
+                creation = asyncio.ensure_future(factory())
+                self.agent_creations[key] = creation
+        try:
+            agent = await asyncio.shield(creation)
+        finally:
+            if creation.done():
+                with self.lock:
+                    if self.agent_creations.get(key) is creation:
+                        del self.agent_creations[key]
+        return self.add_agent(agent)
+
+    def get_agent(self, key):
+        return self.agents.get(key)
+
+    def get_task(self, key):
+        return self.tasks.get(key)
+
+    def get_agents(self):
+        return list(self.agents.values())
+
+    def get_children(self, key):
+        tasks = self.tasks
+        return [tasks[child_key] for child_key in self.children.get(key, ())]
+
+    # Get the ancestors of a task, nearest first
+    def get_ancestors(self, key):
+        ancestors = []
+        task = self.tasks.get(key)
+        parent_task = task.parent_task if task is not None else None
+        while parent_task is not None:
+            ancestors.append(parent_task)
+            parent_task = parent_task.parent_task
+        return ancestors
+
+    # Get every completed task below a task, depth first
+    def get_completed_descendants(self, key):
+        tasks = self.tasks
+        children = self.children
+
+        descendants = []
+        stack = list(reversed(children.get(key, ())))
+        while stack:
+            task = tasks[stack.pop()]
+            if task.is_complete:
+                descendants.append(task)
+            stack.extend(reversed(children.get(task.key, ())))
+        return descendants
+
+    def get_stats(self):
+        return {"agents": len(self.agents), "tasks": len(self.tasks)}
@@ -1,49 +1,170 @@
+import io
 import os
+import time
+import json
+import hashlib
 import requests
+from collections import namedtuple
 from xml.etree import ElementTree
+from downloader import Downloader
+from log import get_logger
+
+logger = get_logger(__name__)
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+# Lightweight record of one search result
+Entry = namedtuple("Entry", ["id", "title", "summary", "published", "authors", "pdf_url"])
+
+# On-disk cache of raw search result pages, one file per query page.
+# Pages older than the TTL are fetched again.
+class SearchCache:
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get_file_path(self, url, params):
+        key = hashlib.sha256(json.dumps([url, params], sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{key}.xml")
+
+    def get(self, url, params):
+        file_path = self.get_file_path(url, params)
+        try:
+            if self.ttl is None or time.time() - os.path.getmtime(file_path) < self.ttl:
+                with open(file_path, 'rb') as f:
+                    content = f.read()
+                self.hits += 1
+                return content
+        except OSError:
+            pass
+
+        self.misses += 1
+        return None
+
+    # Store a page atomically
+    def set(self, url, params, content):
+        os.makedirs(self.path, exist_ok=True)
+        file_path = self.get_file_path(url, params)
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
 
 class Research:
 
-    def __init__(self, knowledge_path, search_url):
+    def __init__(self, knowledge_path, search_url, max_downloads=8, session=None, cache_path=None, cache_ttl=86400):
         self.knowledge_path = knowledge_path
         self.search_url = search_url
+        self.search_cache = SearchCache(cache_path, cache_ttl) if cache_path else None
+        self.downloader = Downloader(knowledge_path, max_downloads, session) if knowledge_path else None
 
-    # Searches the research repository using the search term 
+    # Searches the research repository using the search term and returns
+    # the parsed response tree of the first max_results results
     def search(self, search_term, max_results):
+        return ElementTree.fromstring(self.get_page(search_term, 0, max_results))
+
+    # Searches the research repository page by page, yielding an Entry for
+    # each result as it is parsed. Pages are only fetched as the caller
+    # consumes results, so stopping early saves requests. Pages always hold
+    # page_size results so overlapping searches share cached pages.
+    def iter_search(self, search_term, max_results=None, page_size=100):
+        start = 0
+        yielded = 0
+        while max_results is None or yielded < max_results:
+            count = 0
+            for entry in parse_entries(self.get_page(search_term, start, page_size)):
+                count += 1
+                if max_results is not None and yielded >= max_results:
+                    return
+                yielded += 1
+                yield entry
+
+            # A short page means there are no more results
+            if count < page_size:
+                return
+            start += count
+
+    # Get the raw response for one page of results, from the cache when it
+    # has a fresh copy
+    def get_page(self, search_term, start, max_results):
 
         # Parameters for the API query
         params = {
             "search_query": f"all:{search_term}",
-            "start": 0,
+            "start": start,
             "max_results": max_results
         }
 
+        if self.search_cache:
+            content = self.search_cache.get(self.search_url, params)
+            if content is not None:
+                return content
+
         response = requests.get(self.search_url, params=params)
-        tree = ElementTree.fromstring(response.content)
-        return tree
+        if self.search_cache and response.status_code == 200:
+            self.search_cache.set(self.search_url, params, response.content)
+        return response.content
 
-    # Downloads the list of PDFs in the query response tree
-    def download(self, tree):
+    # Search for a term and download the PDFs of the results
+    def gather(self, search_term, max_results):
+        return self.download(self.iter_search(search_term, max_results))
 
-        # Create the PDF directory if it doesn't already exist
-        os.makedirs(self.knowledge_path, exist_ok=True)
+    # Downloads the PDFs of search results, several at a time. Takes the
+    # entries from iter_search or a response tree from search. Returns the
+    # result of each download.
+    def download(self, entries):
+        if hasattr(entries, 'findall'):
+            entries = [parse_entry(element) for element in entries.findall(f'{ATOM}entry')]
 
-        # Loop through each entry in the search response
-        for entry in tree.findall('{http://www.w3.org/2005/Atom}entry'):
-            title = entry.find('{http://www.w3.org/2005/Atom}title').text
-            pdf_link = entry.find('{http://www.w3.org/2005/Atom}link[@title="pdf"]')
-            
+        downloads = []
+        for entry in entries:
             # If there is a PDF link
-            if pdf_link is not None:
-                pdf_url = pdf_link.attrib['href']
-                pdf_response = requests.get(pdf_url)
-                
-                if pdf_response.status_code == 200:
-                    # Creating a valid filename from the title
-                    pdf_filename = title.replace(' ', '_').replace('/', '_').replace('\n', '') + '.pdf'
-                    pdf_path = os.path.join(self.knowledge_path, pdf_filename)
-
-                    # Saving the PDF
-                    with open(pdf_path, 'wb') as f:
-                        f.write(pdf_response.content)
-                    print(f"Downloaded: {pdf_filename}")
+            if entry.pdf_url:
+                # Creating a valid filename from the title
+                pdf_filename = entry.title.replace(' ', '_').replace('/', '_').replace('\n', '') + '.pdf'
+                downloads.append((entry.pdf_url, pdf_filename))
+
+        results = self.downloader.download_all(downloads)
+        for result in results:
+            filename = os.path.basename(result["path"])
+            if result["status"] == "failed":
+                logger.warning("Failed: %s (%.2fs)", filename, result['seconds'])
+            elif result["status"] == "skipped":
+                logger.debug("Already downloaded: %s", filename)
+            else:
+                logger.info("Downloaded: %s (%.0f KiB in %.2fs, %s)", filename, result['bytes'] / 1024, result['seconds'], result['status'])
+
+        return results
+
+# Parse the entries of a response page one at a time, clearing each
+# element once it has been read so the page is never held as a full tree
+def parse_entries(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    for _, element in ElementTree.iterparse(io.BytesIO(content), events=('end',)):
+        if element.tag == f'{ATOM}entry':
+            yield parse_entry(element)
+            element.clear()
+
+def parse_entry(element):
+    pdf_link = element.find(f'{ATOM}link[@title="pdf"]')
+    return Entry(
+        id=get_text(element, 'id'),
+        title=' '.join(get_text(element, 'title').split()),
+        summary=get_text(element, 'summary').strip(),
+        published=get_text(element, 'published'),
+        authors=tuple(get_text(author, 'name') for author in element.findall(f'{ATOM}author')),
+        pdf_url=pdf_link.attrib['href'] if pdf_link is not None else None,
+    )
+
+def get_text(element, tag):
+    child = element.find(f'{ATOM}{tag}')
+    if child is None or child.text is None:
+        return ''
+    return child.text
@@ -0,0 +1,326 @@
+import os
+import re
+import json
+import math
+import mmap
+import time
+import heapq
+import shutil
+import threading
+
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Words too common to be worth indexing
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the this to was were which with we our
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# File types text can be extracted from
+TEXT_EXTENSIONS = (".txt", ".md", ".py", ".js", ".json", ".csv", ".html", ".xml", ".tex")
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS and len(token) > 1]
+
+# Extract the text of a file. PDFs need the optional pypdf package.
+def extract_text(path):
+    if path.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            logger.warning("Install pypdf to index PDFs; skipping %s", path)
+            return ""
+        try:
+            return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+        except Exception as exc:
+            logger.warning("Could not extract text from %s: %s", path, exc)
+            return ""
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+# Split text into overlapping chunks of about chunk_words words
+def chunk_text(text, chunk_words=200, overlap=40):
+    words = text.split()
+    chunks = []
+    step = max(1, chunk_words - overlap)
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+# Extract and chunk one file (run in a worker process)
+def extract_chunks(path, chunk_words, overlap):
+    return chunk_text(extract_text(path), chunk_words, overlap)
+
+# One immutable part of the index, written by a single update.
+#
+# chunks.bin holds the UTF-8 text of every chunk back to back, with
+# offsets.bin (uint64) giving where each starts. postings.bin holds
+# (chunk, term frequency) uint32 pairs grouped by term, and terms.json maps
+# each term to the start and length of its group. Both binary files are
+# memory-mapped, so opening a segment reads only the term dictionary.
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.documents = meta["documents"]
+        self.lengths = meta["lengths"]
+        with open(os.path.join(path, "terms.json"), 'r', encoding='utf-8') as f:
+            self.terms = json.load(f)
+
+        offsets = array('Q')
+        with open(os.path.join(path, "offsets.bin"), 'rb') as f:
+            offsets.frombytes(f.read())
+        self.offsets = offsets
+
+        self.chunks = open_mmap(os.path.join(path, "chunks.bin"))
+        self.postings_map = open_mmap(os.path.join(path, "postings.bin"))
+        self.postings_view = memoryview(self.postings_map if self.postings_map else b"")
+        self.postings = self.postings_view.cast('I')
+
+    # Write a segment from chunks given as (document, text) pairs
+    @staticmethod
+    def write(path, chunks):
+        os.makedirs(path, exist_ok=True)
+        documents, lengths = [], []
+        postings_by_term = {}
+        offsets = array('Q', [0])
+
+        with open(os.path.join(path, "chunks.bin"), 'wb') as f:
+            for chunk_index, (document, text) in enumerate(chunks):
+                tokens = tokenize(text)
+                documents.append(document)
+                lengths.append(len(tokens))
+                for term, frequency in Counter(tokens).items():
+                    postings_by_term.setdefault(term, []).extend((chunk_index, frequency))
+                data = text.encode('utf-8')
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+        terms = {}
+        postings = array('I')
+        for term in sorted(postings_by_term):
+            terms[term] = [len(postings) // 2, len(postings_by_term[term]) // 2]
+            postings.extend(postings_by_term[term])
+
+        with open(os.path.join(path, "postings.bin"), 'wb') as f:
+            postings.tofile(f)
+        with open(os.path.join(path, "offsets.bin"), 'wb') as f:
+            offsets.tofile(f)
+        with open(os.path.join(path, "terms.json"), 'w', encoding='utf-8') as f:
+            json.dump(terms, f)
+        with open(os.path.join(path, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({"documents": documents, "lengths": lengths}, f)
+
+    def get_text(self, chunk_index):
+        return self.chunks[self.offsets[chunk_index]:self.offsets[chunk_index + 1]].decode('utf-8')
+
+    # Yield (chunk index, term frequency) for every chunk holding the term
+    def get_postings(self, term):
+        start, count = self.terms[term]
+        for position in range(2 * start, 2 * (start + count), 2):
+            yield self.postings[position], self.postings[position + 1]
+
+    def close(self):
+        self.postings.release()
+        self.postings_view.release()
+        for mapped in (self.chunks, self.postings_map):
+            if mapped:
+                mapped.close()
+
+def open_mmap(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# Persistent BM25 index over the text of a directory of files, queried
+# entirely offline.
+#
+# Each update extracts only new or changed files (fanned out over a process
+# pool) into a new segment. Older chunks of changed or removed files stay
+# on disk but are skipped at query time; once there are more than
+# max_segments segments, the live chunks are merged into one.
+class RetrievalIndex:
+    def __init__(self, path, chunk_words=200, overlap=40, max_segments=8, max_workers=None, top_k=3, k1=1.5, b=0.75):
+        self.path = path
+        self.chunk_words = chunk_words
+        self.overlap = overlap
+        self.max_segments = max_segments
+        self.max_workers = max_workers
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(path, "manifest.json")
+        self.manifest = self.load_manifest()
+        self.segments = []
+        self.open_segments()
+
+    def load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return {"next_segment": 0, "segments": [], "documents": {}}
+
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    # Write the manifest atomically
+    def save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    # Open the segments in the manifest (reusing those already open) and
+    # compute the collection statistics BM25 needs over their live chunks
+    def open_segments(self):
+        opened = {segment.name: segment for segment in self.segments}
+        segments = [opened.get(name) or Segment(os.path.join(self.path, name)) for name in self.manifest["segments"]]
+
+        documents = self.manifest["documents"]
+        chunk_count = 0
+        total_length = 0
+        for segment in segments:
+            for document, length in zip(segment.documents, segment.lengths):
+                if documents.get(document, {}).get("segment") == segment.name:
+                    chunk_count += 1
+                    total_length += length
+
+        self.chunk_count = chunk_count
+        self.average_length = total_length / chunk_count if chunk_count else 0.0
+        self.segments = segments
+
+    # Index new and changed files under a directory and forget removed ones.
+    # Returns the number of files (re)indexed.
+    def update(self, directory):
+        with self.lock:
+            documents = self.manifest["documents"]
+            found = {}
+            for root, directories, filenames in os.walk(directory):
+                directories[:] = [name for name in directories if not name.startswith('.')]
+                for filename in filenames:
+                    if filename.startswith('.') or not filename.lower().endswith(TEXT_EXTENSIONS + (".pdf",)):
+                        continue
+                    file_path = os.path.join(root, filename)
+                    stat = os.stat(file_path)
+                    found[os.path.relpath(file_path, directory)] = (file_path, stat.st_size, stat.st_mtime)
+
+            changed = [document for document, (_, size, mtime) in found.items()
+                       if documents.get(document, {}).get("size") != size or documents.get(document, {}).get("mtime") != mtime]
+            removed = [document for document in documents if document not in found]
+            if not changed and not removed:
+                return 0
+
+            chunks = []
+            for document, document_chunks in zip(changed, self.extract([found[document][0] for document in changed])):
+                chunks.extend((document, text) for text in document_chunks)
+
+            for document in removed:
+                del documents[document]
+
+            if chunks:
+                name = f"segment-{self.manifest['next_segment']:06d}"
+                self.manifest["next_segment"] += 1
+                Segment.write(os.path.join(self.path, name), chunks)
+                self.manifest["segments"].append(name)
+            for document in changed:
+                documents[document] = {"size": found[document][1], "mtime": found[document][2], "segment": name if chunks else None}
+
+            self.save_manifest()
+            self.open_segments()
+
+            if len(self.segments) > self.max_segments:
+                self.compact()
+
+            return len(changed)
+
+    # Extract and chunk files, in parallel when there is more than one
+    def extract(self, file_paths):
+        if len(file_paths) <= 1 or self.max_workers == 1:
+            return [extract_chunks(file_path, self.chunk_words, self.overlap) for file_path in file_paths]
+
+        count = len(file_paths)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(extract_chunks, file_paths, [self.chunk_words] * count, [self.overlap] * count))
+
+    # Merge the live chunks of every segment into a single segment and close
+    # the old ones. The index is updated before the swarm starts, so no
+    # query is still reading them.
+    def compact(self):
+        documents = self.manifest["documents"]
+        chunks = []
+        for segment in self.segments:
+            for chunk_index, document in enumerate(segment.documents):
+                if documents.get(document, {}).get("segment") == segment.name:
+                    chunks.append((document, segment.get_text(chunk_index)))
+
+        old_segments = self.segments
+        name = f"segment-{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+        Segment.write(os.path.join(self.path, name), chunks)
+        self.manifest["segments"] = [name]
+        for entry in documents.values():
+            entry["segment"] = name
+
+        self.save_manifest()
+        self.open_segments()
+        for segment in old_segments:
+            segment.close()
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    # Get the top k chunks for a query as (score, document, text) tuples
+    def search(self, query, k=None):
+        k = self.top_k if k is None else k
+        terms = set(tokenize(query))
+        documents = self.manifest["documents"]
+        segments = self.segments
+        if not terms or not self.chunk_count:
+            return []
+
+        # Superseded and deleted chunks are skipped, so document frequencies
+        # count live chunks only, like chunk_count
+        scores = {}
+        for term in terms:
+            postings = [(segment, chunk_index, term_frequency)
+                        for segment in segments if term in segment.terms
+                        for chunk_index, term_frequency in segment.get_postings(term)
+                        if documents.get(segment.documents[chunk_index], {}).get("segment") == segment.name]
+            if not postings:
+                continue
+            frequency = len(postings)
+            idf = math.log(1 + (self.chunk_count - frequency + 0.5) / (frequency + 0.5))
+
+            for segment, chunk_index, term_frequency in postings:
+                length = segment.lengths[chunk_index]
+                norm = term_frequency + self.k1 * (1 - self.b + self.b * length / self.average_length)
+                key = (segment, chunk_index)
+                scores[key] = scores.get(key, 0.0) + idf * term_frequency * (self.k1 + 1) / norm
+
+        results = [(score, segment.documents[chunk_index], segment, chunk_index) for (segment, chunk_index), score in scores.items()]
+        return [(score, document, segment.get_text(chunk_index))
+                for score, document, segment, chunk_index in heapq.nlargest(k, results, key=lambda result: result[0])]
+
+    # Time a query in milliseconds
+    def time_search(self, query, k=None):
+        started = time.perf_counter()
+        results = self.search(query, k)
+        return results, (time.perf_counter() - started) * 1000
+
+    def get_stats(self):
+        return {"documents": len(self.manifest["documents"]), "chunks": self.chunk_count, "segments": len(self.segments)}
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
@@ -0,0 +1,187 @@
+import asyncio
+
+from concurrent.futures import wait, FIRST_COMPLETED
+from log import get_logger
+
+logger = get_logger(__name__)
+
+class DependencyError(Exception):
+    pass
+
+# Normalise a dependent_upon value from a subtask spec into a list of IDs.
+# The model returns a single integer, but lists and "1, 2" strings are
+# accepted too. 0 (or nothing) means the subtask has no dependencies.
+def parse_dependencies(dependent_upon):
+    if dependent_upon is None:
+        return []
+
+    if isinstance(dependent_upon, (list, tuple, set)):
+        values = dependent_upon
+    else:
+        values = str(dependent_upon).replace(";", ",").split(",")
+
+    dependencies = []
+    for value in values:
+        try:
+            dependency = int(str(value).strip())
+        except ValueError:
+            continue
+        if dependency != 0 and dependency not in dependencies:
+            dependencies.append(dependency)
+
+    return dependencies
+
+# Dependency graph of the subtasks produced by one decomposition
+class TaskGraph:
+    def __init__(self, task_specs):
+        self.specs = {}
+        for task_spec in task_specs:
+            if task_spec["subtask_id"] in self.specs:
+                raise DependencyError(f"Subtask ID {task_spec['subtask_id']} is used more than once")
+            self.specs[task_spec["subtask_id"]] = task_spec
+
+        # Build the edges, dropping references to subtasks that do not exist
+        self.dependencies = {}
+        self.dangling = []
+        for task_id, task_spec in self.specs.items():
+            self.dependencies[task_id] = []
+            for dependency in parse_dependencies(task_spec.get("dependent_upon")):
+                if dependency == task_id:
+                    continue
+                if dependency not in self.specs:
+                    self.dangling.append((task_id, dependency))
+                    continue
+                self.dependencies[task_id].append(dependency)
+
+        self.dependents = {task_id: [] for task_id in self.specs}
+        for task_id, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                self.dependents[dependency].append(task_id)
+
+        self.order = self.topological_order()
+        self.priority = self.critical_path_lengths()
+
+    # Order the subtasks so every subtask comes after its dependencies
+    def topological_order(self):
+        remaining = {task_id: len(dependencies) for task_id, dependencies in self.dependencies.items()}
+        ready = [task_id for task_id, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            task_id = ready.pop()
+            order.append(task_id)
+            for dependent in self.dependents[task_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) != len(self.specs):
+            cycle = [task_id for task_id, count in remaining.items() if count > 0]
+            raise DependencyError(f"Subtasks {cycle} have circular dependencies")
+
+        return order
+
+    # Length of the longest chain of subtasks that starts at each subtask
+    def critical_path_lengths(self):
+        lengths = {}
+        for task_id in reversed(self.order):
+            lengths[task_id] = 1 + max((lengths[dependent] for dependent in self.dependents[task_id]), default=0)
+        return lengths
+
+    # Get the subtasks whose dependencies have all completed, longest
+    # critical path first
+    def get_ready(self, completed, started):
+        ready = []
+        for task_id in self.order:
+            if task_id in started:
+                continue
+            if all(dependency in completed for dependency in self.dependencies[task_id]):
+                ready.append(task_id)
+        ready.sort(key=lambda task_id: -self.priority[task_id])
+        return ready
+
+    # Get the subtasks that can never start because a dependency failed
+    def get_blocked(self, failed):
+        blocked = set()
+        for task_id in self.order:
+            if any(dependency in failed or dependency in blocked for dependency in self.dependencies[task_id]):
+                blocked.add(task_id)
+        return blocked
+
+    # Get the outcomes of a subtask's dependencies
+    def get_upstream(self, task_id, outcomes):
+        return {dependency: outcomes[dependency] for dependency in self.dependencies[task_id]}
+
+    # Run every subtask on the executor as soon as its dependencies complete.
+    # execute(task_spec, upstream) is called with the outcomes of the
+    # subtask's dependencies and returns the subtask's outcome, or None if
+    # the subtask did not complete. Executors
+    # that can do useful work while blocked (see budget.ExecutionBudget)
+    # provide their own wait_any.
+    def run(self, execute, executor):
+        wait_any = getattr(executor, "wait_any", None)
+        if wait_any is None:
+            wait_any = lambda futures: wait(futures, return_when=FIRST_COMPLETED)[0]
+
+        outcomes = {}
+        failed = set()
+        started = set()
+        pending = {}
+
+        def dispatch():
+            for task_id in self.get_ready(outcomes, started):
+                started.add(task_id)
+                future = executor.submit(execute, self.specs[task_id], self.get_upstream(task_id, outcomes))
+                pending[future] = task_id
+
+        dispatch()
+        while pending:
+            done = wait_any(list(pending))
+            for future in done:
+                self.record_result(pending.pop(future), future, outcomes, failed)
+            dispatch()
+
+        self.report_blocked(failed)
+        return outcomes
+
+    # Async version of run where execute is a coroutine function
+    async def async_run(self, execute):
+        outcomes = {}
+        failed = set()
+        started = set()
+        pending = {}
+
+        def dispatch():
+            for task_id in self.get_ready(outcomes, started):
+                started.add(task_id)
+                coroutine = execute(self.specs[task_id], self.get_upstream(task_id, outcomes))
+                pending[asyncio.ensure_future(coroutine)] = task_id
+
+        dispatch()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                self.record_result(pending.pop(future), future, outcomes, failed)
+            dispatch()
+
+        self.report_blocked(failed)
+        return outcomes
+
+    # Record a finished subtask's outcome. Subtasks that raised or did not
+    # complete fail, so the subtasks depending on them never start.
+    def record_result(self, task_id, future, outcomes, failed):
+        try:
+            outcome = future.result()
+        except Exception as exc:
+            logger.error("%s generated an exception: %s", task_id, exc)
+            failed.add(task_id)
+            return
+
+        if outcome is None:
+            logger.warning("Subtask %s did not complete", task_id)
+            failed.add(task_id)
+            return
+        outcomes[task_id] = outcome
+
+    def report_blocked(self, failed):
+        for task_id in self.get_blocked(failed):
+            logger.warning("Skipped subtask %s because a subtask it depends on failed", task_id)
@@ -0,0 +1,54 @@
+import threading
+
+# Policy and statistics for speculative execution.
+#
+# While a task's decomposability run decides whether to split it, the task
+# is also done directly in a speculative run. If the task turns out atomic
+# its outcome is kept and the decomposability round trip costs no latency;
+# otherwise the speculative run is cancelled and its tokens are wasted. The
+# hit rate and wasted tokens tell whether it pays off; min_depth limits
+# speculation to the lower, leaf-heavy levels of the tree.
+class Speculator:
+    def __init__(self, min_depth=0):
+        self.min_depth = min_depth
+        self.lock = threading.Lock()
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.wasted_tokens = 0
+        self.wasted_cost = 0.0
+
+    def should_speculate(self, task):
+        return task.depth >= self.min_depth
+
+    def record_launch(self):
+        with self.lock:
+            self.launched += 1
+
+    # Record how a speculative task ended. Its tokens are wasted unless its
+    # outcome was kept (only counted when the ledger records usage).
+    def record(self, speculative_task, hit):
+        usage = speculative_task.usage or {}
+        with self.lock:
+            if hit:
+                self.hits += 1
+                return
+
+            self.misses += 1
+            self.cancelled += 1 if speculative_task.cancel_sent else 0
+            self.wasted_tokens += usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+            self.wasted_cost += usage.get("cost", 0.0)
+
+    def get_stats(self):
+        with self.lock:
+            settled = self.hits + self.misses
+            return {
+                "launched": self.launched,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / settled, 3) if settled else None,
+                "cancelled_runs": self.cancelled,
+                "wasted_tokens": self.wasted_tokens,
+                "wasted_cost": round(self.wasted_cost, 6),
+            }
@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+# A titled piece of text to be summarized: a subtask's outcome or a
+# partial summary of several of them
+Section = namedtuple("Section", ["title", "text"])
+
+# Rough token count of text: ~4 characters per token
+def estimate_tokens(text):
+    return len(text or "") // 4
+
+def count_tokens(sections):
+    return sum(estimate_tokens(section.text) for section in sections)
+
+# Policy for summarizing a decomposed task from its subtasks' outcomes.
+#
+# A parent's summary prompt holds at most fan_in sections and about
+# max_input_tokens tokens of them. Sections are merged in rounds until they
+# fit: a section too large to share a prompt (over max_input_tokens /
+# fan_in) is summarized on its own (map), and neighbouring sections are
+# grouped, at most fan_in and max_input_tokens at a time, into partial
+# summaries (reduce). A section too large for a prompt of its own is first
+# split into parts that fit. Every group in a round is summarized concurrently,
+# so the reduce tree has depth log(subtasks) / log(fan_in) rather than
+# being one huge serial prompt.
+class Summarizer:
+    def __init__(self, max_input_tokens=6000, fan_in=4, max_rounds=4):
+        self.max_input_tokens = max_input_tokens
+        self.fan_in = max(2, fan_in)
+        self.max_rounds = max_rounds
+
+    @property
+    def max_section_tokens(self):
+        return self.max_input_tokens // self.fan_in
+
+    # Check if the sections fit in a single summary prompt
+    def fits(self, sections):
+        return len(sections) <= self.fan_in and count_tokens(sections) <= self.max_input_tokens
+
+    # Split the sections for one round into groups of neighbouring
+    # sections. An oversized section gets a group of its own.
+    def group(self, sections):
+        groups = []
+        current = []
+        current_tokens = 0
+        for section in self.split(sections):
+            tokens = estimate_tokens(section.text)
+            if tokens > self.max_section_tokens:
+                if current:
+                    groups.append(current)
+                groups.append([section])
+                current, current_tokens = [], 0
+                continue
+
+            if current and (len(current) == self.fan_in or current_tokens + tokens > self.max_input_tokens):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(section)
+            current_tokens += tokens
+
+        if current:
+            groups.append(current)
+        return groups
+
+    # Split sections over max_input_tokens into parts that each fit in a
+    # summary prompt, at line or word breaks where possible
+    def split(self, sections):
+        max_chars = self.max_input_tokens * 4
+        parts = []
+        for section in sections:
+            if estimate_tokens(section.text) <= self.max_input_tokens:
+                parts.append(section)
+                continue
+
+            texts = split_text(section.text, max_chars)
+            parts.extend(Section(f"{section.title} (part {index} of {len(texts)})", text) for index, text in enumerate(texts, 1))
+        return parts
+
+    # Check if a group must be summarized, rather than passed on unchanged
+    def needs_summary(self, group):
+        return len(group) > 1 or estimate_tokens(group[0].text) > self.max_section_tokens
+
+# Split text into pieces of at most max_chars characters, breaking after
+# the last newline or space of each piece when there is one
+def split_text(text, max_chars):
+    pieces = []
+    while len(text) > max_chars:
+        end = max(text.rfind("\n", 0, max_chars), text.rfind(" ", 0, max_chars)) + 1 or max_chars
+        pieces.append(text[:end])
+        text = text[end:]
+    if text:
+        pieces.append(text)
+    return pieces
+
+# Get the outcomes of a task's subtasks, in subtask order
+def gather_outcomes(registry, task):
+    subtasks = sorted(registry.get_children(task.key), key=get_order)
+    return [Section(f"subtask #{subtask.id} ({subtask.title})", subtask.outcome) for subtask in subtasks if subtask.outcome]
+
+# Subtask IDs are numbers, but the model may send strings
+def get_order(subtask):
+    return (0, subtask.id, "") if isinstance(subtask.id, int) else (1, 0, str(subtask.id))
+
+# Build the part of a summary prompt holding the sections
+def build_sections_prompt(sections):
+    return "\n\n".join(f"Outcome of {section.title}:\n{section.text}" for section in sections)
@@ -1,12 +1,30 @@
 import os
 import sys
 import argparse
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import functions
 from agent import Agent
+from budget import ExecutionBudget, parse_depth_quotas
+from assistant_pool import AssistantPool
+from cache import ResponseCache
+from planner import Planner
+from registry import Registry
+from throttle import ThrottledClient
 from research import Research
+from knowledge import KnowledgeBase
+from retrieval import RetrievalIndex
+from journal import RunJournal, create_run_id, print_run
+from checkpoint import Checkpoint
+from tracing import Tracer
+from accounting import TokenLedger
+from summarizer import Summarizer
+from batch import BatchRunner
+from speculation import Speculator
+from log import get_logger, setup_logging
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
+logger = get_logger("swarm")
 
 # Load environment variables
 load_dotenv()
@@ -14,72 +32,231 @@ ASSISTANT_MODEL = os.getenv('OPENAI_MODEL_LARGE')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 LOG_FILE_PATH = os.getenv('LOG_FILE_PATH', './logs')  # Default to './logs' if not set in .env
 DATA_FILE_PATH = os.getenv('DATA_FILE_PATH')
+RETRIEVAL_INDEX_PATH = os.getenv('RETRIEVAL_INDEX_PATH', './cache/retrieval')  # Set to '' to disable local retrieval
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '3'))
+SYNC_KNOWLEDGE = os.getenv('SYNC_KNOWLEDGE', 'false').lower() in ('1', 'true', 'yes')  # Upload DATA_FILE_PATH for retrieval
 RESEARCH_URL = os.getenv('RESEARCH_URL')
+RESEARCH_CACHE_PATH = os.getenv('RESEARCH_CACHE_PATH', './cache/research')  # Set to '' to disable caching
+RESEARCH_CACHE_TTL = float(os.getenv('RESEARCH_CACHE_TTL', '86400'))  # One day
+REQUESTS_PER_MINUTE = int(os.getenv('REQUESTS_PER_MINUTE', '500'))
+TOKENS_PER_MINUTE = int(os.getenv('TOKENS_PER_MINUTE', '150000'))
+EXECUTION_ENGINE = os.getenv('EXECUTION_ENGINE', 'threads')  # 'threads' or 'async'
+MAX_CONCURRENT_RUNS = int(os.getenv('MAX_CONCURRENT_RUNS', '8'))
+MAX_THREADS = int(os.getenv('MAX_THREADS', '16'))
+ASSISTANT_INDEX_PATH = os.getenv('ASSISTANT_INDEX_PATH', './assistants.json')
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', './cache/responses.sqlite')  # Set to '' to disable caching
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '604800'))  # One week
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '10000'))
+DEPTH_QUOTAS = parse_depth_quotas(os.getenv('DEPTH_QUOTAS', ''))  # e.g. '0:2,1:4'
+PLANNING_MODE = os.getenv('PLANNING_MODE', 'single')  # 'single' (one planning run) or 'separate' (decomposability run)
+PRECLASSIFY = os.getenv('PRECLASSIFY', 'false').lower() in ('1', 'true', 'yes')
+ATOMIC_MAX_WORDS = int(os.getenv('ATOMIC_MAX_WORDS', '20'))
+MAX_DEPTH = int(os.getenv('MAX_DEPTH')) if os.getenv('MAX_DEPTH') else None
+CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', './cache/checkpoints.sqlite')  # Set to '' to disable resuming
+TRACE_PATH = os.getenv('TRACE_PATH', './traces')  # Set to '' to disable tracing
+MAX_TOKENS = int(os.getenv('MAX_TOKENS')) if os.getenv('MAX_TOKENS') else None  # Token budget of the objective
+MAX_COST = float(os.getenv('MAX_COST')) if os.getenv('MAX_COST') else None  # Spend budget of the objective in USD
+BUDGET_RESERVE = float(os.getenv('BUDGET_RESERVE', '0.1'))  # Stop decomposing once less than this fraction is left
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # DEBUG also dumps every task's outcome
+LOG_JSON_PATH = os.getenv('LOG_JSON_PATH', '')  # Also write logs as JSON lines to this file
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '5'))  # Seconds between progress messages per task
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '6000'))  # Subtask outcomes per summary prompt, in tokens
+SUMMARY_FAN_IN = int(os.getenv('SUMMARY_FAN_IN', '4'))  # Subtask outcomes per summary prompt
+RUN_BACKEND = os.getenv('RUN_BACKEND', 'auto')  # 'assistants', 'chat' (one chat completion per run) or 'auto' (per task)
+BATCH_MODE = os.getenv('BATCH_MODE', 'false').lower() in ('1', 'true', 'yes')  # Run leaf tasks through the batch API
+BATCH_PATH = os.getenv('BATCH_PATH', './cache/batches')  # Batch submission and result files
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '100'))  # Requests per batch
+BATCH_LINGER = float(os.getenv('BATCH_LINGER', '30'))  # Seconds to wait for more requests before submitting a batch
+BATCH_POLL_INTERVAL = float(os.getenv('BATCH_POLL_INTERVAL', '60'))  # Seconds between batch status checks
+SPECULATE = os.getenv('SPECULATE', 'false').lower() in ('1', 'true', 'yes')  # Do tasks while their decomposability is checked
+SPECULATE_MIN_DEPTH = int(os.getenv('SPECULATE_MIN_DEPTH', '0'))  # Only speculate on tasks at least this deep
+TASK_TIMEOUT = float(os.getenv('TASK_TIMEOUT')) if os.getenv('TASK_TIMEOUT') else None  # Seconds each task (with its subtasks) may take
+OBJECTIVE_TIMEOUT = float(os.getenv('OBJECTIVE_TIMEOUT')) if os.getenv('OBJECTIVE_TIMEOUT') else None  # Seconds the whole objective may take
 
-# Set the API key
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Set the API key. Retries are handled by the throttled wrapper, which
+# shares its rate limits between every thread and coroutine in the swarm.
+def create_clients():
+    client = ThrottledClient(OpenAI(api_key=OPENAI_API_KEY, max_retries=0), REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    async_client = ThrottledClient(AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0), REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    return client, async_client
 
-def create_top_agent(agents, client, ASSISTANT_MODEL, file_ids, research):
+def create_planner():
+    return Planner(PLANNING_MODE == 'single', PRECLASSIFY, ATOMIC_MAX_WORDS, MAX_DEPTH)
+
+def create_top_agent(registry, client, async_client, ASSISTANT_MODEL, file_ids, research, budget, assistant_pool, response_cache, planner=None, knowledge_base=None, retrieval_index=None, journal=None, checkpoint=None, tracer=None, ledger=None, summarizer=None, backend="assistants", batch_runner=None, speculator=None, task_timeout=None, log_file_path=None):
     agent_id = 0
     agent_name = "Helpful Agent"
     agent_instructions = "You are a helpful agent assisting me in completing the assigned task."
     agent_tools = ["retrieval"]  # Changed from enum to string
-    decomposer = Agent(LOG_FILE_PATH, 
+    function_list = [functions.research, functions.decomposability, functions.decompose_and_assign]
+    decomposer = Agent(log_file_path or LOG_FILE_PATH, 
                        DATA_FILE_PATH,
                        ASSISTANT_MODEL,
                        RESEARCH_URL,
-                       agents, 
+                       registry, 
                        client, 
                        agent_id, 
                        agent_name, 
                        agent_instructions, 
                        research, 
                        agent_tools, 
-                       [],  # Empty list for function_list
-                       file_ids)
+                       function_list,
+                       file_ids,
+                       async_client=async_client,
+                       budget=budget,
+                       assistant_pool=assistant_pool,
+                       response_cache=response_cache,
+                       planner=planner,
+                       knowledge_base=knowledge_base,
+                       retrieval_index=retrieval_index,
+                       journal=journal,
+                       checkpoint=checkpoint,
+                       tracer=tracer,
+                       ledger=ledger,
+                       summarizer=summarizer,
+                       backend=backend,
+                       batch_runner=batch_runner,
+                       speculator=speculator,
+                       task_timeout=task_timeout)
     
     return decomposer
 
 def get_args():
-    if len(sys.argv) > 2:
-        objective_title = sys.argv[1]
-        objective_description = sys.argv[2]
-        print(f"Objective: {objective_title}")
-    else:
+    parser = argparse.ArgumentParser(description="Run a swarm of agents on an objective.")
+    parser.add_argument("objective_title", nargs="?", help="Title of the objective")
+    parser.add_argument("objective_description", nargs="?", help="Description of the objective")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume an interrupted run from its checkpoint")
+    args = parser.parse_args()
+
+    if args.resume and not CHECKPOINT_PATH:
+        parser.error("--resume needs CHECKPOINT_PATH to be set")
+    if not args.resume and not (args.objective_title and args.objective_description):
         print("You must enter an objective to proceed. Please try again.")
         sys.exit(1)
 
-    return objective_title, objective_description 
+    return args
 
-def main():
-    print("\nGathering knowledge base files...")
-    research = Research(DATA_FILE_PATH, RESEARCH_URL)
-    file_ids = []  # Implement get_knowledge_base() if needed
-    agents = []
+# Get the objective of the run, saving it to the checkpoint for a new run
+# and loading it from the checkpoint for a resumed one
+def get_objective(args, checkpoint):
+    if checkpoint is not None:
+        saved = checkpoint.get_objective()
+        if args.resume:
+            if saved is None:
+                print(f"No checkpoint found for run {args.resume}")
+                sys.exit(1)
+            return saved
+        checkpoint.save_objective(args.objective_title, args.objective_description)
 
-    print("\nCreating top agent...")    
-    top_agent = create_top_agent(agents, client, ASSISTANT_MODEL, file_ids, research)
+    return args.objective_title, args.objective_description
 
-    print("\nAssigning task to top agent...")
-    objective_title, objective_description = get_args()
-    task_id = top_agent.receive_task_desc(objective_title, objective_description)
+# Work on the top agent's task with the configured execution engine. Runs
+# still going timeout seconds from now are cancelled and unstarted subtasks
+# skipped; on an interrupt every run in flight is cancelled before exiting.
+def run_objective(top_agent, task_id, engine, timeout=None):
+    top_task = top_agent.find_task(task_id)
+    if timeout is not None:
+        top_task.set_timeout(timeout)
 
-    print("\nInitiate work on the assigned task...") 
-    with ThreadPoolExecutor(max_workers=5) as executor:  # Adjust max_workers as needed
-        future = executor.submit(top_agent.work, task_id)
+    if engine == 'async':
+        # Multiplex every run in the swarm on a single event loop
         try:
-            future.result()  # This will re-raise any exception that occurred during execution
+            top_agent.work_async(task_id)
+        except KeyboardInterrupt:
+            logger.warning("Interrupted; cancelling runs in flight")
+            top_agent.cancel_tree(top_task)
+            raise
         except Exception as exc:
-            print(f"Task execution generated an exception: {exc}")
+            logger.exception("Task execution generated an exception: %s", exc)
+    else:
+        with ThreadPoolExecutor(max_workers=5) as executor:  # Adjust max_workers as needed
+            future = executor.submit(top_agent.work, task_id)
+            try:
+                future.result()  # This will re-raise any exception that occurred during execution
+            except KeyboardInterrupt:
+                logger.warning("Interrupted; cancelling runs in flight")
+                top_agent.cancel_tree(top_task)
+                raise
+            except Exception as exc:
+                logger.exception("Task execution generated an exception: %s", exc)
+
+def main():
+    args = get_args()
+    run_id = args.resume or create_run_id()
+    checkpoint = Checkpoint(CHECKPOINT_PATH, run_id) if CHECKPOINT_PATH else None
+    objective_title, objective_description = get_objective(args, checkpoint)
+    logging_pipeline = setup_logging(LOG_LEVEL, LOG_JSON_PATH or None, PROGRESS_INTERVAL)
+    logger.info("Objective: %s", objective_title)
+
+    client, async_client = create_clients()
+
+    logger.info("Gathering knowledge base files...")
+    research = Research(DATA_FILE_PATH, RESEARCH_URL, cache_path=RESEARCH_CACHE_PATH, cache_ttl=RESEARCH_CACHE_TTL)
+    knowledge_base = KnowledgeBase(client, DATA_FILE_PATH) if DATA_FILE_PATH else None
+    file_ids = knowledge_base.sync() if knowledge_base and SYNC_KNOWLEDGE else []
+    retrieval_index = None
+    if RETRIEVAL_INDEX_PATH:
+        retrieval_index = RetrievalIndex(RETRIEVAL_INDEX_PATH, top_k=RETRIEVAL_TOP_K)
+        if DATA_FILE_PATH and os.path.isdir(DATA_FILE_PATH):
+            retrieval_index.update(DATA_FILE_PATH)
+        logger.info("Retrieval index: %s", retrieval_index.get_stats())
+    registry = Registry()
+    budget = ExecutionBudget(MAX_CONCURRENT_RUNS, MAX_THREADS, DEPTH_QUOTAS)
+    assistant_pool = AssistantPool(client, ASSISTANT_INDEX_PATH, async_client)
+    response_cache = None
+    if RESPONSE_CACHE_PATH:
+        response_cache = ResponseCache(RESPONSE_CACHE_PATH, max_disk_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+    planner = create_planner()
+    journal = RunJournal(LOG_FILE_PATH, run_id)
+    logger.info("%s %s", 'Resuming' if args.resume else 'Run ID:', run_id)
+
+    tracer = Tracer() if TRACE_PATH else None
+    ledger = TokenLedger(MAX_TOKENS, MAX_COST, BUDGET_RESERVE)
+    summarizer = Summarizer(SUMMARY_MAX_TOKENS, SUMMARY_FAN_IN)
+    batch_runner = BatchRunner(client, BATCH_PATH, BATCH_SIZE, BATCH_LINGER, BATCH_POLL_INTERVAL) if BATCH_MODE else None
+    if batch_runner and EXECUTION_ENGINE != 'async' and BATCH_SIZE > MAX_THREADS:
+        logger.warning("Each batched task holds a thread while it waits; batches will hold about MAX_THREADS (%d) requests. Use EXECUTION_ENGINE=async for larger batches.", MAX_THREADS)
+    speculator = Speculator(SPECULATE_MIN_DEPTH) if SPECULATE else None
+
+    logger.info("Creating top agent...")
+    top_agent = create_top_agent(registry, client, async_client, ASSISTANT_MODEL, file_ids, research, budget, assistant_pool, response_cache, planner, knowledge_base, retrieval_index, journal, checkpoint, tracer, ledger, summarizer, RUN_BACKEND, batch_runner, speculator, TASK_TIMEOUT)
+
+    logger.info("Assigning task to top agent...")
+    task_id = top_agent.receive_task_desc(objective_title, objective_description)
+
+    logger.info("Initiate work on the assigned task...")
+    run_objective(top_agent, task_id, EXECUTION_ENGINE, OBJECTIVE_TIMEOUT)
+    budget.shutdown()
+    if batch_runner:
+        batch_runner.close()
+        logger.info("Batches: %s", batch_runner.get_stats())
+    logger.info("Execution budget: %s", budget.report())
+    logger.info("Assistant pool: %s", assistant_pool.get_stats())
+    logger.info("Registry: %s", registry.get_stats())
+    logger.info("API throttling: %s", client.get_stats())
+    logger.info("Cost report:\n%s", ledger.report())
+    if speculator:
+        logger.info("Speculation: %s", speculator.get_stats())
+    if response_cache:
+        logger.info("Response cache: %s", response_cache.get_stats())
+        response_cache.close()
+    if checkpoint:
+        logger.info("Checkpoint: %s", checkpoint.get_stats())
+        checkpoint.close()
+    if tracer:
+        # Open the Chrome trace in chrome://tracing or Perfetto; the OTLP
+        # file can be sent to any OpenTelemetry collector
+        chrome_path, otlp_path = tracer.export(TRACE_PATH, run_id)
+        logger.info("Trace: %s", tracer.get_stats())
+        logger.info("Trace written to %s and %s", chrome_path, otlp_path)
 
-    # Print contents of generated files
+    # Print the outputs of this run (see journal.py to read earlier runs)
+    journal.close()
+    logger.info("Logging: %s", logging_pipeline.get_stats())
+    logging_pipeline.stop()
     print("\nGenerated outputs:")
-    for filename in os.listdir(LOG_FILE_PATH):
-        file_path = os.path.join(LOG_FILE_PATH, filename)
-        if os.path.isfile(file_path):
-            print(f"\nContents of {filename}:")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                print(f.read())
+    print_run(LOG_FILE_PATH, journal.run_id)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,28 @@
 import os
 import time
+import logging
+import hashlib
 import utils
+import functions
+import asyncio
+import polling
 import threading
+import openai
+
+from types import SimpleNamespace
+from cache import CachedRun, build_entry
+from backends import ChatRun, select_backend, make_stopped_run
+from registry import make_key
+from tracing import NO_TRACER, RunTimeline
+from log import get_logger
+
+logger = get_logger(__name__)
 
 class Task:
-    def __init__(self, client, log_file_path, id, title, description, agent_id, research_url, parent_task=None, dependent_upon=None, outcome=None):
+    def __init__(self, client, log_file_path, id, title, description, agent_id, research_url, parent_task=None, dependent_upon=None, outcome=None, async_client=None, stream=True, use_cache=True, namespace="", use_retrieval=True):
         self.log_file_path = log_file_path
         self.client = client
+        self.async_client = async_client
         self.id = id
         self.title = title
         self.description = description
@@ -15,21 +31,91 @@ class Task:
         self.research_url = research_url
         self.outcome = outcome
         self.decomposability_task = None
+        self.subtask_specs = None
+        self.agent_specs = None
         self.tool_calls = None
         self.is_decomposable = None
         self.is_complete = False
         self.parent_task = parent_task
+        self.depth = parent_task.depth + 1 if parent_task else 0
+
+        # Monotonic time by which the task must be done (None for no
+        # deadline). Subtasks inherit their parent's deadline.
+        self.deadline = parent_task.deadline if parent_task else None
+
+        # Subtasks and their agents live in the namespace of the task that
+        # was decomposed, since the model numbers them from 1 in every subtree
+        self.namespace = parent_task.key if parent_task else namespace
+        self.key = make_key(self.namespace, id)
+        self.agent_key = make_key(self.namespace, agent_id)
+
+        # Task this run does work for and what it does for it. Tasks an
+        # agent creates to plan or summarize another task belong to that
+        # task, so they share its checkpoint entries and trace lane.
+        self.owner_key = self.key
+        self.role = "do"
+        self.part = None
+        self.held_cache_entry = None
+        self.checkpoint = None
+        self.tracer = NO_TRACER
+        self.run_timeline = None
+        self.upstream_outcomes = {}
+        self.stream = stream
+        self.use_cache = use_cache
+        self.use_retrieval = use_retrieval
+
+        # Whether the task may need the assistant's hosted tools (such as
+        # the code interpreter), and the backend its latest run used
+        self.uses_hosted_tools = True
+        self.backend = None
+
+        # Query for the local retrieval index, taken before the description
+        # is wrapped into a prompt
+        self.query = f"{title} {description}"
+        self.poll_count = 0
+        self.completion_lag = None
+
+        # Token usage and cost of the latest run
+        self.usage = None
+
+        # ID of the last message read from (or posted to) the run's thread,
+        # so only newer messages are fetched
+        self.last_message_id = None
+
+        # Cancellation: once requested for the task, its parent or the task
+        # it plans or summarizes (its owner), the remote run in flight
+        # (thread ID, run ID) is cancelled and the task is not completed.
+        # The watchdog cancels the run at the task's deadline.
+        self.cancelled = threading.Event()
+        self.owner = None
+        self.remote_run = None
+        self.cancel_sent = False
+        self.watchdog = None
+        self.cancel_task = None
+
+        # Details of the latest run, recorded in the run journal
+        self.prompt_hash = None
+        self.started_at = None
+        self.thread_id = None
 
-        print(f'Created task "{self.title}"')
+        logger.debug('Created task "%s"', self.title)
 
         self.lock = threading.Lock()
 
+    # Key of this task's remote run in the checkpoint
+    @property
+    def checkpoint_key(self):
+        key = f"{self.owner_key}:{self.role}"
+        return f"{key}:{self.part}" if self.part else key
+
     # Add message to the assistant thread and create a run
     def submit_message(self, assistant_id, thread, user_message):
         # Added messages to the thread
-        self.client.beta.threads.messages.create(
-            thread_id=thread.id, role="user", content=user_message
-        )
+        with self.tracer.span("message.create", self.owner_key):
+            message = self.client.beta.threads.messages.create(
+                thread_id=thread.id, role="user", content=user_message
+            )
+        self.last_message_id = message.id
 
         # Run the thread and return the run object
         return self.client.beta.threads.runs.create(
@@ -37,66 +123,479 @@ class Task:
             assistant_id=assistant_id,
         )
     
+    # Async version of submit_message using the async client
+    async def async_submit_message(self, assistant_id, thread, user_message):
+        with self.tracer.span("message.create", self.owner_key):
+            message = await self.async_client.beta.threads.messages.create(
+                thread_id=thread.id, role="user", content=user_message
+            )
+        self.last_message_id = message.id
+
+        return await self.async_client.beta.threads.runs.create(
+            thread_id=thread.id,
+            assistant_id=assistant_id,
+        )
+
     # Create assistant thread and run it
     def create_thread_and_run(self, user_input, assistant_id):
         # Create the thread
-        thread = self.client.beta.threads.create()
+        with self.tracer.span("thread.create", self.owner_key):
+            thread = self.client.beta.threads.create()
 
         # Submit the message to the assistant on the thread
         run =  self.submit_message(assistant_id, thread, user_input)
         return thread, run
 
-    # Waiting in a loop
+    # Async version of create_thread_and_run
+    async def async_create_thread_and_run(self, user_input, assistant_id):
+        with self.tracer.span("thread.create", self.owner_key):
+            thread = await self.async_client.beta.threads.create()
+        run = await self.async_submit_message(assistant_id, thread, user_input)
+        return thread, run
+
+    # Create the thread and run it, returning once the run has finished.
+    # Completion is detected from the run's event stream when streaming is
+    # available, falling back to polling with adaptive backoff.
+    def create_thread_and_wait(self, user_input, assistant_id):
+        if not self.stream:
+            thread, run = self.create_thread_and_run(user_input, assistant_id)
+            self.record_run_started(thread, run)
+            return thread, self.wait_on_run(run, thread, 5)
+
+        with self.tracer.span("thread.create", self.owner_key):
+            thread = self.client.beta.threads.create()
+        with self.tracer.span("message.create", self.owner_key):
+            message = self.client.beta.threads.messages.create(
+                thread_id=thread.id, role="user", content=user_input
+            )
+        self.last_message_id = message.id
+
+        run = self.stream_run(thread, assistant_id)
+        if run is None:
+            run = self.client.beta.threads.runs.create(
+                thread_id=thread.id,
+                assistant_id=assistant_id,
+            )
+            self.record_run_started(thread, run)
+
+        # Poll if the stream ended before the run finished
+        return thread, self.wait_on_run(run, thread, 5)
+
+    # Async version of create_thread_and_wait
+    async def async_create_thread_and_wait(self, user_input, assistant_id):
+        if not self.stream:
+            thread, run = await self.async_create_thread_and_run(user_input, assistant_id)
+            self.record_run_started(thread, run)
+            return thread, await self.async_wait_on_run(run, thread, 5)
+
+        with self.tracer.span("thread.create", self.owner_key):
+            thread = await self.async_client.beta.threads.create()
+        with self.tracer.span("message.create", self.owner_key):
+            message = await self.async_client.beta.threads.messages.create(
+                thread_id=thread.id, role="user", content=user_input
+            )
+        self.last_message_id = message.id
+
+        run = await self.async_stream_run(thread, assistant_id)
+        if run is None:
+            run = await self.async_client.beta.threads.runs.create(
+                thread_id=thread.id,
+                assistant_id=assistant_id,
+            )
+            self.record_run_started(thread, run)
+
+        return thread, await self.async_wait_on_run(run, thread, 5)
+
+    # Create a streaming run and consume its events until the run finishes.
+    # Returns the last run seen, or None if streaming is unavailable.
+    def stream_run(self, thread, assistant_id):
+        run = None
+        try:
+            stream = self.client.beta.threads.runs.create(
+                thread_id=thread.id,
+                assistant_id=assistant_id,
+                stream=True,
+            )
+            # Closing the stream releases its connection
+            with stream:
+                for event in stream:
+                    self.check_cancelled()
+                    if not event.event.startswith("thread.run.") or event.event.startswith("thread.run.step"):
+                        continue
+                    run = event.data
+                    if event.event == "thread.run.created":
+                        self.record_run_started(thread, run)
+                    self.observe_run(run)
+                    if event.event in polling.TERMINAL_RUN_EVENTS:
+                        self.record_completion(run, 0)
+                        break
+        except openai.APIError as exc:
+            logger.warning("Run streaming unavailable, falling back to polling: %s", exc)
+            self.stream = False
+
+        return run
+
+    # Async version of stream_run
+    async def async_stream_run(self, thread, assistant_id):
+        run = None
+        try:
+            stream = await self.async_client.beta.threads.runs.create(
+                thread_id=thread.id,
+                assistant_id=assistant_id,
+                stream=True,
+            )
+            async with stream:
+                async for event in stream:
+                    await self.async_check_cancelled()
+                    if not event.event.startswith("thread.run.") or event.event.startswith("thread.run.step"):
+                        continue
+                    run = event.data
+                    if event.event == "thread.run.created":
+                        self.record_run_started(thread, run)
+                    self.observe_run(run)
+                    if event.event in polling.TERMINAL_RUN_EVENTS:
+                        self.record_completion(run, 0)
+                        break
+        except openai.APIError as exc:
+            logger.warning("Run streaming unavailable, falling back to polling: %s", exc)
+            self.stream = False
+
+        return run
+
+    # Waiting in a loop. wait_duration caps the adaptive polling interval.
     def wait_on_run(self, run, thread, wait_duration):
+        backoff = polling.Backoff(maximum=wait_duration)
+        polls = 0
+
         # Keep looping until the thread has completed its run
-        while run.status == "queued" or run.status == "in_progress":
+        while run.status in polling.PENDING_RUN_STATUSES:
+            self.check_cancelled()
+            if self.is_expired(polling.CANCEL_GRACE):
+                logger.warning("Run %s did not stop after task %s's deadline; giving up on it", run.id, self.key)
+                break
+
+            # Wait before checking again, a little longer each time
+            time.sleep(backoff.next())
+
             # Get run status of thread
             run = self.client.beta.threads.runs.retrieve(
                 thread_id=thread.id,
                 run_id=run.id,
             )
-            print(f'Run Status: {run.status}')
+            polls += 1
+            self.observe_run(run)
+            logger.info("Run %s status: %s after %d polls", run.id, run.status, polls, extra={"progress": True})
 
-            # Wait for 1/2 second
-            time.sleep(wait_duration)
+        self.untrack_remote_run()
+        if polls:
+            self.record_completion(run, polls)
+        self.finish_run_timeline(run, polls)
         return run
 
-    # Gets an agent from the list of agents by agent ID
-    def get_agent(self, agents, agent_id):
+    # Async version of wait_on_run; yields to the event loop instead of
+    # parking a thread between status checks
+    async def async_wait_on_run(self, run, thread, wait_duration):
+        backoff = polling.Backoff(maximum=wait_duration)
+        polls = 0
+
+        while run.status in polling.PENDING_RUN_STATUSES:
+            await self.async_check_cancelled()
+            if self.is_expired(polling.CANCEL_GRACE):
+                logger.warning("Run %s did not stop after task %s's deadline; giving up on it", run.id, self.key)
+                break
+            await asyncio.sleep(backoff.next())
+
+            run = await self.async_client.beta.threads.runs.retrieve(
+                thread_id=thread.id,
+                run_id=run.id,
+            )
+            polls += 1
+            self.observe_run(run)
+            logger.info("Run %s status: %s after %d polls", run.id, run.status, polls, extra={"progress": True})
+
+        self.untrack_remote_run()
+        if polls:
+            self.record_completion(run, polls)
+        self.finish_run_timeline(run, polls)
+        return run
+
+    # Checkpoint a remote run that has started so a resumed swarm can
+    # re-attach to it
+    def record_run_started(self, thread, run):
+        if self.checkpoint is not None and getattr(run, "id", None):
+            self.checkpoint.start_run(self.checkpoint_key, thread.id, run.id, self.last_message_id)
+        self.run_timeline = RunTimeline(self.tracer, getattr(run, "status", None))
+        if getattr(run, "id", None):
+            self.track_remote_run(thread.id, run.id)
+
+    # Note the remote run in flight, and cancel it at the task's deadline:
+    # on the event loop when called from a coroutine, otherwise from the
+    # shared watchdog thread
+    def track_remote_run(self, thread_id, run_id):
+        self.remote_run = (thread_id, run_id)
+        if self.deadline is None or self.watchdog is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.watchdog = polling.WATCHDOG.schedule(self.deadline, self.check_cancelled)
+        else:
+            self.watchdog = loop.call_later(self.get_time_left(), self.start_async_cancel)
+
+    def start_async_cancel(self):
+        self.cancel_task = asyncio.ensure_future(self.async_check_cancelled())
+
+    def untrack_remote_run(self):
+        self.remote_run = None
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+
+    # Give the task at most timeout seconds from now
+    def set_timeout(self, timeout):
+        deadline = time.monotonic() + timeout
+        self.deadline = deadline if self.deadline is None else min(self.deadline, deadline)
+
+    # Seconds left until the task's deadline, or None without one
+    def get_time_left(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    # Check if the deadline passed more than grace seconds ago
+    def is_expired(self, grace=0.0):
+        return self.deadline is not None and time.monotonic() >= self.deadline + grace
+
+    # Check if the task, or a task it belongs to, was cancelled
+    def is_cancelled(self):
+        if self.cancelled.is_set():
+            return True
+        scope = self.owner or self.parent_task
+        return scope is not None and scope.is_cancelled()
+
+    def should_stop(self):
+        return self.is_cancelled() or self.is_expired()
+
+    # Ask the task's run to stop. A remote run in flight is cancelled, a
+    # run not started yet is never started, and the task is not completed.
+    def cancel(self):
+        self.cancelled.set()
+        self.check_cancelled()
+
+    # Async version of cancel
+    async def async_cancel(self):
+        self.cancelled.set()
+        await self.async_check_cancelled()
+
+    # Cancel the remote run in flight if cancellation was requested
+    def check_cancelled(self):
+        remote_run = self.claim_cancel()
+        if remote_run is None:
+            return
+
+        thread_id, run_id = remote_run
+        try:
+            self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            logger.info("Cancelled run %s of task %s (%s)", run_id, self.key, self.get_stop_reason())
+        except Exception as exc:
+            logger.info("Could not cancel run %s: %s", run_id, exc)
+
+    # Async version of check_cancelled
+    async def async_check_cancelled(self):
+        remote_run = self.claim_cancel()
+        if remote_run is None:
+            return
+
+        thread_id, run_id = remote_run
+        try:
+            await self.async_client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            logger.info("Cancelled run %s of task %s (%s)", run_id, self.key, self.get_stop_reason())
+        except Exception as exc:
+            logger.info("Could not cancel run %s: %s", run_id, exc)
+
+    # Get the remote run to cancel, once
+    def claim_cancel(self):
+        with self.lock:
+            if self.remote_run is None or self.cancel_sent or not self.should_stop():
+                return None
+            self.cancel_sent = True
+            return self.remote_run
+
+    def get_stop_reason(self):
+        return "cancelled" if self.is_cancelled() else "past its deadline"
+
+    # Leave a cancelled task, or one past its deadline, incomplete. Returns
+    # (thread, run), with a stand-in run if none was started.
+    def abandon(self, thread=None, run=None):
+        if self.checkpoint is not None:
+            self.checkpoint.finish_run(self.checkpoint_key)
+        logger.info("Task %s was %s: %s", self.key, self.get_stop_reason(), self.title)
+
+        if run is None:
+            run = make_stopped_run("cancelled" if self.is_cancelled() else "expired")
+        return thread or SimpleNamespace(id=None), run
+
+    # Leave a task whose run failed, expired, was cancelled remotely or
+    # never finished incomplete
+    def fail(self, thread, run):
+        if self.checkpoint is not None:
+            self.checkpoint.finish_run(self.checkpoint_key)
+
+        error = getattr(run, "last_error", None)
+        detail = f": {error.message}" if error is not None else ""
+        logger.warning("Run %s of task %s ended with status %s%s", run.id, self.key, run.status, detail)
+        return thread, run
+
+    # Note a status seen for the current run
+    def observe_run(self, run):
+        if self.run_timeline is not None:
+            self.run_timeline.observe(run.status)
+
+    # Trace how long the run was queued and in progress
+    def finish_run_timeline(self, run, polls):
+        if self.run_timeline is not None:
+            self.run_timeline.finish(self.owner_key, run, polls)
+            self.run_timeline = None
 
-        # Get the assistant from the agent
-        for agent in agents:
-            if agent.id == agent_id:
-                return agent
+    # Re-attach to the remote run checkpointed by an interrupted swarm.
+    # Returns (thread, run) once it has finished, or None if there is no
+    # usable run to re-attach to.
+    def reattach_run(self):
+        in_flight = self.get_run_in_flight()
+        if in_flight is None:
+            return None
+
+        try:
+            run = self.client.beta.threads.runs.retrieve(thread_id=in_flight["thread_id"], run_id=in_flight["run_id"])
+        except Exception as exc:
+            logger.warning("Could not re-attach to run %s: %s", in_flight['run_id'], exc)
+            return None
+
+        return self.attach(in_flight, run, self.wait_on_run)
+
+    # Async version of reattach_run
+    async def async_reattach_run(self):
+        in_flight = self.get_run_in_flight()
+        if in_flight is None:
+            return None
+
+        try:
+            run = await self.async_client.beta.threads.runs.retrieve(thread_id=in_flight["thread_id"], run_id=in_flight["run_id"])
+        except Exception as exc:
+            logger.warning("Could not re-attach to run %s: %s", in_flight['run_id'], exc)
+            return None
+
+        return self.attach(in_flight, run, self.async_wait_on_run)
+
+    def get_run_in_flight(self):
+        if self.checkpoint is None:
+            return None
+        return self.checkpoint.get_run(self.checkpoint_key)
+
+    # Pick up a checkpointed run unless it ended without a result. Returns
+    # (thread, result of wait) where wait may be a coroutine.
+    def attach(self, in_flight, run, wait):
+        if run.status in ("failed", "cancelled", "expired"):
+            self.checkpoint.finish_run(self.checkpoint_key)
+            return None
+
+        logger.info("Re-attached to run %s for task %s", run.id, self.key)
+        self.checkpoint.record_reattached()
+        self.run_timeline = RunTimeline(self.tracer, run.status)
+        thread = SimpleNamespace(id=in_flight["thread_id"])
+        self.track_remote_run(thread.id, run.id)
+        self.last_message_id = in_flight.get("message_id")
+        return thread, wait(run, thread, 5)
+
+    # Record how long it took to notice the run had finished
+    def record_completion(self, run, polls):
+        self.poll_count = polls
+        self.completion_lag = polling.get_completion_lag(run)
+
+    # Gets the agent assigned to the task from the registry
+    def get_agent(self, registry):
+        return registry.get_agent(self.agent_key)
 
     # Aggregates all work done from the task list
-    def aggregate_work(self, tasks, agents):
-        work = ""
-        for task in tasks:
-            # Only grab completed tasks after the first one
-            # Note: the first task is the decomposition task, so 
-            #       it's not relevant to the work done so far.
-            if task.is_complete & task.id > 0:
-                work = f'{work}\n\n{task.print(agents)}'
-        
-        return work
-
-    # Get the list of messages from the thread
-    def get_messages(self, thread):
-        return self.client.beta.threads.messages.list(thread_id=thread.id, order="asc")
+    def aggregate_work(self, tasks, registry):
+        # Only grab completed tasks after the first one
+        # Note: the first task is the decomposition task, so 
+        #       it's not relevant to the work done so far.
+        return "".join(f'\n\n{task.print(registry)}' for task in tasks if task.is_complete and task.id > 0)
+
+    # Get a page of messages from the thread
+    def get_messages(self, thread, order="asc", limit=100, after=None):
+        if after is None:
+            return self.client.beta.threads.messages.list(thread_id=thread.id, order=order, limit=limit)
+        return self.client.beta.threads.messages.list(thread_id=thread.id, order=order, limit=limit, after=after)
+
+    # Async version of get_messages
+    async def async_get_messages(self, thread, order="asc", limit=100, after=None):
+        if after is None:
+            return await self.async_client.beta.threads.messages.list(thread_id=thread.id, order=order, limit=limit)
+        return await self.async_client.beta.threads.messages.list(thread_id=thread.id, order=order, limit=limit, after=after)
+
+    # Get the messages added to the thread since the last one seen. Without
+    # a cursor only the newest message is fetched.
+    def get_new_messages(self, thread):
+        if self.last_message_id is None:
+            return self.get_messages(thread, order="desc", limit=1).data
+
+        messages = []
+        while True:
+            page = self.get_messages(thread, after=self.last_message_id)
+            if page.data:
+                messages.extend(page.data)
+                self.last_message_id = page.data[-1].id
+            if not page.data or not getattr(page, "has_more", False):
+                return messages
+
+    # Async version of get_new_messages
+    async def async_get_new_messages(self, thread):
+        if self.last_message_id is None:
+            return (await self.async_get_messages(thread, order="desc", limit=1)).data
+
+        messages = []
+        while True:
+            page = await self.async_get_messages(thread, after=self.last_message_id)
+            if page.data:
+                messages.extend(page.data)
+                self.last_message_id = page.data[-1].id
+            if not page.data or not getattr(page, "has_more", False):
+                return messages
 
     # Get the latest message in the message thread
     def get_latest_message(self, thread):
-        # Get messages from the thread
-        messages = self.get_messages(thread)
+        messages = self.get_new_messages(thread)
+        return messages[-1] if messages else None
 
-        # Get the last message
-        latest_message = messages.data[len(messages.data)-1]
+    # Async version of get_latest_message
+    async def async_get_latest_message(self, thread):
+        messages = await self.async_get_new_messages(thread)
+        return messages[-1] if messages else None
 
-        return latest_message
+    # Get the assistant's reply from a finished run: the text of every new
+    # assistant message, in order
+    def get_outcome(self, thread):
+        with self.tracer.span("messages.fetch", self.owner_key):
+            return self.build_outcome(self.get_new_messages(thread))
+
+    # Async version of get_outcome
+    async def async_get_outcome(self, thread):
+        with self.tracer.span("messages.fetch", self.owner_key):
+            return self.build_outcome(await self.async_get_new_messages(thread))
+
+    def build_outcome(self, messages):
+        replies = [functions.get_message_text(message) for message in messages if message.role == "assistant"]
+        return "\n\n".join(replies)
 
     # Completes a task
     def finish(self, run, thread, tool_call, tool_response):
+        # Cached and chat runs have nothing to resume remotely
+        if isinstance(run, (CachedRun, ChatRun)):
+            return
+
         # Build tool outputs
         tool_outputs = []
         for tc in self.tool_calls:
@@ -107,65 +606,289 @@ class Task:
                 tool_outputs.append({"tool_call_id": tc.id, "output": "Pending...",})
 
         # Submit the tool outputs to the assistant
-        run = self.client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread.id,
-            run_id=run.id,
-            tool_outputs=tool_outputs
-        )
+        with self.tracer.span("tool_outputs.submit", self.owner_key):
+            run = self.client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread.id,
+                run_id=run.id,
+                tool_outputs=tool_outputs
+            )
+
+    # Async version of finish
+    async def async_finish(self, run, thread, tool_call, tool_response):
+        if isinstance(run, (CachedRun, ChatRun)):
+            return
+
+        tool_outputs = []
+        for tc in self.tool_calls:
+            if (tc.id == tool_call.id):
+                tool_outputs.append({"tool_call_id": tc.id, "output": tool_response,})
+            else:
+                tool_outputs.append({"tool_call_id": tc.id, "output": "Pending...",})
 
-    def print(self, agent_list):
+        with self.tracer.span("tool_outputs.submit", self.owner_key):
+            await self.async_client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread.id,
+                run_id=run.id,
+                tool_outputs=tool_outputs
+            )
+
+    # Cancel a run left waiting for tool outputs nobody will submit, so it
+    # does not hold its thread until it expires
+    def release(self, run, thread):
+        if isinstance(run, (CachedRun, ChatRun)) or run.status != "requires_action":
+            return
+
+        try:
+            self.client.beta.threads.runs.cancel(thread_id=thread.id, run_id=run.id)
+            logger.info("Released run %s of task %s waiting for tool outputs", run.id, self.key)
+        except Exception as exc:
+            logger.info("Could not release run %s of task %s: %s", run.id, self.key, exc)
+
+    # Async version of release
+    async def async_release(self, run, thread):
+        if isinstance(run, (CachedRun, ChatRun)) or run.status != "requires_action":
+            return
+
+        try:
+            await self.async_client.beta.threads.runs.cancel(thread_id=thread.id, run_id=run.id)
+            logger.info("Released run %s of task %s waiting for tool outputs", run.id, self.key)
+        except Exception as exc:
+            logger.info("Could not release run %s of task %s: %s", run.id, self.key, exc)
+
+    def print(self, registry):
         # Get the name of the agent
-        agent_name = ""
-        for agent in agent_list:
-            if agent.id == self.assigned_agent:
-                agent_name = agent.name
-                break
+        agent = self.get_agent(registry)
+        agent_name = agent.name if agent else ""
 
         return f"\n\nTask ID: {self.id}, Title: {self.title}, Description: {self.description}, Assigned Agent: {agent_name}, Dependent Upon: {self.dependent_upon}\n\nTask Outcome:\n{self.outcome}"
 
-    def run(self, agents, log_file_path, knowledge_file_path):
-        with self.lock:
-            agent = self.get_agent(agents, self.assigned_agent)
-            prompt = f"""
+    # Build the prompt sent to the assistant for this task
+    def build_prompt(self, context=None):
+        return f"""
             Complete the following task:
             Task Title: {self.title}
             Task Description: {self.description}
-            
+            {self.build_upstream_section()}{self.build_context_section(context)}
             If the task requires writing code, please provide the complete, runnable code.
             For non-coding tasks, provide a detailed description or plan to accomplish the task.
             
             Begin your response now:
             """
 
-            print(f'\n{agent.assistant.name} executing task #{self.id}: {self.title}...')
-            thread, run = self.create_thread_and_run(prompt, agent.assistant.id)
+    # Build the part of the prompt holding the outcomes of the tasks this
+    # task depends on
+    def build_upstream_section(self):
+        if not self.upstream_outcomes:
+            return ""
 
-            run = self.wait_on_run(run, thread, 5)
+        sections = [f"Outcome of task #{task_id}:\n{outcome}" for task_id, outcome in self.upstream_outcomes.items() if outcome is not None]
+        if not sections:
+            return ""
+        return "\n            This task depends on the following completed tasks. Use their outcomes as inputs:\n\n" + "\n\n".join(sections) + "\n"
+
+    # Note the start of a run
+    def start(self, prompt):
+        self.started_at = time.time()
+        self.prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+    # Get the chunks of the local research corpus most relevant to the task
+    def retrieve_context(self, agent):
+        if not self.use_retrieval or agent.retrieval_index is None:
+            return []
+
+        return agent.retrieval_index.search(self.query)
+
+    # Build the part of the prompt holding retrieved research excerpts
+    def build_context_section(self, context):
+        if not context:
+            return ""
+
+        sections = [f"From {document}:\n{text}" for _, document, text in context]
+        return "\n            The following excerpts from the research library may be relevant:\n\n" + "\n\n".join(sections) + "\n"
+
+    # Run the task on its agent's assistant, or as a chat completion (see
+    # backends.select_backend). The task lock only guards updates to the
+    # task's state, so readers such as aggregate_work and progress
+    # reporting are never blocked by the remote run.
+    def run(self, registry, log_file_path, knowledge_file_path):
+        agent = self.get_agent(registry)
+        self.checkpoint = agent.checkpoint
+        self.tracer = agent.tracer
+        backend = select_backend(agent, self)
+        self.backend = backend.name
+        with self.tracer.span("run", self.owner_key, role=self.role, task=self.key, backend=backend.name):
+            prompt = self.build_prompt(self.retrieve_context(agent))
+            self.start(prompt)
+
+            # Serve repeated prompts from the response cache
+            cache_key = self.get_cache_key(agent, prompt)
+            cached = self.run_from_cache(agent, cache_key, registry)
+            if cached:
+                return cached
+
+            logger.info("%s executing task #%s: %s", agent.assistant.name, self.id, self.title)
+            with backend.run_slot(self, agent):
+                if self.should_stop():
+                    return self.abandon()
+                thread, run = backend.execute(self, agent, prompt)
+
+            self.record_usage(agent, run)
+            if self.is_cancelled():
+                return self.abandon(thread, run)
+            if run.status not in polling.USABLE_RUN_STATUSES:
+                return self.fail(thread, run)
+            if run.status == "incomplete":
+                logger.warning("Run %s of task %s is incomplete; keeping its partial outcome", run.id, self.key)
+            self.complete(backend.get_outcome(self, thread, run), thread.id, registry)
+            self.store_in_cache(agent, cache_key, run)
+
+            return thread, run
+
+    # Async version of run
+    async def async_run(self, registry, log_file_path, knowledge_file_path):
+        agent = self.get_agent(registry)
+        self.checkpoint = agent.checkpoint
+        self.tracer = agent.tracer
+        backend = select_backend(agent, self)
+        self.backend = backend.name
+        with self.tracer.span("run", self.owner_key, role=self.role, task=self.key, backend=backend.name):
+            prompt = self.build_prompt(self.retrieve_context(agent))
+            self.start(prompt)
+
+            cache_key = self.get_cache_key(agent, prompt)
+            cached = self.run_from_cache(agent, cache_key, registry)
+            if cached:
+                return cached
+
+            logger.info("%s executing task #%s: %s", agent.assistant.name, self.id, self.title)
+            async with backend.async_run_slot(self, agent):
+                if self.should_stop():
+                    return self.abandon()
+                thread, run = await backend.async_execute(self, agent, prompt)
+
+            self.record_usage(agent, run)
+            if self.is_cancelled():
+                return self.abandon(thread, run)
+            if run.status not in polling.USABLE_RUN_STATUSES:
+                return self.fail(thread, run)
+            if run.status == "incomplete":
+                logger.warning("Run %s of task %s is incomplete; keeping its partial outcome", run.id, self.key)
+            self.complete(await backend.async_get_outcome(self, thread, run), thread.id, registry)
+            self.store_in_cache(agent, cache_key, run)
 
-            task_outcome_message = self.get_latest_message(thread)
-            self.outcome = task_outcome_message.content[0].text.value
-            self.is_complete = True
-            
-            # Determine the appropriate file extension
-            file_extension = self.determine_file_extension(self.outcome)
-            
-            # Create a sanitized filename
-            sanitized_title = ''.join(c for c in self.title if c.isalnum() or c in (' ', '_')).rstrip()
-            file_name = f'{thread.id}_{self.id}.{sanitized_title}{file_extension}'
-            
-            # Ensure the log directory exists
-            os.makedirs(self.log_file_path, exist_ok=True)
-            
-            # Write the outcome to the file
-            file_path = os.path.join(self.log_file_path, file_name)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(self.outcome)
-            
-            print(f'\nTask completed. Output written to {file_path}')
-            print(f'\n{self.print(agents)}')
-            
             return thread, run
 
+    # Record the run's token usage against the objective's budget
+    def record_usage(self, agent, run):
+        if agent.ledger is not None:
+            self.usage = agent.ledger.record(self, agent, run)
+
+    # Get the response cache key for running the prompt on the agent's
+    # assistant, or None if this run should not be cached
+    def get_cache_key(self, agent, prompt):
+        if not self.use_cache or agent.response_cache is None:
+            return None
+
+        return agent.response_cache.get_key(agent.model, agent.description, agent.build_tools(), prompt)
+
+    # Complete the task from a cached response. Returns (thread, run) on a
+    # cache hit, otherwise None.
+    def run_from_cache(self, agent, cache_key, registry):
+        if cache_key is None:
+            return None
+
+        entry = agent.response_cache.get(cache_key)
+        if entry is None:
+            return None
+
+        logger.info("%s reused cached result for task #%s: %s", agent.assistant.name, self.id, self.title)
+        self.complete(entry["outcome"], "cached", registry)
+        return SimpleNamespace(id=None), CachedRun(entry)
+
+    # Store a finished run's result in the response cache
+    def store_in_cache(self, agent, cache_key, run):
+        if cache_key is None or run.status not in ("completed", "requires_action"):
+            return
+
+        if self.role == "speculate":
+            self.held_cache_entry = (cache_key, build_entry(run, self.outcome))
+            return
+        agent.response_cache.set(cache_key, build_entry(run, self.outcome))
+
+    # Record the outcome of a finished run. Planning runs only answer the
+    # task they plan for when they do not decompose it, and speculative runs
+    # only when their outcome is kept, so their output is written by the
+    # agent once it knows (see Agent.apply_plan and Agent.adopt_speculation).
+    def complete(self, outcome, thread_id, registry):
+        with self.lock:
+            self.outcome = outcome
+            self.is_complete = True
+            self.thread_id = thread_id
+
+        if self.checkpoint is not None:
+            self.checkpoint.finish_run(self.checkpoint_key)
+
+        if self.role not in ("plan", "speculate"):
+            self.write_output(registry)
+
+    # Write the held back outputs of a speculative run whose outcome is
+    # kept, as the run of the task it was a copy of
+    def publish(self, registry):
+        self.role = "do"
+        self.write_output(registry)
+
+        agent = self.get_agent(registry)
+        if self.held_cache_entry is not None and agent is not None:
+            agent.response_cache.set(*self.held_cache_entry)
+
+    # Write the task's outcome to the agent's run journal, or to a file of
+    # its own in the log directory when there is no journal
+    def write_output(self, registry):
+        outcome = self.outcome
+        agent = self.get_agent(registry)
+        with self.tracer.span("output.write", self.owner_key):
+            if agent is not None and agent.journal is not None:
+                agent.journal.record(self.build_record(agent))
+                logger.info("Task %s completed: %s", self.key, self.title)
+            else:
+                # Create a sanitized filename
+                sanitized_title = ''.join(c for c in self.title if c.isalnum() or c in (' ', '_')).rstrip()
+                file_name = f'{self.thread_id}_{self.id}.{sanitized_title}{self.determine_file_extension(outcome)}'
+                file_path = os.path.join(self.log_file_path, file_name)
+                utils.write_to_file(file_path, outcome)
+                logger.info("Task completed. Output written to %s", file_path)
+
+        # Full outcomes are only dumped when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", self.print(registry))
+
+    # Build the run journal record of the task's latest run. Records are
+    # keyed by the task the run works for; planning runs and summaries of
+    # that task are told apart by their role and part.
+    def build_record(self, agent):
+        finished_at = time.time()
+        return {
+            "key": self.owner_key,
+            "role": self.role,
+            "part": self.part,
+            "task_id": self.id,
+            "title": self.title,
+            "parent": self.parent_task.key if self.parent_task else None,
+            "agent": agent.name,
+            "agent_key": self.agent_key,
+            "thread_id": self.thread_id,
+            "cached": self.thread_id == "cached",
+            "backend": self.backend,
+            "prompt_hash": self.prompt_hash,
+            "outcome": self.outcome,
+            "started_at": self.started_at,
+            "finished_at": finished_at,
+            "duration": finished_at - self.started_at if self.started_at else None,
+            "poll_count": self.poll_count,
+            "completion_lag": self.completion_lag,
+            "usage": self.usage,
+        }
+
     def determine_file_extension(self, content):
         # Check if the content looks like code
         code_indicators = ['import ', 'def ', 'class ', 'function', 'var ', 'let ', 'const ']
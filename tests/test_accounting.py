@@ -0,0 +1,59 @@
+# test_accounting.py
+
+import unittest
+from types import SimpleNamespace
+from accounting import TokenLedger
+from fake_api import FakeScript
+from benchmark import run_benchmark
+
+class TestAccounting(unittest.TestCase):
+    def record(self, ledger, key, role, prompt_tokens, completion_tokens, agent="Agent", agent_key="1"):
+        task = SimpleNamespace(owner_key=key, role=role)
+        agent = SimpleNamespace(name=agent, key=agent_key, model="gpt-4o-mini")
+        run = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+        return ledger.record(task, agent, run)
+
+    def test_usage_rolls_up(self):
+        ledger = TokenLedger(max_tokens=1000)
+        self.record(ledger, "0", "plan", 100, 50)
+        self.record(ledger, "0/1", "do", 200, 100, agent="Writer", agent_key="0/2")
+        usage = self.record(ledger, "0/1/1", "do", 100, 100, agent="Writer", agent_key="0/2")
+        self.record(ledger, "0/2", "do", 50, 50, agent="Writer", agent_key="0/3")
+        self.assertIsNone(ledger.record(SimpleNamespace(owner_key="0", role="do"), SimpleNamespace(name="Agent", key="1", model="gpt-4o-mini"), SimpleNamespace(usage=None)))
+
+        self.assertAlmostEqual(usage["cost"], (100 * 0.15 + 100 * 0.6) / 1_000_000)
+        self.assertEqual(ledger.get_stats()["total_tokens"], 750)
+        self.assertEqual(ledger.get_subtree("0/1").total_tokens, 500)
+        self.assertEqual(ledger.get_subtree("0").runs, 4)
+        # Agents sharing a name are kept apart
+        self.assertEqual(ledger.by_agent["0/2"].runs, 2)
+        self.assertEqual(ledger.by_agent["0/3"].runs, 1)
+        self.assertFalse(ledger.is_nearly_exhausted())
+
+        self.record(ledger, "0/2", "summary", 100, 100)
+        self.assertTrue(ledger.is_nearly_exhausted())
+        self.assertFalse(ledger.is_exhausted())
+        report = ledger.report()
+        self.assertIn("By subtree:", report)
+        self.assertIn("0/1: 500 tokens", report)
+        self.assertIn("Writer (0/3): 100 tokens", report)
+
+    def test_low_budget_skips_planning(self):
+        ledger = TokenLedger(max_tokens=1_000_000, reserve=1.0)
+        result = run_benchmark(FakeScript(fanout=2, depth=1), ledger=ledger)
+
+        # The objective is done directly, with nothing to summarize
+        self.assertEqual(result["runs"], 1)
+        self.assertEqual(ledger.get_stats()["skipped_plans"], 1)
+
+    def test_spent_budget_stops_new_runs(self):
+        unlimited = run_benchmark(FakeScript(fanout=3, depth=2), ledger=TokenLedger())
+        ledger = TokenLedger(max_tokens=unlimited["tokens"]["total_tokens"] // 4)
+        limited = run_benchmark(FakeScript(fanout=3, depth=2), ledger=ledger)
+
+        self.assertLess(limited["runs"], unlimited["runs"])
+        self.assertGreater(ledger.get_stats()["skipped_runs"], 0)
+        self.assertGreater(limited["outcome_length"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
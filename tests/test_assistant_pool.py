@@ -0,0 +1,45 @@
+# test_assistant_pool.py
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+from assistant_pool import AssistantPool
+
+class TestAssistantPool(unittest.TestCase):
+    def setUp(self):
+        self.mock_client = Mock()
+        self.mock_client.beta.assistants.create.return_value = Mock(id="asst_1")
+        self.index_path = os.path.join(tempfile.mkdtemp(), "assistants.json")
+        self.config = dict(name="Agent", instructions="Help", tools=[{"type": "retrieval"}], model="test_model", file_ids=[])
+
+    def test_reuses_matching_assistant(self):
+        pool = AssistantPool(self.mock_client, self.index_path)
+
+        first = pool.get_or_create(**self.config)
+        second = pool.get_or_create(**dict(self.config, name="Other Agent"))
+
+        self.assertIs(first, second)
+        self.mock_client.beta.assistants.create.assert_called_once()
+        self.assertEqual(pool.get_stats()["reused"], 1)
+
+    def test_reuses_persisted_assistant(self):
+        AssistantPool(self.mock_client, self.index_path).get_or_create(**self.config)
+        self.mock_client.beta.assistants.retrieve.return_value = Mock(id="asst_1")
+
+        assistant = AssistantPool(self.mock_client, self.index_path).get_or_create(**self.config)
+
+        self.assertEqual(assistant.id, "asst_1")
+        self.mock_client.beta.assistants.retrieve.assert_called_once_with("asst_1")
+        self.mock_client.beta.assistants.create.assert_called_once()
+
+    def test_update_rekeys_assistant(self):
+        pool = AssistantPool(self.mock_client, self.index_path)
+        assistant = pool.get_or_create(**self.config)
+        self.mock_client.beta.assistants.update.return_value = assistant
+
+        pool.update(assistant, **dict(self.config, file_ids=["file_1"]))
+        pool.get_or_create(**dict(self.config, file_ids=["file_1"]))
+
+        self.mock_client.beta.assistants.create.assert_called_once()
+        self.assertEqual(list(pool.index.values()), ["asst_1"])
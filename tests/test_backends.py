@@ -0,0 +1,46 @@
+# test_backends.py
+
+import unittest
+from types import SimpleNamespace
+from backends import ChatRun, select_backend
+from fake_api import FakeScript
+from benchmark import run_benchmark
+import functions
+
+class TestBackends(unittest.TestCase):
+    def make_agent(self, backend, tools, file_ids=()):
+        return SimpleNamespace(backend=backend, batch_runner=None, file_ids=list(file_ids), build_tools=lambda: [{"type": tool} for tool in tools])
+
+    def test_auto_picks_chat_without_hosted_tools(self):
+        task = SimpleNamespace(uses_hosted_tools=True)
+        self.assertEqual(select_backend(self.make_agent("auto", ["retrieval"]), task).name, "chat")
+        self.assertEqual(select_backend(self.make_agent("auto", ["retrieval"], ["file-1"]), task).name, "assistants")
+        self.assertEqual(select_backend(self.make_agent("auto", ["code_interpreter"]), task).name, "assistants")
+        self.assertEqual(select_backend(self.make_agent("auto", ["code_interpreter"]), SimpleNamespace(uses_hosted_tools=False)).name, "chat")
+        self.assertEqual(select_backend(self.make_agent("assistants", []), task).name, "assistants")
+
+    def test_chat_run_carries_tool_calls(self):
+        tool_call = SimpleNamespace(id="call_1", type="function", function=SimpleNamespace(name="decomposability", arguments="{}"))
+        message = SimpleNamespace(role="assistant", content=None, tool_calls=[tool_call])
+        completion = SimpleNamespace(id="chatcmpl_1", created=0, usage=None, choices=[SimpleNamespace(message=message, finish_reason="tool_calls")])
+
+        run = ChatRun(completion)
+        self.assertEqual(run.status, "requires_action")
+        self.assertEqual(functions.get_tool_calls(run), [tool_call])
+
+    def test_chat_backend_skips_threads(self):
+        for engine in ("threads", "async"):
+            assistants = run_benchmark(FakeScript(fanout=2, depth=1), engine=engine)
+            auto = run_benchmark(FakeScript(fanout=2, depth=1), engine=engine, backend="auto")
+            chat = run_benchmark(FakeScript(fanout=2, depth=1), engine=engine, backend="chat")
+
+            # Only the leaves' do runs need the workers' code interpreter
+            self.assertEqual(auto["calls"]["runs.create"], 2)
+            self.assertNotIn("threads.create", chat["calls"])
+            self.assertEqual(chat["runs"], assistants["runs"])
+            self.assertLess(chat["api_calls"], auto["api_calls"])
+            self.assertLess(auto["api_calls"], assistants["api_calls"])
+            self.assertEqual(chat["outcome_length"], assistants["outcome_length"])
+
+if __name__ == '__main__':
+    unittest.main()
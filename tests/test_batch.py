@@ -0,0 +1,78 @@
+# test_batch.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from batch import BatchRunner, BatchError
+from accounting import TokenLedger
+from fake_api import FakeOpenAI, FakeScript
+from benchmark import run_benchmark
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_request(self, text):
+        return {"model": "fake-model", "messages": [{"role": "user", "content": text}]}
+
+    def test_requests_are_batched_and_mapped_back(self):
+        client = FakeOpenAI(FakeScript())
+        runner = BatchRunner(client, self.directory, max_batch_size=2, linger=0.01, poll_interval=0.01)
+        futures = [runner.submit(self.make_request("x" * size), "0/1:do") for size in (40, 80, 120)]
+        completions = [future.result(timeout=5) for future in futures]
+        runner.close()
+
+        # Each completion answers its own request
+        self.assertEqual([completion.choices[0].message.content.split(" (")[1][:2] for completion in completions], ["40", "80", "12"])
+        self.assertEqual(runner.get_stats(), {"batches": 2, "requests": 3, "failed_requests": 0})
+        self.assertEqual(client.calls["batches.create"], 2)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.count(".") == 1]), 2)
+
+    def test_failed_submission_fails_requests(self):
+        client = Mock()
+        client.files.create.side_effect = RuntimeError("upload failed")
+        runner = BatchRunner(client, self.directory, linger=0.01)
+        future = runner.submit(self.make_request("hello"))
+
+        self.assertRaises(BatchError, future.result, 5)
+        runner.close()
+        self.assertEqual(runner.get_stats()["failed_requests"], 1)
+
+    def test_malformed_results_fail_their_requests(self):
+        client = FakeOpenAI(FakeScript())
+        content = client.files.content
+
+        # Truncate the first result line and add lines without a custom ID
+        def corrupt(file_id):
+            lines = content(file_id).text.splitlines()
+            text = "\n".join([lines[0][:20], "[]", '{"response": {}}'] + lines[1:])
+            return SimpleNamespace(text=text)
+
+        client.files.content = corrupt
+        runner = BatchRunner(client, self.directory, linger=0.01, poll_interval=0.01)
+        futures = [runner.submit(self.make_request("hello"), "0/1:do") for _ in range(2)]
+
+        self.assertRaises(BatchError, futures[0].result, 5)
+        self.assertEqual(futures[1].result(timeout=5).choices[0].finish_reason, "stop")
+        runner.close()
+        self.assertEqual(runner.get_stats()["failed_requests"], 1)
+
+    def test_leaves_share_a_batch(self):
+        for engine in ("threads", "async"):
+            interactive = run_benchmark(FakeScript(fanout=3, depth=2), engine=engine)
+            ledger = TokenLedger(prices={"fake-model": (1.0, 1.0)})
+            batched = run_benchmark(FakeScript(fanout=3, depth=2), engine=engine, batch=True, ledger=ledger)
+
+            self.assertEqual(batched["batch"], {"batches": 1, "requests": 9, "failed_requests": 0})
+            self.assertEqual(batched["runs"], interactive["runs"])
+            self.assertEqual(batched["outcome_length"], interactive["outcome_length"])
+            self.assertLess(ledger.total.cost, ledger.total.total_tokens / 1_000_000)
+
+if __name__ == '__main__':
+    unittest.main()
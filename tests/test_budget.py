@@ -0,0 +1,56 @@
+# test_budget.py
+
+import time
+import threading
+import unittest
+from budget import ExecutionBudget, parse_depth_quotas
+
+class TestBudget(unittest.TestCase):
+    def test_parse_depth_quotas(self):
+        self.assertEqual(parse_depth_quotas("0:2, 1:4"), {0: 2, 1: 4})
+        self.assertEqual(parse_depth_quotas(""), {})
+
+    def test_nested_waits_do_not_deadlock(self):
+        budget = ExecutionBudget(max_runs=1, max_threads=1)
+
+        def work(depth):
+            if depth == 0:
+                return 1
+            futures = [budget.submit(work, depth - 1) for _ in range(3)]
+            total = 0
+            pending = set(futures)
+            while pending:
+                done = budget.wait_any(list(pending))
+                pending -= done
+            for future in futures:
+                total += future.result()
+            return total
+
+        future = budget.submit(work, 3)
+        self.assertEqual(future.result(timeout=5), 27)
+        budget.shutdown()
+
+    def test_run_slots_bound_concurrency(self):
+        budget = ExecutionBudget(max_runs=2, max_threads=6, depth_quotas={1: 1})
+        active = []
+        peak = {0: 0, 1: 0}
+        lock = threading.Lock()
+
+        def run(depth):
+            with budget.run_slot(depth):
+                with lock:
+                    active.append(depth)
+                    peak[depth] = max(peak[depth], active.count(depth))
+                time.sleep(0.02)
+                with lock:
+                    active.remove(depth)
+
+        futures = [budget.submit(run, depth) for depth in (0, 0, 0, 1, 1, 1)]
+        for future in futures:
+            future.result(timeout=5)
+
+        stats = budget.get_stats()
+        self.assertEqual(stats["peak_runs"], 2)
+        self.assertEqual(peak[1], 1)
+        self.assertEqual(stats["run_count"], 6)
+        budget.shutdown()
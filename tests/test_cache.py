@@ -0,0 +1,47 @@
+# test_cache.py
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+import functions
+from cache import ResponseCache, CachedRun, build_entry
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "responses.sqlite")
+
+    def test_disk_entries_survive_restart(self):
+        cache = ResponseCache(self.path)
+        key = cache.get_key("model", "instructions", [], "prompt")
+        cache.set(key, {"status": "completed", "outcome": "done", "tool_calls": None})
+        cache.close()
+
+        cache = ResponseCache(self.path)
+        self.assertEqual(cache.get(key)["outcome"], "done")
+        self.assertEqual(cache.get_stats()["disk_hits"], 1)
+
+    def test_lru_and_ttl_eviction(self):
+        cache = ResponseCache(max_entries=2, ttl=60)
+        for key in ("a", "b", "c"):
+            cache.set(key, {"outcome": key})
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), {"outcome": "c"})
+
+        with patch('cache.time.time', return_value=10 ** 12):
+            self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.get_stats()["misses"], 2)
+
+    def test_cached_run_restores_tool_calls(self):
+        tool_call = Mock(id="call_1")
+        tool_call.function.name = "decomposability"
+        tool_call.function.arguments = '{"is_decomposable": false}'
+        run = Mock(status="requires_action")
+        run.required_action.submit_tool_outputs.tool_calls = [tool_call]
+
+        cached_run = CachedRun(build_entry(run, "outcome"))
+        tool_calls = functions.get_tool_calls(cached_run)
+
+        self.assertEqual(tool_calls[0].function.name, "decomposability")
+        self.assertEqual(tool_calls[0].function.arguments, '{"is_decomposable": false}')
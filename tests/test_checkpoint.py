@@ -0,0 +1,68 @@
+# test_checkpoint.py
+
+import os
+import tempfile
+import unittest
+from checkpoint import Checkpoint
+from task import Task
+from planner import Planner
+from fake_api import FakeScript, FakeOpenAI
+from benchmark import run_benchmark
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite")
+
+    def test_records_survive_reopening(self):
+        checkpoint = Checkpoint(self.path, "run-1")
+        checkpoint.save_objective("Title", "Description")
+        checkpoint.start_run("0:do", "thread_1", "run_1", "msg_1")
+        checkpoint.close()
+
+        reopened = Checkpoint(self.path, "run-1")
+        self.assertEqual(reopened.get_objective(), ("Title", "Description"))
+        self.assertEqual(reopened.get_run("0:do")["run_id"], "run_1")
+        reopened.finish_run("0:do")
+        self.assertIsNone(reopened.get_run("0:do"))
+        self.assertIsNone(Checkpoint(self.path, "run-2").get_objective())
+
+    def test_resume_skips_finished_work(self):
+        checkpoint = Checkpoint(self.path, "run-1")
+        first = run_benchmark(FakeScript(fanout=2, depth=1), planner=Planner(single_round_trip=False), checkpoint=checkpoint)
+        self.assertGreater(first["runs"], 3)
+
+        # Forget the outcomes of the objective and its first subtask, as if
+        # the swarm had been interrupted before they finished
+        checkpoint.delete("outcome", "0")
+        checkpoint.delete("outcome", "0/1")
+        checkpoint.close()
+
+        checkpoint = Checkpoint(self.path, "run-1")
+        resumed = run_benchmark(FakeScript(fanout=2, depth=1), planner=Planner(single_round_trip=False), checkpoint=checkpoint)
+
+        # Only the first subtask and the objective's summary are run again
+        self.assertEqual(resumed["runs"], 2)
+        self.assertEqual(checkpoint.get_stats()["restored_outcomes"], 1)
+        self.assertEqual(checkpoint.get_stats()["restored_plans"], 2)
+        self.assertGreater(resumed["outcome_length"], 0)
+
+    def test_reattach_to_run_in_flight(self):
+        client = FakeOpenAI(FakeScript())
+        assistant = client.beta.assistants.create(name="Agent", instructions="Help", tools=[], model="fake-model")
+        thread = client.beta.threads.create()
+        client.beta.threads.messages.create(thread_id=thread.id, role="user", content="Do the task")
+        run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant.id)
+
+        checkpoint = Checkpoint(self.path, "run-1")
+        task = Task(client, "test_log.txt", 0, "Task", "Do the task", 0, "http://test.com")
+        checkpoint.start_run(task.checkpoint_key, thread.id, run.id, None)
+        task.checkpoint = checkpoint
+
+        attached_thread, attached_run = task.reattach_run()
+        self.assertEqual(attached_thread.id, thread.id)
+        self.assertEqual(attached_run.status, "completed")
+        self.assertEqual(client.calls["runs.create"], 1)
+        self.assertEqual(checkpoint.get_stats()["reattached_runs"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# test_deadlines.py
+
+import asyncio
+import threading
+import unittest
+from task import Task
+from fake_api import FakeOpenAI, AsyncFakeOpenAI, FakeScript, constant
+from benchmark import run_benchmark
+
+class TestDeadlines(unittest.TestCase):
+    def make_task(self, client, id=1, parent_task=None):
+        return Task(client, "logs", id, "Slow task", "Take your time", 1, "http://localhost/fake", parent_task=parent_task)
+
+    def test_run_is_cancelled_at_deadline(self):
+        client = FakeOpenAI(FakeScript(run_latency=constant(60)))
+        assistant = client.beta.assistants.create(name="Worker", tools=[])
+        task = self.make_task(client)
+        task.set_timeout(0.2)
+        thread = client.beta.threads.create()
+        run = task.submit_message(assistant.id, thread, "Take your time")
+        task.record_run_started(thread, run)
+
+        run = task.wait_on_run(run, thread, 1.0)
+
+        self.assertEqual(run.status, "cancelled")
+        self.assertEqual(client.calls["runs.cancel"], 1)
+        self.assertIsNone(task.watchdog)
+        self.assertEqual(task.get_stop_reason(), "past its deadline")
+
+    def test_async_run_is_cancelled_on_the_event_loop(self):
+        client = FakeOpenAI(FakeScript(run_latency=constant(60)))
+        async_client = AsyncFakeOpenAI(state=client.state)
+        assistant = client.beta.assistants.create(name="Worker", tools=[])
+        task = self.make_task(client)
+        task.async_client = async_client
+        task.set_timeout(0.2)
+        threads_before = threading.active_count()
+
+        async def run_task():
+            thread = await async_client.beta.threads.create()
+            run = await task.async_submit_message(assistant.id, thread, "Take your time")
+            task.record_run_started(thread, run)
+            self.assertIsInstance(task.watchdog, asyncio.TimerHandle)
+            return await task.async_wait_on_run(run, thread, 1.0)
+
+        run = asyncio.run(run_task())
+
+        self.assertEqual(run.status, "cancelled")
+        self.assertEqual(client.calls["runs.cancel"], 1)
+        self.assertIsNone(task.watchdog)
+        self.assertLessEqual(threading.active_count(), threads_before)
+
+    def test_sync_runs_share_one_watchdog_thread(self):
+        client = FakeOpenAI(FakeScript(run_latency=constant(60)))
+        assistant = client.beta.assistants.create(name="Worker", tools=[])
+        tasks = [self.make_task(client, id) for id in range(1, 6)]
+        for task in tasks:
+            task.set_timeout(60)
+            thread = client.beta.threads.create()
+            task.record_run_started(thread, task.submit_message(assistant.id, thread, "Take your time"))
+        threads_after_first = threading.active_count()
+
+        task = self.make_task(client, 6)
+        task.set_timeout(60)
+        thread = client.beta.threads.create()
+        task.record_run_started(thread, task.submit_message(assistant.id, thread, "Take your time"))
+
+        self.assertEqual(threading.active_count(), threads_after_first)
+        for task in tasks + [task]:
+            task.untrack_remote_run()
+        self.assertEqual(client.calls["runs.cancel"], 0)
+
+    def test_cancellation_reaches_subtasks_and_helpers(self):
+        client = FakeOpenAI(FakeScript())
+        parent_task = self.make_task(client)
+        parent_task.set_timeout(60)
+        subtask = self.make_task(client, 2, parent_task)
+        helper = self.make_task(client, 0)
+        helper.owner = subtask
+
+        self.assertEqual(subtask.deadline, parent_task.deadline)
+        self.assertFalse(helper.should_stop())
+        parent_task.cancel()
+        self.assertTrue(subtask.should_stop())
+        self.assertTrue(helper.should_stop())
+
+    def test_objective_timeout_skips_remaining_work(self):
+        for engine in ("threads", "async"):
+            result = run_benchmark(FakeScript(fanout=2, depth=2, run_latency=constant(0.3)), engine=engine, timeout=0.45)
+
+            self.assertLess(result["wall_time"], 1.5)
+            self.assertGreaterEqual(result["calls"]["runs.cancel"], 1)
+            self.assertGreater(result["incomplete_tasks"], 0)
+
+    def test_failed_runs_leave_tasks_incomplete(self):
+        result = run_benchmark(FakeScript(fanout=2, depth=1, failure_rate=1.0))
+        self.assertEqual(result["outcome_length"], 0)
+        self.assertEqual(result["journal_records"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
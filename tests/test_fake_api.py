@@ -0,0 +1,29 @@
+# test_fake_api.py
+
+import unittest
+from fake_api import FakeOpenAI, FakeScript, constant
+from benchmark import run_benchmark
+
+class TestFakeApi(unittest.TestCase):
+    def test_run_lifecycle(self):
+        client = FakeOpenAI(FakeScript(run_latency=constant(0.0)))
+        assistant = client.beta.assistants.create(name="Agent", instructions="Help", tools=[], model="fake")
+        thread = client.beta.threads.create()
+        client.beta.threads.messages.create(thread_id=thread.id, role="user", content="Say hello")
+
+        run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant.id)
+        run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+        messages = client.beta.threads.messages.list(thread_id=thread.id, order="desc", limit=1)
+
+        self.assertEqual(run.status, "completed")
+        self.assertEqual(messages.data[0].role, "assistant")
+        self.assertEqual(client.calls["runs.create"], 1)
+
+    def test_benchmark_runs_whole_tree(self):
+        for engine in ("threads", "async"):
+            result = run_benchmark(FakeScript(fanout=2, depth=1, chain_dependencies=True), engine=engine)
+
+            # Two decomposability runs at the top, one per leaf, plus the objective's summary
+            self.assertEqual(result["calls"]["runs.submit_tool_outputs"], 3)
+            self.assertEqual(result["runs"], 6)
+            self.assertGreater(result["outcome_length"], 0)
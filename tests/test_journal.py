@@ -0,0 +1,64 @@
+# test_journal.py
+
+import os
+import gzip
+import json
+import tempfile
+import unittest
+from journal import RunJournal, read_journal, read_record, list_runs
+from fake_api import FakeScript
+from planner import Planner
+from benchmark import run_benchmark
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_records_are_streamed_and_indexed(self):
+        journal = RunJournal(self.directory, "run-1")
+        for key in ("0/1", "0/2", "0"):
+            journal.record({"key": key, "title": f"Task {key}", "outcome": f"Outcome of {key}"})
+        journal.close()
+
+        records = list(read_journal(self.directory, "run-1"))
+        self.assertEqual([record["key"] for record in records], ["0/1", "0/2", "0"])
+        self.assertEqual(records[0]["run_id"], "run-1")
+        self.assertEqual(read_record(self.directory, "run-1", "0/2")["outcome"], "Outcome of 0/2")
+        self.assertIsNone(read_record(self.directory, "run-1", "0/3"))
+
+        # The journal is a plain gzip file of JSON lines
+        with gzip.open(journal.path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 3)
+
+    def test_runs_are_kept_apart(self):
+        first = RunJournal(self.directory, "run-1")
+        first.record({"key": "0", "outcome": "first"})
+        first.close()
+        second = RunJournal(self.directory, "run-2")
+        second.record({"key": "0", "outcome": "second"})
+        second.flush()
+
+        self.assertEqual(list_runs(self.directory), ["run-1", "run-2"])
+        self.assertEqual([record["outcome"] for record in read_journal(self.directory, "run-2")], ["second"])
+        second.close()
+
+    def test_partial_summaries_are_not_task_outputs(self):
+        journal = RunJournal(self.directory, "run-1")
+        journal.record({"key": "0", "role": "summary", "part": None, "outcome": "summary"})
+        journal.record({"key": "0", "role": "summary", "part": "1.1", "outcome": "partial"})
+        journal.close()
+
+        self.assertEqual(read_record(self.directory, "run-1", "0")["outcome"], "summary")
+
+    def test_swarm_records_are_keyed_by_task(self):
+        run_benchmark(FakeScript(fanout=2, depth=1, seed=1), planner=Planner(False), work_path=self.directory)
+        log_file_path = os.path.join(self.directory, "logs")
+        run_id = list_runs(log_file_path)[-1]
+        records = list(read_journal(log_file_path, run_id))
+
+        # Decomposability runs are not outputs; the objective's is its summary
+        self.assertEqual(sorted((record["key"], record["role"]) for record in records), [("0", "summary"), ("0/1", "do"), ("0/2", "do")])
+        self.assertEqual(read_record(log_file_path, run_id, "0")["title"], "Summarize Benchmark Objective")
+
+if __name__ == '__main__':
+    unittest.main()
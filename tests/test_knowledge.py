@@ -0,0 +1,53 @@
+# test_knowledge.py
+
+import os
+import tempfile
+import unittest
+from fake_api import FakeOpenAI
+from knowledge import KnowledgeBase
+
+class TestKnowledge(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.client = FakeOpenAI()
+
+    def write(self, filename, content):
+        with open(os.path.join(self.path, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_sync_uploads_only_the_delta(self):
+        self.write("a.txt", "alpha")
+        self.write("b.txt", "beta")
+        self.write(".downloads.json", "{}")
+        file_ids = KnowledgeBase(self.client, self.path).sync()
+        self.assertEqual(len(file_ids), 2)
+        self.assertEqual(self.client.calls["files.create"], 2)
+
+        # A fresh instance reads the manifest and uploads nothing new
+        knowledge_base = KnowledgeBase(self.client, self.path)
+        self.assertEqual(knowledge_base.sync(), file_ids)
+        self.assertEqual(self.client.calls["files.create"], 2)
+
+        # Change one file, remove the other and add a new one
+        self.write("a.txt", "alpha, revised")
+        os.remove(os.path.join(self.path, "b.txt"))
+        self.write("c.txt", "gamma")
+        new_file_ids = knowledge_base.sync()
+
+        self.assertEqual(len(new_file_ids), 2)
+        self.assertEqual(self.client.calls["files.create"], 4)
+        self.assertEqual(self.client.calls["files.delete"], 2)
+        self.assertFalse(set(file_ids) & set(new_file_ids))
+        self.assertEqual(knowledge_base.get_stats(), {"uploaded": 2, "deleted": 2, "unchanged": 2})
+
+    def test_identical_files_share_an_upload(self):
+        self.write("a.txt", "same")
+        self.write("b.txt", "same")
+
+        file_ids = KnowledgeBase(self.client, self.path).sync()
+
+        self.assertEqual(len(file_ids), 1)
+        self.assertEqual(self.client.calls["files.create"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
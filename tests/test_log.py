@@ -0,0 +1,54 @@
+# test_log.py
+
+import io
+import os
+import json
+import tempfile
+import threading
+import unittest
+from log import get_logger, log_context, setup_logging
+
+class TestLog(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.json_path = os.path.join(tempfile.mkdtemp(), "swarm.jsonl")
+        self.pipeline = setup_logging("INFO", self.json_path, progress_interval=60, stream=self.stream)
+        self.logger = get_logger("test")
+
+    def tearDown(self):
+        self.pipeline.stop()
+
+    def read_json(self):
+        self.pipeline.stop()
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_carry_task_context(self):
+        def work():
+            with log_context(task="0/1", agent="0/1"):
+                self.logger.info("Working on %s", "part 1")
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        self.logger.debug("Hidden below the level")
+
+        entries = self.read_json()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["message"], "Working on part 1")
+        self.assertEqual(entries[0]["task"], "0/1")
+        self.assertIn("[0/1] Working on part 1", self.stream.getvalue())
+
+    def test_progress_is_rate_limited_per_task(self):
+        for task in ("0/1", "0/2"):
+            with log_context(task=task):
+                for poll in range(5):
+                    self.logger.info("Poll %d", poll, extra={"progress": True})
+        self.logger.warning("Not progress")
+
+        entries = self.read_json()
+        self.assertEqual([(entry["task"], entry["message"]) for entry in entries],
+                         [("0/1", "Poll 0"), ("0/2", "Poll 0"), ("-", "Not progress")])
+        self.assertEqual(self.pipeline.get_stats()["suppressed_progress"], 8)
+
+if __name__ == '__main__':
+    unittest.main()
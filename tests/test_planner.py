@@ -0,0 +1,55 @@
+# test_planner.py
+
+import unittest
+from unittest.mock import Mock
+from planner import Planner
+from fake_api import FakeScript, FakeState
+from benchmark import run_benchmark
+
+class TestPlanner(unittest.TestCase):
+    def make_task(self, title, description, depth=0):
+        return Mock(title=title, description=description, depth=depth)
+
+    def test_preclassifier(self):
+        planner = Planner(preclassify=True, max_depth=3)
+
+        self.assertTrue(planner.is_atomic(self.make_task("Translate", "Translate 'hello' into French")))
+        self.assertFalse(planner.is_atomic(self.make_task("App", "Design and build a todo application")))
+        self.assertFalse(planner.is_atomic(self.make_task("Chores", "1. Wash\n2. Dry")))
+        self.assertFalse(planner.is_atomic(self.make_task("Essay", "word " * 30)))
+        self.assertTrue(planner.is_atomic(self.make_task("App", "Design and build a todo application", depth=3)))
+
+        # Without pre-classification only tasks at the maximum depth skip planning
+        self.assertFalse(Planner().is_atomic(self.make_task("Translate", "Say hi")))
+        self.assertFalse(Planner(max_depth=2).is_atomic(self.make_task("App", "Design and build a todo application", depth=1)))
+        self.assertTrue(Planner(max_depth=2).is_atomic(self.make_task("App", "Design and build a todo application", depth=2)))
+
+    def test_single_round_trip_saves_runs(self):
+        script = FakeScript(fanout=2, depth=1)
+        separate = run_benchmark(script, planner=Planner(single_round_trip=False))
+        single = run_benchmark(FakeScript(fanout=2, depth=1), planner=Planner())
+
+        # The leaves answer in their planning run instead of a second do run
+        self.assertEqual(separate["runs"], 6)
+        self.assertEqual(single["runs"], 4)
+        self.assertGreater(single["outcome_length"], 0)
+
+    def test_planning_prompt_holds_upstream_outcomes(self):
+        state = FakeState(FakeScript(fanout=2, depth=1, chain_dependencies=True))
+        run_benchmark(None, planner=Planner(), state=state)
+
+        # Subtask 2 depends on subtask 1 and is answered by its planning run
+        prompts = [message.content[0].text.value for messages in state.threads.values() for message in messages if message.role == "user"]
+        planning_prompts = [prompt for prompt in prompts if "Part 2 at depth 1" in prompt and "decompose_and_assign" in prompt]
+        self.assertEqual(len(planning_prompts), 1)
+        self.assertIn("Outcome of task #1:", planning_prompts[0])
+
+    def test_atomic_objective_skips_planning(self):
+        result = run_benchmark(FakeScript(fanout=2, depth=1), planner=Planner(preclassify=True))
+
+        # One do run, with nothing to summarize
+        self.assertEqual(result["runs"], 1)
+        self.assertNotIn("runs.submit_tool_outputs", result["calls"])
+
+if __name__ == '__main__':
+    unittest.main()
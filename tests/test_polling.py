@@ -0,0 +1,21 @@
+# test_polling.py
+
+import unittest
+from unittest.mock import Mock
+import polling
+
+class TestPolling(unittest.TestCase):
+    def test_backoff_grows_to_cap(self):
+        backoff = polling.Backoff(initial=0.1, factor=2, maximum=0.5, jitter=0)
+        intervals = [backoff.next() for _ in range(5)]
+
+        self.assertEqual(intervals, [0.1, 0.2, 0.4, 0.5, 0.5])
+
+    def test_completion_lag(self):
+        run = Mock(spec=["completed_at"])
+        run.completed_at = 100
+
+        self.assertEqual(polling.get_completion_lag(run, detected_at=102.5), 2.5)
+        self.assertIsNone(polling.get_completion_lag(Mock(spec=[])))
+
+    # Add more tests for other polling functions...
@@ -0,0 +1,101 @@
+# test_registry.py
+
+import asyncio
+import time
+import unittest
+import threading
+from unittest.mock import Mock
+from registry import Registry, make_key, get_namespace
+from task import Task
+from fake_api import FakeScript
+from benchmark import run_benchmark
+
+class TestRegistry(unittest.TestCase):
+    def make_task(self, id, parent_task=None, namespace=""):
+        return Task(Mock(), "test_log.txt", id, f"Task {id}", "Test Description", 1, "http://test.com", parent_task=parent_task, namespace=namespace)
+
+    def test_hierarchical_keys(self):
+        top = self.make_task(0)
+        child = self.make_task(1, parent_task=top)
+        grandchild = self.make_task(1, parent_task=child)
+
+        self.assertEqual(child.key, "0/1")
+        self.assertEqual(grandchild.key, "0/1/1")
+        self.assertEqual(grandchild.agent_key, "0/1/1")
+        self.assertEqual(get_namespace(grandchild.key), "0/1")
+        self.assertEqual(make_key("", 3), "3")
+
+    def test_tree_queries(self):
+        registry = Registry()
+        top = self.make_task(0)
+        first = self.make_task(1, parent_task=top)
+        second = self.make_task(2, parent_task=top)
+        nested = self.make_task(1, parent_task=first)
+        for task in (top, first, second, nested):
+            registry.add_task(task)
+        first.is_complete = True
+        nested.is_complete = True
+
+        self.assertEqual(registry.get_children("0"), [first, second])
+        self.assertEqual(registry.get_ancestors(nested.key), [first, top])
+        self.assertEqual(registry.get_completed_descendants("0"), [first, nested])
+        self.assertIs(registry.get_task("0/1/1"), nested)
+
+    def test_concurrent_registration_keeps_first(self):
+        registry = Registry()
+        agents = [Mock(key=f"0/{i % 10}") for i in range(200)]
+        threads = [threading.Thread(target=registry.add_agent, args=(agent,)) for agent in agents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(registry.get_stats()["agents"], 10)
+        self.assertEqual(registry.add_agent(Mock(key="0/1")).key, "0/1")
+
+    def test_deep_swarm_resolves_agents_per_subtree(self):
+        result = run_benchmark(FakeScript(fanout=2, depth=2))
+
+        # Agent IDs restart at 1 in every subtree but are registered apart
+        self.assertEqual(result["registry"], {"agents": 7, "tasks": 7})
+        self.assertEqual(result["runs"], 14)
+
+    def test_concurrent_delegations_create_one_agent(self):
+        registry = Registry()
+        created = []
+
+        def factory():
+            time.sleep(0.01)
+            agent = Mock(key="0/1")
+            created.append(agent)
+            return agent
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get_or_add_agent("0/1", factory))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(agent is created[0] for agent in results))
+
+    def test_concurrent_async_delegations_create_one_agent(self):
+        registry = Registry()
+        created = []
+
+        async def factory():
+            await asyncio.sleep(0.01)
+            agent = Mock(key="0/1")
+            created.append(agent)
+            return agent
+
+        async def delegate_all():
+            return await asyncio.gather(*(registry.async_get_or_add_agent("0/1", factory) for _ in range(8)))
+
+        results = asyncio.run(delegate_all())
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(agent is created[0] for agent in results))
+
+if __name__ == '__main__':
+    unittest.main()
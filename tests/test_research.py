@@ -1,7 +1,10 @@
 # test_research.py
 
+import os
+import tempfile
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
+from xml.etree import ElementTree
 from research import Research
 
 class TestResearch(unittest.TestCase):
@@ -23,4 +26,74 @@ class TestResearch(unittest.TestCase):
             "max_results": 5
         })
 
+    def make_response(self, status_code, chunks):
+        response = MagicMock(status_code=status_code)
+        response.__enter__.return_value = response
+        response.iter_content.return_value = chunks
+        return response
+
+    def make_tree(self, *titles):
+        entries = "".join(
+            f'<entry><title>{title}</title><link title="pdf" href="http://test.com/{index}.pdf"/></entry>'
+            for index, title in enumerate(titles)
+        )
+        return ElementTree.fromstring(f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>')
+
+    def test_download_streams_and_skips_present_files(self):
+        session = Mock()
+        session.get.side_effect = lambda url, **kwargs: self.make_response(200, [b"%PDF-", url.encode()])
+        research = Research(tempfile.mkdtemp(), "http://test.com", session=session)
+
+        results = research.download(self.make_tree("Paper One", "Paper Two"))
+
+        self.assertEqual([result["status"] for result in results], ["downloaded", "downloaded"])
+        with open(results[0]["path"], "rb") as f:
+            self.assertEqual(f.read(), b"%PDF-http://test.com/0.pdf")
+
+        # A second pass finds both files intact and makes no requests
+        session.get.reset_mock()
+        results = research.download(self.make_tree("Paper One", "Paper Two"))
+        self.assertEqual([result["status"] for result in results], ["skipped", "skipped"])
+        session.get.assert_not_called()
+
+    def test_download_resumes_partial_file(self):
+        knowledge_path = tempfile.mkdtemp()
+        with open(os.path.join(knowledge_path, "Paper.pdf.part"), "wb") as f:
+            f.write(b"%PDF-")
+        session = Mock()
+        session.get.return_value = self.make_response(206, [b"rest"])
+        research = Research(knowledge_path, "http://test.com", session=session)
+
+        result = research.download(self.make_tree("Paper"))[0]
+
+        self.assertEqual(result["status"], "resumed")
+        self.assertEqual(session.get.call_args.kwargs["headers"], {"Range": "bytes=5-"})
+        with open(result["path"], "rb") as f:
+            self.assertEqual(f.read(), b"%PDF-rest")
+        self.assertFalse(os.path.exists(result["path"] + ".part"))
+
+    @patch('research.requests.get')
+    def test_iter_search_pages_lazily_and_caches(self, mock_get):
+        def get_page(url, params):
+            entries = "".join(
+                f'<entry><id>{index}</id><title>Paper\n  {index}</title><link title="pdf" href="http://test.com/{index}.pdf"/></entry>'
+                for index in range(params["start"], min(params["start"] + params["max_results"], 5))
+            )
+            return Mock(status_code=200, content=f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'.encode())
+        mock_get.side_effect = get_page
+        research = Research(tempfile.mkdtemp(), "http://test.com", cache_path=tempfile.mkdtemp())
+
+        results = research.iter_search("test term", page_size=2)
+        self.assertEqual(next(results).title, "Paper 0")
+        self.assertEqual(mock_get.call_count, 1)
+
+        self.assertEqual([entry.id for entry in results], ["1", "2", "3", "4"])
+        self.assertEqual(mock_get.call_count, 3)
+
+        # Repeating the search is served from the page cache
+        entries = list(research.iter_search("test term", max_results=3, page_size=2))
+        self.assertEqual(entries[2].pdf_url, "http://test.com/2.pdf")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(research.search_cache.get_stats()["hits"], 2)
+
     # Add more tests for other Research methods...
\ No newline at end of file
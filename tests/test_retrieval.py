@@ -0,0 +1,87 @@
+# test_retrieval.py
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+from retrieval import RetrievalIndex, chunk_text
+from task import Task
+
+class TestRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.index_path = os.path.join(tempfile.mkdtemp(), "index")
+
+    def write(self, filename, content):
+        with open(os.path.join(self.data_path, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_chunk_text_overlaps(self):
+        chunks = chunk_text(" ".join(str(word) for word in range(10)), chunk_words=4, overlap=2)
+        self.assertEqual(chunks, ["0 1 2 3", "2 3 4 5", "4 5 6 7", "6 7 8 9"])
+
+    def test_search_ranks_relevant_chunks(self):
+        self.write("transformers.txt", "Attention mechanisms let transformers weigh tokens. Attention is all you need.")
+        self.write("gardening.txt", "Tomatoes need sun, water and well drained soil.")
+        self.write("notes.md", "Transformers replaced recurrent networks for translation.")
+
+        index = RetrievalIndex(self.index_path, max_workers=2)
+        self.assertEqual(index.update(self.data_path), 3)
+
+        results, milliseconds = index.time_search("transformer attention", k=2)
+        self.assertEqual(results[0][1], "transformers.txt")
+        self.assertEqual(len(results), 1)
+        self.assertLess(milliseconds, 100)
+        self.assertEqual(index.search("soil")[0][2], "Tomatoes need sun, water and well drained soil.")
+
+    def test_incremental_update_and_persistence(self):
+        self.write("a.txt", "alpha particles")
+        self.write("b.txt", "beta decay")
+        index = RetrievalIndex(self.index_path, max_segments=2)
+        index.update(self.data_path)
+        self.assertEqual(index.update(self.data_path), 0)
+
+        # Changed and removed files stop matching; only the change is indexed
+        self.write("a.txt", "gamma rays and more words")
+        os.remove(os.path.join(self.data_path, "b.txt"))
+        self.assertEqual(index.update(self.data_path), 1)
+        self.assertEqual(index.search("alpha"), [])
+        self.assertEqual(index.search("beta"), [])
+        self.assertEqual(index.search("gamma")[0][1], "a.txt")
+
+        # A third segment triggers compaction into one
+        self.write("c.txt", "delta wing")
+        index.update(self.data_path)
+        self.assertEqual(index.get_stats(), {"documents": 2, "chunks": 2, "segments": 1})
+        index.close()
+
+        reopened = RetrievalIndex(self.index_path)
+        self.assertEqual(reopened.search("delta")[0][1], "c.txt")
+        reopened.close()
+
+    def test_scores_ignore_superseded_chunks(self):
+        self.write("a.txt", "gamma rays")
+        self.write("b.txt", "gamma burst from a distant galaxy")
+        index = RetrievalIndex(self.index_path)
+        index.update(self.data_path)
+        self.write("a.txt", "gamma rays again")
+        index.update(self.data_path)
+
+        fresh = RetrievalIndex(os.path.join(tempfile.mkdtemp(), "index"))
+        fresh.update(self.data_path)
+        self.assertEqual([round(result[0], 6) for result in index.search("gamma")], [round(result[0], 6) for result in fresh.search("gamma")])
+        index.close()
+        fresh.close()
+
+    def test_task_prompt_includes_retrieved_chunks(self):
+        self.write("paper.txt", "Quantum error correction protects qubits.")
+        index = RetrievalIndex(self.index_path)
+        index.update(self.data_path)
+        task = Task(Mock(), "test_log.txt", 1, "Quantum computing", "Explain error correction", 1, "http://test.com")
+
+        prompt = task.build_prompt(task.retrieve_context(Mock(retrieval_index=index)))
+
+        self.assertIn("From paper.txt:\nQuantum error correction protects qubits.", prompt)
+
+if __name__ == '__main__':
+    unittest.main()
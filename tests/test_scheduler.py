@@ -0,0 +1,78 @@
+# test_scheduler.py
+
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import TaskGraph, DependencyError, parse_dependencies
+
+def spec(subtask_id, dependent_upon=None):
+    return {"subtask_id": subtask_id, "subtask_title": f"Task {subtask_id}", "dependent_upon": dependent_upon}
+
+class TestScheduler(unittest.TestCase):
+    def test_parse_dependencies(self):
+        self.assertEqual(parse_dependencies(None), [])
+        self.assertEqual(parse_dependencies("0"), [])
+        self.assertEqual(parse_dependencies(2), [2])
+        self.assertEqual(parse_dependencies("1, 3"), [1, 3])
+        self.assertEqual(parse_dependencies([1, 1, 2]), [1, 2])
+
+    def test_cycle_detected(self):
+        with self.assertRaises(DependencyError):
+            TaskGraph([spec(1, 2), spec(2, 1)])
+
+    def test_duplicate_ids_rejected(self):
+        with self.assertRaises(DependencyError):
+            TaskGraph([spec(1), spec(2), spec(1, 2)])
+
+    def test_dangling_dependency_ignored(self):
+        graph = TaskGraph([spec(1, 7), spec(2)])
+
+        self.assertEqual(graph.dangling, [(1, 7)])
+        self.assertEqual(graph.dependencies[1], [])
+
+    def test_critical_path_first(self):
+        graph = TaskGraph([spec(1), spec(2), spec(3, 2), spec(4, 3)])
+
+        self.assertEqual(graph.get_ready(set(), set())[0], 2)
+
+    def test_run_feeds_upstream_outcomes(self):
+        graph = TaskGraph([spec(1), spec(2, 1), spec(3, "1,2")])
+        received = {}
+
+        def execute(task_spec, upstream):
+            received[task_spec["subtask_id"]] = upstream
+            return f'outcome {task_spec["subtask_id"]}'
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            outcomes = graph.run(execute, executor)
+
+        self.assertEqual(len(outcomes), 3)
+        self.assertEqual(received[2], {1: "outcome 1"})
+        self.assertEqual(received[3], {1: "outcome 1", 2: "outcome 2"})
+
+    def test_failed_dependency_blocks_dependents(self):
+        graph = TaskGraph([spec(1), spec(2, 1), spec(3)])
+
+        def execute(task_spec, upstream):
+            if task_spec["subtask_id"] == 1:
+                raise RuntimeError("boom")
+            return "done"
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            outcomes = graph.run(execute, executor)
+
+        self.assertEqual(outcomes, {3: "done"})
+
+    def test_incomplete_dependency_blocks_dependents(self):
+        graph = TaskGraph([spec(1), spec(2, 1), spec(3)])
+        received = {}
+
+        async def execute(task_spec, upstream):
+            received[task_spec["subtask_id"]] = upstream
+            return None if task_spec["subtask_id"] == 1 else "done"
+
+        outcomes = asyncio.run(graph.async_run(execute))
+
+        self.assertEqual(outcomes, {3: "done"})
+        self.assertNotIn(2, received)
+
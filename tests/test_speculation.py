@@ -0,0 +1,54 @@
+# test_speculation.py
+
+import os
+import tempfile
+import unittest
+from task import Task
+from accounting import TokenLedger
+from speculation import Speculator
+from fake_api import FakeOpenAI, FakeScript, constant
+from benchmark import run_benchmark
+from journal import read_journal, list_runs
+
+class TestSpeculation(unittest.TestCase):
+    def test_cancel_stops_remote_run(self):
+        client = FakeOpenAI(FakeScript(run_latency=constant(60)))
+        assistant = client.beta.assistants.create(name="Worker", tools=[])
+        task = Task(client, "logs", 1, "Slow task", "Take your time", 1, "http://localhost/fake")
+        thread = client.beta.threads.create()
+        run = task.submit_message(assistant.id, thread, "Take your time")
+        task.record_run_started(thread, run)
+
+        task.cancel()
+        task.cancel()
+        run = task.wait_on_run(run, thread, 0.1)
+
+        self.assertEqual(run.status, "cancelled")
+        self.assertEqual(client.calls["runs.cancel"], 1)
+        self.assertIsNone(task.remote_run)
+
+    def test_atomic_tasks_keep_speculative_outcome(self):
+        for engine in ("threads", "async"):
+            plain = run_benchmark(FakeScript(fanout=2, depth=1), engine=engine)
+            speculator = Speculator()
+            speculative = run_benchmark(FakeScript(fanout=2, depth=1), engine=engine, ledger=TokenLedger(), speculator=speculator)
+
+            # The leaves are atomic; the objective is decomposed
+            stats = speculator.get_stats()
+            self.assertEqual((stats["launched"], stats["hits"], stats["misses"]), (3, 2, 1))
+            self.assertEqual(speculative["outcome_length"], plain["outcome_length"])
+            self.assertLessEqual(speculative["runs"], plain["runs"] + 1)
+
+    def test_discarded_speculation_is_not_recorded(self):
+        ledger = TokenLedger()
+        with tempfile.TemporaryDirectory() as work_path:
+            run_benchmark(FakeScript(fanout=2, depth=1), ledger=ledger, speculator=Speculator(), work_path=work_path)
+            log_file_path = os.path.join(work_path, "logs")
+            records = list(read_journal(log_file_path, list_runs(log_file_path)[-1]))
+
+        # Kept speculative runs are recorded as the leaves' own runs
+        self.assertEqual(sorted((record["key"], record["role"]) for record in records), [("0", "summary"), ("0/1", "do"), ("0/2", "do")])
+        self.assertIn("speculate", ledger.by_role)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# test_summarizer.py
+
+import unittest
+from summarizer import Section, Summarizer, build_sections_prompt, count_tokens
+from fake_api import FakeScript
+from benchmark import run_benchmark
+
+class TestSummarizer(unittest.TestCase):
+    def make_sections(self, *sizes):
+        return [Section(f"subtask #{index}", "x" * size * 4) for index, size in enumerate(sizes, 1)]
+
+    def test_groups_neighbours_within_limits(self):
+        summarizer = Summarizer(max_input_tokens=100, fan_in=3)
+        sections = self.make_sections(10, 10, 10, 10, 60, 20, 20)
+
+        groups = summarizer.group(sections)
+
+        # At most fan_in per group, and the oversized section is mapped alone
+        self.assertEqual([[section.title for section in group] for group in groups],
+                         [["subtask #1", "subtask #2", "subtask #3"], ["subtask #4"], ["subtask #5"], ["subtask #6", "subtask #7"]])
+        self.assertEqual([summarizer.needs_summary(group) for group in groups], [True, False, True, True])
+        self.assertFalse(summarizer.fits(sections))
+        self.assertTrue(summarizer.fits(sections[:3]))
+        self.assertIn("Outcome of subtask #1:\n", build_sections_prompt(sections))
+
+    def test_oversized_sections_are_split(self):
+        summarizer = Summarizer(max_input_tokens=100, fan_in=3)
+        words = " ".join(["word"] * 250)
+        sections = [Section("subtask #1", words), Section("subtask #2", "x" * 40)]
+
+        groups = summarizer.group(sections)
+
+        # Every map call fits in a prompt, and no text is lost
+        self.assertEqual([group[0].title for group in groups], ["subtask #1 (part 1 of 4)", "subtask #1 (part 2 of 4)", "subtask #1 (part 3 of 4)", "subtask #1 (part 4 of 4)"])
+        self.assertEqual(groups[-1][1].title, "subtask #2")
+        self.assertTrue(all(count_tokens(group) <= summarizer.max_input_tokens for group in groups))
+        self.assertEqual("".join(group[0].text for group in groups), words)
+
+    def test_many_outcomes_are_reduced_in_rounds(self):
+        script = FakeScript(fanout=4, depth=1, response_words=40)
+        single = run_benchmark(script)
+        reduced = run_benchmark(FakeScript(fanout=4, depth=1, response_words=40), summarizer=Summarizer(max_input_tokens=1000, fan_in=2))
+
+        # Two partial summaries of two outcomes each before the final one
+        self.assertEqual(reduced["runs"], single["runs"] + 2)
+        self.assertGreater(reduced["outcome_length"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 # test_task.py
 
 import unittest
-from unittest.mock import Mock, patch
+import asyncio
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
+from fake_api import FakeOpenAI, FakeScript, constant
 from task import Task
 
 class TestTask(unittest.TestCase):
@@ -34,4 +36,79 @@ class TestTask(unittest.TestCase):
         self.assertEqual(result.status, "completed")
         mock_sleep.assert_called()
 
+    @patch('task.asyncio.sleep', new_callable=AsyncMock)
+    def test_async_wait_on_run(self, mock_sleep):
+        mock_run = Mock()
+        mock_run.status = "queued"
+        mock_thread = Mock()
+
+        completed_run = Mock()
+        completed_run.status = "completed"
+        self.task.async_client = Mock()
+        self.task.async_client.beta.threads.runs.retrieve = AsyncMock(return_value=completed_run)
+
+        result = asyncio.run(self.task.async_wait_on_run(mock_run, mock_thread, 0.1))
+
+        self.assertEqual(result.status, "completed")
+        mock_sleep.assert_awaited()
+
+    def test_stream_run(self):
+        queued_run = Mock(status="queued")
+        completed_run = Mock(status="completed", completed_at=None)
+        events = [
+            Mock(event="thread.run.created", data=queued_run),
+            Mock(event="thread.run.completed", data=completed_run),
+        ]
+        stream = MagicMock()
+        stream.__enter__.return_value = stream
+        stream.__iter__.return_value = iter(events)
+        self.mock_client.beta.threads.runs.create.return_value = stream
+
+        result = self.task.stream_run(Mock(id="thread"), "assistant")
+
+        self.assertIs(result, completed_run)
+        self.assertEqual(self.task.poll_count, 0)
+        self.mock_client.beta.threads.runs.retrieve.assert_not_called()
+        stream.__exit__.assert_called_once()
+
+    def test_streams_are_closed(self):
+        client = FakeOpenAI(FakeScript(run_latency=constant(0.01)))
+        assistant = client.beta.assistants.create(name="Worker", tools=[])
+        task = Task(client, "logs", 1, "Quick task", "Be quick", 1, "http://localhost/fake")
+        thread = client.beta.threads.create()
+
+        run = task.stream_run(thread, assistant.id)
+
+        self.assertEqual(run.status, "completed")
+        self.assertTrue(task.stream)
+        self.assertEqual(client.state.open_streams, 0)
+
+    def test_get_outcome_reads_only_new_messages(self):
+        text_part = Mock(type="text")
+        text_part.text.value = "Part one"
+        image_part = Mock(type="image_file")
+        image_part.image_file.file_id = "file_1"
+        reply = Mock(id="msg_2", role="assistant", content=[text_part, image_part])
+        follow_up = Mock(id="msg_3", role="assistant", content=[text_part])
+        self.mock_client.beta.threads.messages.list.side_effect = [
+            Mock(data=[reply], has_more=True),
+            Mock(data=[follow_up], has_more=False),
+        ]
+        self.task.last_message_id = "msg_1"
+
+        outcome = self.task.get_outcome(Mock(id="thread"))
+
+        self.assertEqual(outcome, "Part one\n\n[image file file_1]\n\nPart one")
+        self.assertEqual(self.task.last_message_id, "msg_3")
+        calls = self.mock_client.beta.threads.messages.list.call_args_list
+        self.assertEqual(calls[0].kwargs["after"], "msg_1")
+        self.assertEqual(calls[1].kwargs["after"], "msg_2")
+
+    def test_latest_message_without_cursor(self):
+        message = Mock(id="msg_1", role="assistant")
+        self.mock_client.beta.threads.messages.list.return_value = Mock(data=[message])
+
+        self.assertIs(self.task.get_latest_message(Mock(id="thread")), message)
+        self.mock_client.beta.threads.messages.list.assert_called_once_with(thread_id="thread", order="desc", limit=1)
+
     # Add more tests for other Task methods...
\ No newline at end of file
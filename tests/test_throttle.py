@@ -0,0 +1,54 @@
+# test_throttle.py
+
+import asyncio
+import unittest
+from unittest.mock import Mock, AsyncMock, patch
+import openai
+from throttle import ThrottledClient, TokenBucket
+
+def rate_limit_error(retry_after):
+    response = Mock(status_code=429, headers={"retry-after": retry_after})
+    return openai.RateLimitError("Rate limited", response=response, body=None)
+
+class TestThrottle(unittest.TestCase):
+    def test_token_bucket_delays_when_empty(self):
+        bucket = TokenBucket(60, capacity=2)
+
+        self.assertEqual(bucket.reserve(2), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 1.0, places=1)
+
+    @patch('throttle.time.sleep')
+    def test_retries_honour_retry_after(self, mock_sleep):
+        mock_client = Mock()
+        mock_client.beta.threads.create.side_effect = [rate_limit_error("7"), "thread"]
+        client = ThrottledClient(mock_client, is_async=False)
+
+        self.assertEqual(client.beta.threads.create(), "thread")
+        self.assertGreaterEqual(mock_sleep.call_args_list[0][0][0], 7)
+        self.assertEqual(client.get_stats()["rate_limited"], 1)
+
+    @patch('throttle.time.sleep')
+    def test_non_retryable_errors_raise(self, mock_sleep):
+        mock_client = Mock()
+        mock_client.files.create.side_effect = ValueError("bad request")
+        client = ThrottledClient(mock_client, is_async=False)
+
+        with self.assertRaises(ValueError):
+            client.files.create(file=None)
+        self.assertEqual(client.get_stats()["failures"], 1)
+
+    def test_plain_attributes_are_not_wrapped(self):
+        mock_client = Mock(api_key="sk-test", timeout=30.0)
+        client = ThrottledClient(mock_client)
+
+        self.assertEqual(client.api_key, "sk-test")
+        self.assertEqual(client.timeout, 30.0)
+        self.assertEqual(client.get_stats()["requests"], 0)
+
+    def test_async_calls_are_awaited(self):
+        mock_client = Mock()
+        mock_client.beta.threads.create = AsyncMock(return_value="thread")
+        client = ThrottledClient(mock_client, requests_per_minute=600, is_async=True)
+
+        self.assertEqual(asyncio.run(client.beta.threads.create()), "thread")
+        self.assertEqual(client.get_stats()["requests"], 1)
@@ -0,0 +1,53 @@
+# test_tracing.py
+
+import unittest
+from collections import Counter
+from tracing import Tracer, NO_TRACER
+from fake_api import FakeScript
+from benchmark import run_benchmark
+
+class TestTracing(unittest.TestCase):
+    def test_spans_nest(self):
+        tracer = Tracer()
+        with tracer.span("outer", "0") as outer:
+            with tracer.span("inner") as inner:
+                inner.set(polls=2)
+
+        spans = {span.name: span for span in tracer.get_spans()}
+        self.assertEqual(spans["inner"].parent_id, outer.span_id)
+        self.assertEqual(spans["inner"].key, "0")
+        self.assertEqual(spans["inner"].attributes, {"polls": 2})
+        self.assertLessEqual(spans["outer"].start_ns, spans["inner"].start_ns)
+        self.assertGreaterEqual(spans["outer"].end_ns, spans["inner"].end_ns)
+
+    def test_disabled_tracer_records_nothing(self):
+        with NO_TRACER.span("ignored") as span:
+            self.assertIsNone(span)
+        self.assertEqual(NO_TRACER.get_spans(), [])
+
+    def test_swarm_trace_follows_task_tree(self):
+        for engine in ("threads", "async"):
+            tracer = Tracer()
+            result = run_benchmark(FakeScript(fanout=2, depth=1), engine=engine, tracer=tracer)
+            spans = tracer.get_spans()
+            names = Counter(span.name for span in spans)
+
+            self.assertEqual(names["task"], 3)
+            self.assertEqual(names["run"], result["runs"])
+            self.assertEqual(names["run.in_progress"], result["runs"])
+            self.assertEqual(names["plan"], 3)
+
+            task_spans = {span.key: span for span in spans if span.name == "task"}
+            self.assertEqual(task_spans["0/1"].parent_id, task_spans["0"].span_id)
+            self.assertEqual(task_spans["0/2"].parent_id, task_spans["0"].span_id)
+
+            chrome = tracer.to_chrome_trace()
+            lanes = {event["args"]["name"] for event in chrome["traceEvents"] if event["name"] == "thread_name"}
+            self.assertTrue({"task 0", "task 0/1", "task 0/2"} <= lanes)
+
+            otlp = tracer.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            self.assertEqual(len(otlp), len(spans))
+            self.assertTrue(all(len(span["traceId"]) == 32 and len(span["spanId"]) == 16 for span in otlp))
+
+if __name__ == '__main__':
+    unittest.main()
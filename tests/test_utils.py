@@ -11,7 +11,7 @@ class TestUtils(unittest.TestCase):
         utils.write_to_file("test/path.txt", "test content")
         
         mock_makedirs.assert_called_once_with("test", exist_ok=True)
-        mock_file.assert_called_once_with("test/path.txt", 'w')
+        mock_file.assert_called_once_with("test/path.txt", 'w', encoding='utf-8')
         mock_file().write.assert_called_once_with("test content")
 
     # Add more tests for other utility functions...
\ No newline at end of file
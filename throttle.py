@@ -0,0 +1,220 @@
+import time
+import random
+import asyncio
+import inspect
+import threading
+import openai
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and
+# server-side failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Token bucket refilled continuously at a per-minute rate. Callers reserve
+# what they need up front; the balance may go negative, in which case the
+# caller is told how long to wait before its reservation is covered.
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Reserve amount tokens and return the seconds to wait before using them
+    def reserve(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+# Rough token count of a request: ~4 characters per token of text content
+def estimate_tokens(kwargs):
+    characters = 0
+    for key in ("content", "instructions", "additional_instructions"):
+        value = kwargs.get(key)
+        if isinstance(value, str):
+            characters += len(value)
+    for message in kwargs.get("messages") or []:
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            characters += len(message["content"])
+    return characters // 4
+
+# Get the number of seconds a rate-limited response asked us to wait
+def get_retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000.0
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            return float(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+# Shared wrapper around an OpenAI (or AsyncOpenAI) client. Every API call
+# made through it is throttled by requests-per-minute and tokens-per-minute
+# buckets and retried on transient errors with jittered exponential backoff.
+# Token usage is estimated from the request text and topped up with the
+# completion tokens finished runs report, so the TPM budget is approximate.
+class ThrottledClient:
+    def __init__(self, client, requests_per_minute=None, tokens_per_minute=None, max_retries=5, base_delay=1.0, max_delay=60.0, is_async=None):
+        self.client = client
+        self.is_async = isinstance(client, openai.AsyncOpenAI) if is_async is None else is_async
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.throttle_wait_seconds = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def __getattr__(self, name):
+        return wrap(self, getattr(self.client, name))
+
+    # Seconds to wait before a request of the given token estimate may be sent
+    def get_delay(self, tokens):
+        delay = 0.0
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket and tokens:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+
+        # Everyone backs off while the API has told us to wait
+        delay = max(delay, self.paused_until - time.monotonic())
+
+        with self.lock:
+            self.requests += 1
+            if delay > 0:
+                self.throttled += 1
+                self.throttle_wait_seconds += delay
+        return delay
+
+    # Seconds to wait before retrying after exc, or None to give up
+    def get_retry_delay(self, exc, attempt):
+        if not isinstance(exc, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            with self.lock:
+                self.failures += 1
+            return None
+
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)
+
+        retry_after = get_retry_after(exc)
+        with self.lock:
+            self.retries += 1
+            if isinstance(exc, openai.RateLimitError):
+                self.rate_limited += 1
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    # Charge the completion tokens reported by a finished run
+    def record_usage(self, result):
+        usage = getattr(result, "usage", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if self.token_bucket and isinstance(completion_tokens, int) and not isinstance(completion_tokens, bool):
+            self.token_bucket.reserve(completion_tokens)
+
+    def call(self, method, args, kwargs):
+        tokens = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            delay = self.get_delay(tokens)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                result = method(*args, **kwargs)
+            except Exception as exc:
+                retry_delay = self.get_retry_delay(exc, attempt)
+                if retry_delay is None:
+                    raise
+                logger.warning("API call failed (%s); retrying in %.1fs", exc.__class__.__name__, retry_delay)
+                time.sleep(retry_delay)
+                attempt += 1
+                continue
+            self.record_usage(result)
+            return result
+
+    async def async_call(self, method, args, kwargs):
+        tokens = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            delay = self.get_delay(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                result = method(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as exc:
+                retry_delay = self.get_retry_delay(exc, attempt)
+                if retry_delay is None:
+                    raise
+                logger.warning("API call failed (%s); retrying in %.1fs", exc.__class__.__name__, retry_delay)
+                await asyncio.sleep(retry_delay)
+                attempt += 1
+                continue
+            self.record_usage(result)
+            return result
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "throttle_wait_seconds": self.throttle_wait_seconds,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+            }
+
+# Attribute values of a client that are neither methods nor resources
+PLAIN_TYPES = (str, bytes, int, float, bool, type(None), list, tuple, dict, set, frozenset)
+
+# Wrap a method or resource of the client; plain values (api_key, timeout,
+# max_retries...) are returned unchanged
+def wrap(throttled_client, value):
+    if isinstance(value, PLAIN_TYPES) or not (callable(value) or hasattr(value, "__dict__")):
+        return value
+    return ThrottledResource(throttled_client, value)
+
+# Proxy for a resource (e.g. client.beta.threads) or method of the wrapped
+# client. Attribute access goes deeper; calling it makes a throttled call.
+class ThrottledResource:
+    def __init__(self, throttled_client, target):
+        self._throttled_client = throttled_client
+        self._target = target
+
+    def __getattr__(self, name):
+        return wrap(self._throttled_client, getattr(self._target, name))
+
+    def __call__(self, *args, **kwargs):
+        if self._throttled_client.is_async:
+            return self._throttled_client.async_call(self._target, args, kwargs)
+        return self._throttled_client.call(self._target, args, kwargs)
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import threading
+import contextvars
+
+from contextlib import contextmanager
+
+# Span currently open in this thread or coroutine
+CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+
+# Lane of spans not tied to a task
+SWARM_LANE = "swarm"
+
+def new_id(size):
+    return os.urandom(size).hex()
+
+# One timed phase of the swarm's work
+class Span:
+    def __init__(self, name, span_id, parent_id, key, start_ns, attributes):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.key = key
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ns(self):
+        return (self.end_ns or self.start_ns) - self.start_ns
+
+# Records spans around the phases of a swarm run (assistant creation,
+# thread and message posts, queued and in-progress run time, message
+# fetches, tool-output submission, output writes, planning and
+# summarisation) and exports them as Chrome trace events and as
+# OpenTelemetry (OTLP/JSON) spans.
+#
+# Spans nest under the span open in the same thread or coroutine. A task's
+# span nests under its parent task's span, so the trace follows the task
+# tree even when subtasks run on other threads. Timestamps are taken from
+# a monotonic clock anchored to the wall clock when the tracer is created.
+# A disabled tracer records nothing.
+class Tracer:
+    def __init__(self, enabled=True, service_name="swarm"):
+        self.enabled = enabled
+        self.service_name = service_name
+        self.trace_id = new_id(16)
+        self.lock = threading.Lock()
+        self.spans = []
+        self.task_spans = {}
+        self.origin_ns = time.time_ns()
+        self.origin_perf_ns = time.perf_counter_ns()
+
+    def now(self):
+        return self.origin_ns + time.perf_counter_ns() - self.origin_perf_ns
+
+    # Open a span for the duration of a with block. The span is yielded so
+    # attributes can be added to it (None when the tracer is disabled).
+    @contextmanager
+    def span(self, name, key=None, **attributes):
+        if not self.enabled:
+            yield None
+            return
+
+        parent = CURRENT_SPAN.get()
+        if parent is None and key is not None:
+            parent = self.task_spans.get(key)
+        span = self.start(name, parent, key or (parent.key if parent else None), attributes)
+
+        token = CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = repr(exc)
+            raise
+        finally:
+            CURRENT_SPAN.reset(token)
+            self.end(span)
+
+    # Open the span covering all the work on a task, under its parent
+    # task's span
+    @contextmanager
+    def task_span(self, task):
+        if not self.enabled:
+            yield None
+            return
+
+        parent = self.task_spans.get(task.parent_task.key) if task.parent_task else CURRENT_SPAN.get()
+        span = self.start("task", parent, task.key, {"title": task.title, "depth": task.depth})
+        with self.lock:
+            self.task_spans[task.key] = span
+
+        token = CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = repr(exc)
+            raise
+        finally:
+            CURRENT_SPAN.reset(token)
+            self.end(span)
+
+    # Record a span whose start and end were measured elsewhere (times from
+    # now())
+    def add_span(self, name, start_ns, end_ns, key=None, **attributes):
+        if not self.enabled:
+            return None
+
+        parent = CURRENT_SPAN.get() or self.task_spans.get(key)
+        span = self.start(name, parent, key or (parent.key if parent else None), attributes, start_ns)
+        self.end(span, end_ns)
+        return span
+
+    def start(self, name, parent, key, attributes, start_ns=None):
+        return Span(name, new_id(8), parent.span_id if parent else None, key, start_ns or self.now(), attributes)
+
+    def end(self, span, end_ns=None):
+        span.end_ns = end_ns or self.now()
+        with self.lock:
+            self.spans.append(span)
+
+    def get_spans(self):
+        with self.lock:
+            return sorted(self.spans, key=lambda span: (span.start_ns, -span.duration_ns))
+
+    # Build the trace as Chrome trace events, with one lane per task
+    def to_chrome_trace(self):
+        spans = self.get_spans()
+        lanes = {}
+        events = []
+        for span in spans:
+            lane = lanes.setdefault(span.key or SWARM_LANE, len(lanes) + 1)
+            args = dict(span.attributes, span_id=span.span_id, parent_id=span.parent_id, thread=span.thread_id)
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": (span.start_ns - self.origin_ns) / 1000,
+                "dur": span.duration_ns / 1000,
+                "pid": 1,
+                "tid": lane,
+                "args": args,
+            })
+
+        metadata = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": self.service_name}}]
+        for key, lane in lanes.items():
+            label = key if key == SWARM_LANE else f"task {key}"
+            metadata.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": label}})
+            metadata.append({"name": "thread_sort_index", "ph": "M", "pid": 1, "tid": lane, "args": {"sort_index": lane}})
+
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    # Build the trace as an OTLP/JSON export request
+    def to_otlp(self):
+        otlp_spans = []
+        for span in self.get_spans():
+            attributes = dict(span.attributes)
+            if span.key is not None:
+                attributes["swarm.task.key"] = span.key
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [to_otlp_attribute(name, value) for name, value in attributes.items() if value is not None],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [to_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "swarm.tracing"}, "spans": otlp_spans}],
+        }]}
+
+    def write_chrome_trace(self, path):
+        write_json(path, self.to_chrome_trace())
+
+    def write_otlp(self, path):
+        write_json(path, self.to_otlp())
+
+    # Write both exports for a run into a directory and return their paths
+    def export(self, directory, run_id):
+        chrome_path = os.path.join(directory, f"{run_id}.trace.json")
+        otlp_path = os.path.join(directory, f"{run_id}.otlp.json")
+        self.write_chrome_trace(chrome_path)
+        self.write_otlp(otlp_path)
+        return chrome_path, otlp_path
+
+    # Get the number of spans and the total seconds spent in each phase
+    def get_stats(self):
+        totals = {}
+        spans = self.get_spans()
+        for span in spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ns / 1e9
+        return {"spans": len(spans), "seconds": {name: round(seconds, 3) for name, seconds in sorted(totals.items())}}
+
+# Tracks when a remote run changes status, to split its time into queued
+# and in-progress spans
+class RunTimeline:
+    def __init__(self, tracer, status):
+        self.tracer = tracer
+        self.created_ns = tracer.now()
+        self.in_progress_ns = tracer.now() if status == "in_progress" else None
+
+    def observe(self, status):
+        if self.in_progress_ns is None and status != "queued":
+            self.in_progress_ns = self.tracer.now()
+
+    # Record the spans of a finished run
+    def finish(self, key, run, polls):
+        end_ns = self.tracer.now()
+        in_progress_ns = self.in_progress_ns or end_ns
+        self.tracer.add_span("run.queued", self.created_ns, in_progress_ns, key, run_id=run.id)
+        self.tracer.add_span("run.in_progress", in_progress_ns, end_ns, key, run_id=run.id, status=run.status, poll_count=polls)
+
+def to_otlp_attribute(name, value):
+    if isinstance(value, bool):
+        return {"key": name, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": name, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": name, "value": {"doubleValue": value}}
+    return {"key": name, "value": {"stringValue": str(value)}}
+
+def write_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+# Tracer used when tracing is off
+NO_TRACER = Tracer(enabled=False)
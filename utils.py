@@ -1,9 +1,21 @@
 import os
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Write content to a file, creating its directory if needed
+def write_to_file(file_path, content):
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
 
 def get_file_paths(directory_path, extension_filter=None):
     # Check if the provided path is indeed a directory
     if not os.path.isdir(directory_path):
-        print(f"The provided path '{directory_path}' is not a directory.")
+        logger.warning("The provided path '%s' is not a directory.", directory_path)
         return
 
     # Loop through each file in the directory
@@ -18,10 +30,10 @@ def get_file_paths(directory_path, extension_filter=None):
                 file_extension = os.path.splitext(filename)[1]
                 if file_extension == extension_filter:
                     # Add the file to the list
-                    print(f"Found file: {filename}")
+                    logger.debug("Found file: %s", filename)
                     file_paths.append(file_path)         
             else: # Otherwise, just add the file to the list
-                print(f"Found file: {filename}")
+                logger.debug("Found file: %s", filename)
                 file_paths.append(file_path)                 
     
     return file_paths
@@ -35,12 +47,8 @@ def get_knowledge_base(client, file_path, extension_filter=None):
     # Create Assistant API client files and add to list
     file_ids = []
     for file_path in file_paths:
-        file = client.files.create(
-        file=open(
-            file_path,
-            "rb",
-        ),
-        purpose="assistants",)
+        with open(file_path, "rb") as f:
+            file = client.files.create(file=f, purpose="assistants")
         file_ids.append(file.id)
 
     return file_ids
\ No newline at end of file